@@ -9,7 +9,11 @@ setup(name='triage_ml',
       entry_points={
           'console_scripts': [
                 'triage-train=triage_ml.train:main',
-                'triage-gendata=triage_ml.data.gen_data:main'
+                'triage-train-all=triage_ml.train_all:main',
+                'triage-tune=triage_ml.tune:main',
+                'triage-backtest=triage_ml.backtest:main',
+                'triage-gendata=triage_ml.data.gen_data:main',
+                'triage-convert=triage_ml.data.storage:main'
           ]
       },
       zip_safe=False)
@@ -0,0 +1,68 @@
+"""
+Run the benchmark suite and save its results as JSON.
+
+Run from the ml-training directory:
+    python -m tests.benchmarks --quick
+    python -m tests.benchmarks -b 'csv_*' -o results.json --compare baseline.json
+"""
+from tests.benchmarks import harness, suite
+
+import argparse
+import sys
+
+QUICK_SIZES = {
+    'years': [1],
+    'clinics': [1, 10],
+    'batch': [1, 100],
+}
+
+
+def parse_args(args):
+    """
+    Parser configuration
+    :return: parsed augments object
+    """
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+
+    parser.add_argument('-b', '--bench', default='*',
+                        help='A glob pattern selecting the benchmarks to run by name.')
+    parser.add_argument('--quick', action='store_true',
+                        help='Only run the smallest data sizes.')
+    parser.add_argument('--years', type=int, nargs='+',
+                        help=f'The years of data to run over. Defaults to {suite.YEARS}.')
+    parser.add_argument('--clinics', type=int, nargs='+',
+                        help=f'The numbers of clinics to run over. Defaults to {suite.CLINICS}.')
+    parser.add_argument('--min_time', default=0.5, type=float,
+                        help='The seconds after which repeated runs of a benchmark stop.')
+    parser.add_argument('-o', '--output', default='benchmark-results.json',
+                        help='The path to write the JSON results to.')
+    parser.add_argument('--compare',
+                        help='The JSON results of an earlier run to compare against.')
+    parser.add_argument('--threshold', default=1.2, type=float,
+                        help='The slowdown ratio reported as a regression when comparing.')
+
+    return parser.parse_args(args)
+
+
+def main(str_args=None):
+    args = parse_args(str_args if str_args is not None else sys.argv[1:])
+
+    sizes = dict(QUICK_SIZES) if args.quick else {}
+    if args.years:
+        sizes['years'] = args.years
+    if args.clinics:
+        sizes['clinics'] = args.clinics
+
+    results = harness.run(args.bench, sizes, args.min_time)
+    harness.save(results, args.output)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        lines = harness.compare(harness.load(args.compare), results, args.threshold)
+        print('\n'.join(lines))
+        if any(line.endswith('REGRESSION') for line in lines):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares the chunked NumPy CSV loader against the original per-line strptime loader.
+
+Run from the ml-training directory:
+    python -m tests.benchmarks.bench_csv [rows]
+"""
+from triage_ml.data.dataset import DataSet
+from triage_ml.data import storage
+
+from datetime import datetime
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+
+def legacy_load(file_name):
+    """
+    The original triage-train CSV loader, kept as a reference point.
+    """
+    data = []
+    with open(file_name) as f:
+        for line in f.readlines():
+            line = line.rstrip().split(',')
+            data.append((
+                int(line[0]),
+                int(line[1]),
+                datetime.strptime(line[2], '%Y-%m-%d'),
+            ))
+
+    dataset = DataSet(data)
+    dataset.filter_on('clinic_id', lambda c_id: c_id == 1)
+    return dataset.filter_on('severity', lambda s: s == 0)
+
+
+def write_data(file_name, rows, clinics=50, days=10 * 365, seed=0):
+    rng = np.random.default_rng(seed)
+    DataSet.from_columns(rng.integers(0, clinics, rows), rng.integers(0, 5, rows),
+                         np.datetime64('2010-01-01') + rng.integers(0, days, rows)).write_to_file(file_name)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(rows=5_000_000):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'data.csv')
+        print(f'Generating {rows} rows...')
+        write_data(file_name, rows)
+
+        legacy_time, legacy = _timed(lambda: legacy_load(file_name))
+        chunked_time, chunked = _timed(lambda: storage.read_csv(file_name, clinic_id=1, severity=0))
+        assert legacy.data == chunked.data
+
+        print(f'legacy loader:  {legacy_time:.3f}s')
+        print(f'chunked loader: {chunked_time:.3f}s ({legacy_time / chunked_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,90 @@
+"""
+Compares the columnar DataSet against the original list-of-namedtuples implementation.
+
+Run from the ml-training directory:
+    python -m tests.benchmarks.bench_dataset
+"""
+from triage_ml.data.dataset import DataSet, DataPoint, _ATTRS
+
+from datetime import datetime, timedelta
+import numpy as np
+import time
+
+
+class ListDataSet:
+    """
+    The original DataSet implementation, kept as a reference point.
+    """
+
+    def __init__(self, data):
+        self.data = [DataPoint(*item) for item in data]
+
+    def filter_on(self, attribute, predicate):
+        attr_idx = _ATTRS.index(attribute)
+        self.data = list(filter(lambda data_point: predicate(data_point[attr_idx]), self.data))
+        return self
+
+    def order_by(self, attribute, descending=False):
+        attr_idx = _ATTRS.index(attribute)
+        self.data = sorted(self.data, key=lambda data_point: data_point[attr_idx], reverse=descending)
+        return self
+
+    def aggregate_on(self, attribute, key):
+        attr_idx = _ATTRS.index(attribute)
+        sorted_data = sorted(self.data, key=lambda data_point: key(data_point[attr_idx]))
+
+        aggregation = {}
+        agg = None
+        for data_point in sorted_data:
+            if agg:
+                if key(data_point[attr_idx]) == key(agg[1][-1][attr_idx]):
+                    agg[1].append(data_point)
+                    continue
+                else:
+                    aggregation[key(agg[0])] = agg[1]
+
+            agg = (data_point[attr_idx], [data_point])
+
+        if agg:
+            aggregation[key(agg[0])] = agg[1]
+
+        return aggregation
+
+
+def create_data(size, clinics=20, days=5 * 365, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2015, 1, 1)
+    dates = [start + timedelta(int(d)) for d in rng.integers(0, days, size)]
+    return list(zip(rng.integers(0, clinics, size).tolist(), rng.integers(0, 5, size).tolist(), dates))
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run_operations(dataset_cls, data):
+    timings = {}
+    timings['construct'], dataset = _timed(lambda: dataset_cls(data))
+    timings['filter_on'], dataset = _timed(lambda: dataset.filter_on('clinic_id', lambda c_id: c_id == 1))
+    timings['order_by'], dataset = _timed(lambda: dataset.order_by('date_received'))
+    timings['aggregate_on'], _ = _timed(lambda: dataset.aggregate_on('date_received', lambda dr: str(dr.date())))
+    return timings
+
+
+def run(sizes=(1_000_000, 10_000_000)):
+    for size in sizes:
+        print(f'Generating {size} data points...')
+        data = create_data(size)
+
+        results = {cls.__name__: run_operations(cls, data) for cls in (ListDataSet, DataSet)}
+        print(f'{"operation":<15}{"list (s)":>12}{"columnar (s)":>15}{"speedup":>10}')
+        for operation in results['DataSet']:
+            old, new = results['ListDataSet'][operation], results['DataSet'][operation]
+            print(f'{operation:<15}{old:>12.3f}{new:>15.3f}{old / new:>9.1f}x')
+        print()
+
+
+if __name__ == '__main__':
+    run()
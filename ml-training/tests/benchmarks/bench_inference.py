@@ -0,0 +1,83 @@
+"""
+Compares serving forecasts from the NumPy runtime against the Keras model.
+
+Startup is measured in fresh processes, from interpreter start to the first forecast.
+
+Run from the ml-training directory:
+    python -m tests.benchmarks.bench_inference [batch]
+"""
+from triage_ml.models.numpy_runtime import NumpyRadiusVariance, export_weights
+from triage_ml.models.radius_variance import RadiusVariance
+from triage_ml.data.dataset import TimeInterval
+
+import numpy as np
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+_KERAS_STARTUP = '''
+from triage_ml.models.radius_variance import RadiusVariance
+from triage_ml.data.dataset import TimeInterval
+import numpy as np
+model = RadiusVariance(seq_size=30, radius=15, time_interval=TimeInterval.WEEK)
+model.get_model().load_weights({weights!r})
+model.predict([np.ones((1, 30, 1))], np.eye(43)[:1])
+'''
+
+_NUMPY_STARTUP = '''
+from triage_ml.models.numpy_runtime import NumpyRadiusVariance
+import numpy as np
+NumpyRadiusVariance.load({bundle!r}).predict([np.ones((1, 30, 1))], np.eye(43)[:1])
+'''
+
+# Read the peak RSS from /proc, ru_maxrss would include the forked benchmark process
+_MAX_RSS = '''
+with open('/proc/self/status') as status:
+    print(next(line.split()[1] for line in status if line.startswith('VmHWM')))
+'''
+
+
+def _startup(code):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code + _MAX_RSS], check=True, capture_output=True, text=True,
+                            cwd=os.getcwd()).stdout
+    return time.perf_counter() - start, int(output.split()[-1]) / 1024
+
+
+def _timed(fn, repeat=5):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(batch=500, horizon=52):
+    model = RadiusVariance(seq_size=30, radius=15, time_interval=TimeInterval.WEEK)
+
+    with tempfile.TemporaryDirectory() as directory:
+        weights = os.path.join(directory, 'weights.h5')
+        bundle = os.path.join(directory, 'weights.npz')
+        model.get_model().save(weights)
+        export_weights(model, bundle)
+        runtime = NumpyRadiusVariance.load(bundle)
+
+        keras_startup, keras_rss = _startup(_KERAS_STARTUP.format(weights=weights))
+        numpy_startup, numpy_rss = _startup(_NUMPY_STARTUP.format(bundle=bundle))
+        print(f'startup keras: {keras_startup:.3f}s {keras_rss:.0f}MB max RSS')
+        print(f'startup numpy: {numpy_startup:.3f}s {numpy_rss:.0f}MB max RSS')
+
+    rng = np.random.default_rng(0)
+    dates = np.eye(43, dtype=np.float32)[rng.integers(0, 43, horizon)]
+    for size in [1, batch]:
+        seeds = rng.poisson(10, (size, 30, 1)).astype(np.float32)
+        keras_time = _timed(lambda: model.predict([seeds], dates))
+        numpy_time = _timed(lambda: runtime.predict([seeds], dates))
+        print(f'{horizon} step forecast of {size} seeds keras: {keras_time * 1000:.1f}ms '
+              f'numpy: {numpy_time * 1000:.1f}ms ({keras_time / numpy_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,160 @@
+"""
+A small benchmark harness in the style of asv.
+
+Benchmarks are registered with the benchmark decorator together with the parameters they run over.
+Each run times every combination of parameters and writes the results to JSON, which a later run
+can be compared against to catch regressions.
+"""
+from typing import Callable, Dict, List, Text
+import fnmatch
+import itertools
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+
+BENCHMARKS = []
+
+
+class Benchmark:
+    """
+    A registered benchmark.
+
+    Attributes:
+        name: The name of the benchmark.
+        fn: Called with a set of parameters, it does any setup then returns the function to time.
+        params: The names of the parameters to the values they run over.
+        repeat: The maximum number of timed runs of each set of parameters.
+        unit: If set, the timed function returns a number of items processed and a throughput in items
+              per second is reported.
+    """
+
+    def __init__(self, name: Text, fn: Callable, params: Dict[Text, List], repeat: int, unit: Text):
+        self.name = name
+        self.fn = fn
+        self.params = params
+        self.repeat = repeat
+        self.unit = unit
+
+    def param_sets(self, sizes: Dict[Text, List] = None) -> List[Dict]:
+        """
+        :param sizes: Parameter values overriding the registered ones, for the parameters the benchmark takes.
+        :return: Every combination of parameters to run.
+        """
+        params = {name: (sizes or {}).get(name, values) for name, values in self.params.items()}
+        return [dict(zip(params, values)) for values in itertools.product(*params.values())]
+
+
+def benchmark(repeat=5, unit: Text = None, **params):
+    """
+    Register a benchmark.
+    :param repeat: The maximum number of timed runs of each set of parameters.
+    :param unit: The unit of the items the timed function processes, if it returns a count of them.
+    :param params: The names of the parameters to the values they run over.
+    """
+    def register(fn):
+        BENCHMARKS.append(Benchmark(fn.__name__, fn, params, repeat, unit))
+        return fn
+    return register
+
+
+def run(pattern='*', sizes: Dict[Text, List] = None, min_time=0.5, log=print) -> Dict:
+    """
+    Run the registered benchmarks.
+    :param pattern: A glob pattern selecting benchmarks by name.
+    :param sizes: Parameter values overriding the registered ones.
+    :param min_time: Runs of a set of parameters stop once they have taken this many seconds, after at least one.
+    :param log: Called with a line describing each result.
+    :return: The results, with the environment they were measured in.
+    """
+    results = []
+    for bench in BENCHMARKS:
+        if not fnmatch.fnmatch(bench.name, pattern):
+            continue
+
+        for params in bench.param_sets(sizes):
+            timed = bench.fn(**params)
+            timed()  # Warm up caches and any compilation
+
+            times, items = [], None
+            while not times or (len(times) < bench.repeat and sum(times) < min_time):
+                start = time.perf_counter()
+                items = timed()
+                times.append(time.perf_counter() - start)
+
+            result = {
+                'name': bench.name,
+                'params': params,
+                'times': times,
+                'min': min(times),
+                'median': float(np.median(times)),
+            }
+            if bench.unit:
+                result['throughput'] = items / result['median']
+                result['unit'] = f'{bench.unit}/s'
+            results.append(result)
+            log(format_result(result))
+
+    return {'environment': environment(), 'results': results}
+
+
+def environment() -> Dict:
+    """
+    :return: A description of the commit and machine benchmarks were run on.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def result_key(result: Dict) -> Text:
+    params = ', '.join(f'{name}={value}' for name, value in result['params'].items())
+    return f'{result["name"]}({params})'
+
+
+def format_result(result: Dict) -> Text:
+    line = f'{result_key(result):50} {result["median"] * 1000:10.2f}ms'
+    if 'throughput' in result:
+        line += f' {result["throughput"]:14,.0f} {result["unit"]}'
+    return line
+
+
+def compare(baseline: Dict, current: Dict, threshold=1.2) -> List[Text]:
+    """
+    Compare results against a baseline run.
+    :param baseline: Results of an earlier run.
+    :param current: Results of this run.
+    :param threshold: The slowdown ratio from which a result counts as a regression.
+    :return: A line describing each result that ran in both, regressions are marked.
+    """
+    baseline_times = {result_key(result): result['median'] for result in baseline['results']}
+
+    lines = []
+    for result in current['results']:
+        key = result_key(result)
+        if key in baseline_times:
+            ratio = result['median'] / baseline_times[key]
+            marker = ' REGRESSION' if ratio >= threshold else ''
+            lines.append(f'{key:50} {ratio:6.2f}x{marker}')
+    return lines
+
+
+def save(results: Dict, file_name: Text):
+    with open(file_name, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load(file_name: Text) -> Dict:
+    with open(file_name) as file:
+        return json.load(file)
@@ -0,0 +1,163 @@
+"""
+The benchmarks of the data pipeline, training and inference.
+
+Datasets are generated with gen_data's Poisson method, for years of daily arrivals of each clinic.
+"""
+from tests.benchmarks.harness import benchmark
+from triage_ml.data import gen_data, storage
+from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval
+
+from datetime import datetime
+from functools import lru_cache
+import os
+import tempfile
+import numpy as np
+
+YEARS = [1, 5, 20]
+CLINICS = [1, 50, 500]
+
+_START = datetime(2000, 1, 1)
+_TEMP_DIR = tempfile.TemporaryDirectory()
+
+
+@lru_cache(maxsize=2)
+def _counts(years: int, clinics: int) -> np.ndarray:
+    end = datetime(_START.year + years, 1, 1).toordinal() - 1
+    return gen_data.arrival_counts(_START, datetime.fromordinal(end), 'poisson', clinics, seed=0)
+
+
+@lru_cache(maxsize=2)
+def _dataset(years: int, clinics: int) -> DataSet:
+    return gen_data.to_dataset(_START, _counts(years, clinics))
+
+
+@lru_cache(maxsize=1)
+def _csv_file(years: int, clinics: int) -> str:
+    file_name = os.path.join(_TEMP_DIR.name, f'data-{years}-{clinics}.csv')
+    gen_data.write_csv(_START, _counts(years, clinics), file_name)
+    return file_name
+
+
+def _view(dataset: DataSet) -> DataSet:
+    """
+    A DataSet sharing the columns of another, so mutating benchmarks leave the original alone.
+    """
+    return DataSet.from_columns(*dataset.columns.values())
+
+
+@lru_cache(maxsize=4)
+def _model(seq_size=30, radius=15, time_interval=TimeInterval.DAY):
+    from triage_ml.models.radius_variance import RadiusVariance
+    return RadiusVariance(seq_size=seq_size, radius=radius, time_interval=time_interval)
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def csv_load(years, clinics):
+    file_name = _csv_file(years, clinics)
+    return lambda: len(storage.read_csv(file_name))
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def filter_on(years, clinics):
+    dataset = _dataset(years, clinics)
+
+    def timed():
+        _view(dataset).filter_on('clinic_id', lambda c_id: c_id == 1).filter_on('severity', lambda s: s == 0)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def filter_mask(years, clinics):
+    dataset = _dataset(years, clinics)
+
+    def timed():
+        _view(dataset).filter_mask('clinic_id', lambda c_id: c_id == 1).filter_mask('severity', lambda s: s == 0)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def order_by(years, clinics):
+    dataset = _dataset(years, clinics)
+
+    def timed():
+        _view(dataset).order_by('date_received', descending=True)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def aggregate_on(years, clinics):
+    dataset = _dataset(years, clinics)
+
+    def timed():
+        dataset.aggregate_on('date_received', lambda d: d.month)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='arrivals', years=YEARS, clinics=CLINICS)
+def group_by(years, clinics):
+    dataset = _dataset(years, clinics)
+
+    def timed():
+        dataset.group_by(['clinic_id', 'severity', 'date_received'], TimeInterval.WEEK)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='arrivals', years=YEARS, time_interval=['DAY', 'WEEK'])
+def create_ml_dataset(years, time_interval):
+    dataset = _dataset(years, 1)
+    model = _model(time_interval=TimeInterval[time_interval])
+
+    def timed():
+        model.create_ml_dataset(dataset)
+        return len(dataset)
+    return timed
+
+
+@benchmark(unit='samples', years=YEARS, strided=[False, True])
+def ml_dataset_construction(years, strided):
+    model = _model()
+    frame = model.create_frame(*_dataset(years, 1).daily_counts())
+
+    def timed():
+        return len(MLDataSet(frame[0:1], frame[1:2], frame[2:], model.seq_size, strided=strided))
+    return timed
+
+
+@benchmark(repeat=3, unit='samples', years=YEARS, batch_size=[32, 256])
+def train_epoch(years, batch_size):
+    from triage_ml.train_radius_variance import loss
+    from tensorflow.keras.optimizers import Adam
+
+    model = _model()
+    ml_dataset = model.create_ml_dataset(_dataset(years, 1), strided=True)
+    model.get_model().compile(optimizer=Adam(lr=0.001), loss=loss)
+
+    def timed():
+        model.get_model().fit(x=ml_dataset.inputs, y=ml_dataset.outputs, batch_size=batch_size, epochs=1, verbose=0)
+        return len(ml_dataset)
+    return timed
+
+
+@benchmark(unit='forecasts', batch=[1, 100, 500], runtime=['keras', 'numpy'])
+def predict(batch, runtime):
+    from triage_ml.models.numpy_runtime import NumpyRadiusVariance, export_weights
+
+    model = _model()
+    if runtime == 'numpy':
+        file_name = os.path.join(_TEMP_DIR.name, 'weights.npz')
+        export_weights(model, file_name)
+        model = NumpyRadiusVariance.load(file_name)
+
+    rng = np.random.default_rng(0)
+    seeds = rng.poisson(25, (batch, model.seq_size, 1)).astype(np.float32)
+    dates = np.eye(43, dtype=np.float32)[rng.integers(0, 43, 52)]
+
+    def timed():
+        model.predict([seeds], dates)
+        return batch
+    return timed
@@ -0,0 +1,80 @@
+from triage_ml.data.chunked_dataset import ChunkedDataSet
+from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.models.radius_variance import RadiusVariance
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def arrivals():
+    # Unordered, so later chunks reach both before and after the days counted so far
+    rng = np.random.default_rng(0)
+    return DataSet.from_columns(rng.integers(1, 4, 5000), rng.integers(0, 3, 5000),
+                                np.datetime64('2018-01-01') + rng.integers(0, 700, 5000))
+
+
+@pytest.fixture(params=['csv', 'npz', 'memory'])
+def chunked(request, arrivals, tmp_path):
+    if request.param == 'memory':
+        return ChunkedDataSet.from_dataset(arrivals, chunk_size=300)
+
+    file_name = str(tmp_path / f'data.{request.param}')
+    arrivals.write_to_file(file_name)
+    return ChunkedDataSet.read_from_file(file_name, chunk_size=300)
+
+
+def _filtered(arrivals):
+    return DataSet(arrivals).filter_on('clinic_id', lambda c_id: c_id == 2).filter_on('severity', lambda s: s == 1)
+
+
+def test_chunks_are_bounded(chunked, arrivals):
+    sizes = [len(chunk) for chunk in chunked]
+
+    assert sum(sizes) == len(chunked) == len(arrivals)
+    assert len(sizes) > 10 and max(sizes) <= 600
+
+
+def test_daily_counts_match_dataset(chunked, arrivals):
+    chunked.filter_on('clinic_id', lambda c_id: c_id == 2).filter_on('severity', lambda s: s == 1)
+
+    first, counts = chunked.daily_counts()
+    expected_first, expected_counts = _filtered(arrivals).daily_counts()
+
+    assert first == expected_first
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_group_by_matches_dataset(chunked, arrivals):
+    groups = chunked.group_by(['clinic_id', 'severity', 'date_received'], TimeInterval.WEEK)
+    expected = arrivals.group_by(['clinic_id', 'severity', 'date_received'], TimeInterval.WEEK)
+
+    assert groups.keys() == expected.keys()
+    for name, column in expected.items():
+        np.testing.assert_array_equal(groups[name], column)
+        assert groups[name].dtype == column.dtype
+
+
+def test_to_dataset(chunked, arrivals):
+    chunked.filter_on('clinic_id', lambda c_id: c_id == 2).filter_on('severity', lambda s: s == 1)
+
+    assert chunked.to_dataset().data == _filtered(arrivals).data
+
+
+def test_create_ml_dataset_from_chunks(chunked, arrivals):
+    chunked.filter_mask('clinic_id', lambda c_id: c_id == 2)
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.WEEK)
+
+    ml_dataset = model.create_ml_dataset(chunked)
+    expected = model.create_ml_dataset(DataSet(arrivals).filter_on('clinic_id', lambda c_id: c_id == 2))
+
+    for actual, expected_array in zip(ml_dataset.inputs + ml_dataset.outputs, expected.inputs + expected.outputs):
+        np.testing.assert_array_equal(actual, expected_array)
+
+
+def test_empty():
+    chunked = ChunkedDataSet.from_dataset(DataSet([]), chunk_size=10)
+
+    assert chunked.daily_counts()[0] is None
+    assert len(chunked) == 0
+    assert all(len(column) == 0 for column in chunked.group_by(['clinic_id']).values())
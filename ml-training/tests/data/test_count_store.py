@@ -0,0 +1,80 @@
+from triage_ml.data.count_store import CountStore
+from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.models.radius_variance import RadiusVariance
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def arrivals():
+    rng = np.random.RandomState(0)
+    start = datetime(2019, 1, 1)
+    return DataSet([(1, 0, start + timedelta(days=int(day))) for day in np.sort(rng.randint(0, 200, 2000))])
+
+
+def _until(dataset, day, keep=1.0):
+    """The arrivals before day and the first keep fraction of the arrivals on day, as a partial sync sees them."""
+    dates = [d for _, _, d in dataset.data]
+    on_day = sum(d == day for d in dates)
+    return DataSet([row for i, row in enumerate(dataset.data)
+                    if row[2] < day or (row[2] == day and i - dates.index(day) < on_day * keep)])
+
+
+def _since(dataset, day):
+    return DataSet([row for row in dataset.data if row[2] >= day])
+
+
+def test_incremental_sync_matches_full(tmp_path, arrivals):
+    store = CountStore(str(tmp_path))
+    day = datetime(2019, 4, 10)
+
+    store.update(1, 0, _until(arrivals, day, keep=0.5))
+    assert store.high_water_mark(1, 0) == np.datetime64('2019-04-10')
+
+    store.update(1, 0, _since(arrivals, day))
+    first, counts = store.daily_counts(1, 0)
+    expected_first, expected_counts = arrivals.daily_counts()
+
+    assert first == expected_first
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+@pytest.mark.parametrize('time_interval', [TimeInterval.DAY, TimeInterval.WEEK])
+def test_extended_ml_dataset_matches_full(tmp_path, arrivals, time_interval):
+    store = CountStore(str(tmp_path))
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=time_interval)
+
+    store.update(1, 0, _until(arrivals, datetime(2019, 5, 1), keep=0.3))
+    store.ml_dataset(model, 1, 0)
+    store.update(1, 0, _since(arrivals, datetime(2019, 5, 1)))
+    extended = store.ml_dataset(model, 1, 0)
+    full = model.create_ml_dataset(arrivals)
+
+    for actual, expected in zip(extended.inputs + extended.outputs, full.inputs + full.outputs):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_update_ignores_synced_days(tmp_path):
+    store = CountStore(str(tmp_path))
+    store.update(1, 0, DataSet([(1, 0, datetime(2020, 1, 1)), (1, 0, datetime(2020, 1, 3))]))
+
+    store.update(1, 0, DataSet([(1, 0, datetime(2020, 1, 2)), (1, 0, datetime(2020, 1, 3)),
+                                (1, 0, datetime(2020, 1, 3)), (1, 0, datetime(2020, 1, 5))]))
+    first, counts = store.daily_counts(1, 0)
+
+    assert first == np.datetime64('2020-01-01')
+    assert counts.tolist() == [1, 0, 2, 0, 1]
+    assert store.high_water_mark(1, 0) == np.datetime64('2020-01-05')
+
+
+def test_synced_until_without_arrivals(tmp_path):
+    store = CountStore(str(tmp_path))
+    assert store.high_water_mark(1, 0) is None
+
+    store.update(1, 0, DataSet([]), synced_until=datetime(2020, 1, 31))
+    first, counts = store.daily_counts(1, 0)
+
+    assert store.high_water_mark(1, 0) == np.datetime64('2020-01-31')
+    assert first is None and len(counts) == 0
@@ -0,0 +1,188 @@
+from triage_ml.data.database import ConnectionPool, Database
+from triage_ml.data.chunked_dataset import ChunkedDataSet
+from psycopg2.pool import PoolError
+from triage_ml.data.dataset import TimeInterval
+
+from datetime import date, datetime
+import numpy as np
+import pytest
+import threading
+
+
+class FakeCursor:
+
+    def __init__(self, rows, name=None):
+        self.rows = list(rows)
+        self.name = name
+        self.executed = []
+        self.fetch_sizes = []
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, name=None):
+        self.cursors.append(FakeCursor(self.rows, name))
+        return self.cursors[-1]
+
+    def rollback(self):
+        return
+
+    def close(self):
+        return
+
+
+def _database(rows):
+    conn = FakeConnection(rows)
+    return Database('triage', 'user', 'pass', 'localhost', 5432, connect=lambda **kwargs: conn), conn
+
+
+def test_get_arrivals_pushes_down_filters():
+    rows = [(1, 0, date(2020, 1, 1)), (1, 0, date(2020, 1, 2)), (1, 0, date(2020, 1, 2))]
+    database, conn = _database(rows)
+
+    dataset = database.get_arrivals('arrivals', clinic_id=1, severity=0, start_date=date(2020, 1, 1), batch_size=2)
+
+    cursor = conn.cursors[0]
+    assert cursor.name is not None
+    assert cursor.executed == [(
+        'SELECT clinic_id, severity, date_received FROM arrivals '
+        'WHERE clinic_id = %s AND severity = %s AND date_received >= %s ORDER BY date_received',
+        [1, 0, date(2020, 1, 1)],
+    )]
+    assert cursor.fetch_sizes == [2, 2, 2]
+    assert cursor.closed
+    assert dataset.data == [(1, 0, datetime(2020, 1, 1)), (1, 0, datetime(2020, 1, 2)), (1, 0, datetime(2020, 1, 2))]
+
+
+def test_iter_arrivals_batches():
+    database, _ = _database([(1, 0, date(2020, 1, day)) for day in range(1, 6)])
+
+    assert [len(chunk) for chunk in database.iter_arrivals('arrivals', batch_size=2)] == [2, 2, 1]
+
+
+def test_chunked_dataset_streams_cursor():
+    database, conn = _database([(1, 0, date(2020, 1, day)) for day in range(1, 6)])
+
+    chunked = ChunkedDataSet.from_database(database, 'arrivals', clinic_id=1, chunk_size=2)
+    first, counts = chunked.daily_counts()
+
+    assert first == np.datetime64('2020-01-01') and counts.tolist() == [1, 1, 1, 1, 1]
+    assert conn.cursors[0].fetch_sizes == [2, 2, 2, 2]
+    assert conn.cursors[0].executed[0][1] == [1]
+
+
+def test_get_arrival_counts():
+    rows = [(1, 0, date(2019, 12, 29), 3), (1, 0, date(2020, 1, 1), 2), (1, 0, date(2020, 1, 5), 4)]
+    database, conn = _database(rows)
+
+    counts = database.get_arrival_counts('arrivals', TimeInterval.WEEK, end_date=date(2020, 1, 31))
+
+    assert counts == rows
+    query, params = conn.cursors[0].executed[0]
+    assert 'GROUP BY 1, 2, 3' in query
+    # Sunday weeks that restart on new year's day, as DataSet.group_by buckets them
+    assert "date_trunc('week', date_received + interval '1 day') - interval '1 day'" in query
+    assert "date_trunc('year', date_received)" in query
+    assert params == [date(2020, 1, 31)]
+
+
+def test_get_daily_counts():
+    database, _ = _database([(1, 0, date(2020, 1, 1), 2), (1, 0, date(2020, 1, 4), 1)])
+
+    first, counts = database.get_daily_counts('arrivals', 1, 0)
+
+    assert first == np.datetime64('2020-01-01')
+    assert counts.tolist() == [2, 0, 0, 1]
+
+
+def test_invalid_identifier():
+    database, _ = _database([])
+
+    with pytest.raises(ValueError):
+        database.get_arrivals('arrivals; DROP TABLE arrivals')
+
+
+def _pool(min_size, max_size):
+    connections = []
+
+    def connect(**kwargs):
+        connections.append(FakeConnection([(1, 0, date(2020, 1, 1))]))
+        return connections[-1]
+
+    return ConnectionPool(min_size, max_size, connect=connect, dbname='triage'), connections
+
+
+def test_pool_reuses_connections():
+    pool, connections = _pool(0, 2)
+    database = Database(pool=pool)
+    other_table = Database(pool=pool)
+
+    for clinic_id in range(5):
+        database.get_arrivals('arrivals', clinic_id=clinic_id)
+        other_table.get_arrival_counts('counts', clinic_id=clinic_id)
+
+    assert len(connections) == 1
+    assert pool.stats()['checkouts'] == 10
+    assert pool.stats()['exhausted'] == 0
+
+
+def test_close_leaves_shared_pool_open():
+    pool, connections = _pool(1, 2)
+
+    Database(pool=pool).close()
+    with pool.connection() as conn:
+        assert conn is connections[0]
+
+    database = Database.pooled('triage', None, None, None, None, connect=lambda **kwargs: FakeConnection([]))
+    database.close()
+    with pytest.raises(PoolError):
+        database.pool.getconn()
+
+
+def test_pool_exhaustion_waits():
+    pool, connections = _pool(1, 1)
+    conn = pool.getconn()
+    checked_out = []
+
+    waiter = threading.Thread(target=lambda: checked_out.append(pool.getconn()))
+    waiter.start()
+    waiter.join(0.1)
+    assert not checked_out
+
+    pool.putconn(conn)
+    waiter.join()
+
+    assert checked_out == [conn]
+    assert pool.exhausted == 1
+    assert pool.max_wait_time >= 0.1
+
+
+def test_pool_timeout():
+    pool, _ = _pool(1, 1)
+
+    with pool.connection():
+        with pytest.raises(PoolError):
+            pool.getconn(timeout=0.01)
+
+    with pool.connection() as conn:
+        assert conn is not None
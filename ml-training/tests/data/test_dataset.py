@@ -1,5 +1,7 @@
-from triage_ml.data.dataset import DataSet
+from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval, interval_index, interval_start
+from collections import Counter
 import pytest
+import numpy as np
 from datetime import datetime
 
 
@@ -63,3 +65,152 @@ def test_aggregate_on_dates(test_data):
     assert len(agg['2020-01-05']) == 1
     assert len(agg['2020-01-07']) == 4
     assert len(agg['2020-01-11']) == 2
+
+
+def _expected_groups(dataset, time_interval):
+    weeks = interval_index(dataset.columns['date_received'], time_interval)
+    return Counter(zip(dataset.columns['clinic_id'].tolist(), dataset.columns['severity'].tolist(), weeks.tolist()))
+
+
+@pytest.mark.parametrize('clinic_ids', [[1, 2, 3], [1, 2_000_000_000]])
+def test_group_by(clinic_ids):
+    rng = np.random.default_rng(0)
+    dataset = DataSet.from_columns(rng.choice(clinic_ids, 1000), rng.integers(0, 5, 1000),
+                                   np.datetime64('2019-12-01') + rng.integers(0, 100, 1000))
+
+    groups = dataset.group_by(['clinic_id', 'severity', 'date_received'], TimeInterval.WEEK,
+                              reductions={'first': ('date_received', 'min'), 'severity_sum': ('severity', 'sum')})
+
+    weeks = interval_index(groups['date_received'], TimeInterval.WEEK)
+    keys = list(zip(groups['clinic_id'].tolist(), groups['severity'].tolist(), weeks.tolist()))
+    assert keys == sorted(_expected_groups(dataset, TimeInterval.WEEK))
+    assert dict(zip(keys, groups['count'].tolist())) == _expected_groups(dataset, TimeInterval.WEEK)
+    assert groups['clinic_id'].dtype == np.int32 and groups['date_received'].dtype == np.dtype('datetime64[D]')
+    assert np.all(groups['first'] >= groups['date_received'])
+    assert np.all(interval_index(groups['first'], TimeInterval.WEEK) == weeks)
+    np.testing.assert_array_equal(groups['severity_sum'], groups['severity'] * groups['count'])
+
+
+def test_group_by_days(test_data):
+    groups = DataSet(test_data).group_by(['date_received'], reductions={'mean_severity': ('severity', 'mean')})
+    first, counts = DataSet(test_data).daily_counts()
+
+    np.testing.assert_array_equal(groups['date_received'], first + np.flatnonzero(counts))
+    np.testing.assert_array_equal(groups['count'], counts[counts > 0])
+    assert len(groups['mean_severity']) == len(groups['count'])
+
+
+def test_group_by_empty():
+    groups = DataSet([]).group_by(['clinic_id', 'date_received'], reductions={'last': ('date_received', 'max')})
+
+    assert all(len(column) == 0 for column in groups.values())
+    assert groups['date_received'].dtype == np.dtype('datetime64[D]')
+
+
+def test_group_by_rejects_unknown_reductions(test_data):
+    with pytest.raises(ValueError):
+        DataSet(test_data).group_by(['clinic_id'], reductions={'median': ('severity', 'median')})
+    with pytest.raises(ValueError):
+        DataSet(test_data).group_by(['clinic_id'], reductions={'total': ('date_received', 'sum')})
+
+
+def test_interval_start():
+    days = np.arange(np.datetime64('2015-01-01'), np.datetime64('2021-01-01'))
+
+    for time_interval in TimeInterval:
+        indices = interval_index(days, time_interval)
+        starts = interval_start(np.unique(indices), time_interval)
+        np.testing.assert_array_equal(starts, days[np.flatnonzero(np.diff(indices, prepend=-1))])
+
+
+def test_typed_columns(test_data):
+    dataset = DataSet(test_data)
+
+    assert dataset.columns['clinic_id'].dtype == np.int32
+    assert dataset.columns['severity'].dtype == np.int8
+    assert dataset.columns['date_received'].dtype == np.dtype('datetime64[D]')
+    assert dataset[0] == test_data[0]
+    assert dataset.data == test_data
+
+
+def test_slice(test_data):
+    dataset = DataSet(test_data)
+
+    assert isinstance(dataset[1:3], DataSet)
+    assert dataset[1:3].data == test_data[1:3]
+    assert dataset[::-2].data == test_data[::-2]
+    assert dataset[-1] == test_data[-1]
+    assert len(dataset) == len(test_data)
+
+
+def test_filter_mask_matches_filter_on(test_data):
+    vectorized = DataSet(test_data).filter_mask('date_received', lambda d: d >= datetime(2020, 1, 5))
+    per_value = DataSet(test_data).filter_on('date_received', lambda d: d >= datetime(2020, 1, 5))
+
+    assert vectorized.data == per_value.data
+    assert vectorized.data == [point for point in test_data if point[2] >= datetime(2020, 1, 5)]
+
+
+def test_filter_on_applies_predicate_per_value(test_data):
+    # A predicate that is not vectorized is never applied to the whole column
+    dataset = DataSet(test_data).filter_on('clinic_id', lambda c_id: c_id in {1})
+
+    assert dataset.data == [point for point in test_data if point[0] == 1]
+    with pytest.raises(ValueError):
+        DataSet(test_data).filter_mask('clinic_id', lambda c_id: 1 in c_id)
+
+
+def test_order_by_descending_is_stable(test_data):
+    dataset = DataSet(test_data).order_by('date_received', descending=True)
+
+    assert dataset.data == sorted(test_data, key=lambda point: point[2], reverse=True)
+
+
+def test_from_columns():
+    dataset = DataSet.from_columns([1, 2], [0, 1], np.array(['2020-01-01', '2020-01-02'], dtype='datetime64[D]'))
+
+    assert len(dataset) == 2
+    assert dataset[-1] == (2, 1, datetime(2020, 1, 2))
+
+
+def test_daily_counts(test_data):
+    first, counts = DataSet(test_data).daily_counts()
+
+    assert first == np.datetime64('2020-01-01')
+    assert counts.tolist() == [1, 0, 2, 1, 1, 0, 4, 0, 0, 0, 2]
+
+
+def test_ml_dataset_strided():
+    series = np.arange(10, dtype=np.float64).reshape(-1, 1)
+    copied = MLDataSet([series], [series], [series], seq_size=3)
+    strided = MLDataSet([series], [series], [series], seq_size=3, strided=True)
+
+    assert np.array_equal(copied.inputs[0], strided.inputs[0])
+    assert strided.inputs[0].shape == (7, 3, 1)
+    assert np.shares_memory(strided.inputs[0], series)
+    assert not strided.inputs[0].flags.writeable
+
+
+def test_ml_dataset_split_views():
+    series = np.arange(10, dtype=np.float64).reshape(-1, 1)
+    ml_dataset = MLDataSet([series], [series], [series], seq_size=2, strided=True)
+
+    train, test = ml_dataset.split(0.75)
+
+    assert (len(train), len(test)) == (6, 2)
+    assert np.array_equal(test.outputs[0], series[8:])
+    assert np.array_equal(test.inputs[0][0], series[6:8])
+    for part in (train, test):
+        assert all(np.shares_memory(x, series) for x in part.inputs + part.outputs)
+
+
+def test_partition_on():
+    data = [(2, 0, datetime(2020, 1, 1)), (1, 1, datetime(2020, 1, 2)), (2, 0, datetime(2020, 1, 3)),
+            (1, 0, datetime(2020, 1, 4))]
+    dataset = DataSet(data)
+
+    partitions = dataset.partition_on(['clinic_id', 'severity'])
+
+    assert list(partitions.keys()) == [(1, 0), (1, 1), (2, 0)]
+    assert partitions[(2, 0)].data == [data[0], data[2]]
+    assert partitions[(1, 1)].data == [data[1]]
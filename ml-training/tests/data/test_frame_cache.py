@@ -0,0 +1,74 @@
+from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.data.frame_cache import FrameCache
+from triage_ml.models.radius_variance import RadiusVariance
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def arrivals():
+    rng = np.random.RandomState(0)
+    start = datetime(2019, 1, 1)
+    return DataSet([(1, 0, start + timedelta(days=int(day))) for day in np.sort(rng.randint(0, 200, 2000))])
+
+
+def test_cached_ml_dataset_matches_built(tmp_path, arrivals):
+    cache = FrameCache(str(tmp_path))
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.DAY)
+    expected = model.create_ml_dataset(arrivals)
+
+    for _ in range(2):
+        ml_dataset = cache.ml_dataset(model, arrivals, strided=True)
+        for actual, expected_array in zip(ml_dataset.inputs + ml_dataset.outputs, expected.inputs + expected.outputs):
+            np.testing.assert_array_equal(actual, expected_array)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert isinstance(cache.frame(model, *arrivals.daily_counts())[0], np.memmap)
+
+
+def test_key_depends_on_counts_and_model(arrivals):
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.DAY)
+    start, counts = arrivals.daily_counts()
+    key = FrameCache.key(model, start, counts)
+
+    # The sequence size only changes how a frame is windowed
+    assert FrameCache.key(RadiusVariance(seq_size=8, radius=2, time_interval=TimeInterval.DAY), start, counts) == key
+    assert FrameCache.key(RadiusVariance(seq_size=4, radius=3, time_interval=TimeInterval.DAY), start, counts) != key
+    assert FrameCache.key(RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.WEEK), start, counts) != key
+    assert FrameCache.key(model, start + 1, counts) != key
+
+    changed = counts.copy()
+    changed[-1] += 1
+    assert FrameCache.key(model, start, changed) != key
+
+
+def test_evicts_least_recently_used(tmp_path, arrivals):
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.DAY)
+    start, counts = arrivals.daily_counts()
+    series = [counts + i for i in range(3)]
+
+    for daily_counts in series[:2]:
+        FrameCache(str(tmp_path)).frame_files(model, start, daily_counts)
+    entry_size = FrameCache(str(tmp_path)).size() // 2
+
+    cache = FrameCache(str(tmp_path), max_bytes=2 * entry_size)
+    # Used most recently, so the second series is evicted instead
+    cache.frame_files(model, start, series[0])
+    cache.frame_files(model, start, series[2])
+
+    assert cache.evictions == 1
+    assert cache.stats() == {'entries': 2, 'bytes': 2 * entry_size, 'hits': 1, 'misses': 1, 'evictions': 1}
+    assert FrameCache.key(model, start, series[1]) not in {key for key, _, _ in cache._entries()}
+
+
+def test_keeps_frames_in_use(tmp_path, arrivals):
+    model = RadiusVariance(seq_size=4, radius=2, time_interval=TimeInterval.DAY)
+    start, counts = arrivals.daily_counts()
+    cache = FrameCache(str(tmp_path), max_bytes=1)
+
+    files = [cache.frame_files(model, start, counts + i) for i in range(2)]
+
+    assert cache.evictions == 0
+    assert all(np.load(file).size for frame_files in files for file in frame_files)
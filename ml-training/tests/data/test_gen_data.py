@@ -0,0 +1,72 @@
+from triage_ml.data import gen_data, storage
+
+from datetime import datetime
+import numpy as np
+import pytest
+
+
+def test_cyclic_daily_counts():
+    dataset = gen_data.cyclic(datetime(2018, 1, 1), datetime(2018, 12, 31), seed=0)
+    first, counts = dataset.daily_counts()
+
+    d = np.arange(365)
+    assert first == np.datetime64('2018-01-01')
+    np.testing.assert_array_equal(counts, np.round(20 + d / 300 + 2 * np.sin(2 * np.pi * d / 365)))
+    assert set(dataset.columns['clinic_id']) == {1}
+    assert set(dataset.columns['severity']) == {0, 1, 2}
+
+
+def test_poisson_is_reproducible():
+    first = gen_data.arrival_counts(datetime(2018, 1, 1), datetime(2018, 3, 1), 'poisson', clinics=3, seed=7)
+    second = gen_data.arrival_counts(datetime(2018, 1, 1), datetime(2018, 3, 1), 'poisson', clinics=3, seed=7)
+
+    assert first.shape == (60, 3, len(gen_data.SEVERITY_PROBS))
+    np.testing.assert_array_equal(first, second)
+
+
+def test_iter_arrivals_chunks():
+    counts = gen_data.arrival_counts(datetime(2018, 1, 1), datetime(2018, 2, 1), clinics=4, seed=0)
+    chunks = list(gen_data.iter_arrivals(datetime(2018, 1, 1), counts, chunk_size=200))
+    dataset = gen_data.to_dataset(datetime(2018, 1, 1), counts)
+
+    assert len(chunks) > 1
+    assert sum(len(chunk) for chunk in chunks) == len(dataset) == counts.sum()
+    assert [row for chunk in chunks for row in chunk.data] == dataset.data
+    assert set(dataset.columns['clinic_id']) == {1, 2, 3, 4}
+
+
+@pytest.mark.parametrize('extension', ['csv', 'npz'])
+def test_streamed_files_match(tmp_path, extension):
+    # Clinic IDs of different widths exercise the fixed width line runs of the CSV writer
+    counts = gen_data.arrival_counts(datetime(2018, 1, 1), datetime(2018, 1, 20), 'poisson', clinics=12, seed=1)
+    file_name = str(tmp_path / f'data.{extension}')
+    writer = gen_data.write_npz if extension == 'npz' else gen_data.write_csv
+
+    writer(datetime(2018, 1, 1), counts, file_name, chunk_size=500)
+    loaded = storage.load_dataset(file_name)
+    expected = gen_data.to_dataset(datetime(2018, 1, 1), counts)
+
+    for attribute, column in expected.columns.items():
+        np.testing.assert_array_equal(loaded.columns[attribute], column)
+
+
+def test_write_npz_columns_checks_length(tmp_path):
+    with pytest.raises(ValueError):
+        storage.write_npz_columns(str(tmp_path / 'data.npz'), 3, lambda attribute: [np.zeros(2)])
+
+
+def test_visualization_plots_counts(tmp_path, monkeypatch):
+    plotted = []
+    monkeypatch.setattr(gen_data.visualizations, 'visualize_daily_counts', lambda *args: plotted.append(args))
+    monkeypatch.setattr(gen_data, 'to_dataset', None)
+    monkeypatch.setattr('sys.argv', ['triage-gendata', '-m', 'poisson', '-sd', '2018-01-01', '-ed', '2018-03-01',
+                                     '-c', '2', '--seed', '0', '-o', str(tmp_path / 'data.npz'),
+                                     '-v', str(tmp_path / 'data.png')])
+
+    gen_data.main()
+
+    (first, counts, output_file), = plotted
+    expected_first, expected_counts = storage.read_npz(str(tmp_path / 'data.npz')).daily_counts()
+    assert first == expected_first
+    np.testing.assert_array_equal(counts, expected_counts)
+    assert output_file == str(tmp_path / 'data.png')
@@ -0,0 +1,32 @@
+from triage_ml.data.dataset import MLDataSet
+from triage_ml.data.pipeline import make_dataset
+
+import numpy as np
+
+
+def _ml_dataset(strided):
+    series = np.arange(20, dtype=np.float64).reshape(-1, 1)
+    dates = np.arange(40, dtype=np.float64).reshape(-1, 2)
+    outputs = np.hstack([series, 2 * series])
+    return MLDataSet([series], [dates], [outputs], seq_size=4, strided=strided)
+
+
+def test_make_dataset_matches_ml_dataset():
+    for strided in (False, True):
+        ml_dataset = _ml_dataset(strided)
+
+        batches = list(make_dataset(ml_dataset, batch_size=5))
+
+        assert [len(outputs) for _, outputs in batches] == [5, 5, 5, 1]
+        for i, name in enumerate(['sequences', 'dates']):
+            streamed = np.concatenate([inputs[i].numpy() for inputs, _ in batches])
+            assert np.array_equal(streamed, ml_dataset.inputs[i]), name
+        assert np.array_equal(np.concatenate([outputs.numpy() for _, outputs in batches]), ml_dataset.outputs[0])
+
+
+def test_make_dataset_shuffle_keeps_samples():
+    ml_dataset = _ml_dataset(True)
+
+    outputs = np.concatenate([outputs.numpy() for _, outputs in make_dataset(ml_dataset, shuffle=True)])
+
+    assert np.array_equal(np.sort(outputs, axis=0), ml_dataset.outputs[0])
@@ -0,0 +1,88 @@
+from triage_ml.data.dataset import DataSet
+from triage_ml.data import storage
+
+from datetime import datetime
+import numpy as np
+import pytest
+
+
+def test_npz_round_trip(tmp_path):
+    dataset = storage.read_csv('tests/test_data.txt')
+    file_name = str(tmp_path / 'data.npz')
+
+    dataset.write_to_file(file_name)
+    loaded = DataSet.read_from_file(file_name)
+
+    assert storage.is_binary(file_name)
+    assert loaded.data == dataset.data
+    for attribute, column in loaded.columns.items():
+        assert isinstance(column, np.memmap)
+        assert column.dtype == dataset.columns[attribute].dtype
+
+
+def test_npz_without_mmap(tmp_path):
+    dataset = storage.read_csv('tests/test_data.txt')
+    file_name = str(tmp_path / 'data.npz')
+    dataset.write_to_file(file_name)
+
+    loaded = storage.read_npz(file_name, mmap=False)
+
+    assert not any(isinstance(column, np.memmap) for column in loaded.columns.values())
+    assert loaded.data == dataset.data
+
+
+def test_npz_empty(tmp_path):
+    file_name = str(tmp_path / 'empty.npz')
+    DataSet([]).write_to_file(file_name)
+
+    assert len(DataSet.read_from_file(file_name)) == 0
+
+
+def test_load_dataset_detects_csv():
+    assert not storage.is_binary('tests/test_data.txt')
+    assert len(storage.load_dataset('tests/test_data.txt')) == 11
+
+
+def test_read_csv_filters(tmp_path):
+    file_name = str(tmp_path / 'data.txt')
+    DataSet([(1, 0, datetime(2020, 1, 1)), (2, 0, datetime(2020, 1, 2)), (1, 1, datetime(2020, 1, 3)),
+             (1, 0, datetime(2020, 1, 4))]).write_to_file(file_name)
+
+    dataset = storage.read_csv(file_name, clinic_id=1, severity=0, block_size=16)
+
+    assert dataset.data == [(1, 0, datetime(2020, 1, 1)), (1, 0, datetime(2020, 1, 4))]
+
+
+def test_read_csv_blocks_match():
+    whole = storage.read_csv('tests/test_data.txt')
+    blocks = storage.read_csv('tests/test_data.txt', block_size=7)
+
+    assert blocks.data == whole.data
+    assert whole.data == DataSet(_read_lines('tests/test_data.txt')).data
+
+
+def test_read_csv_line_endings(tmp_path):
+    file_name = tmp_path / 'data.txt'
+    file_name.write_bytes(b'12,0,2019-12-31\r\n\r\n3,2,2020-02-29\r\n1,1,1969-07-20')
+
+    assert storage.read_csv(str(file_name), block_size=4).data == \
+        [(12, 0, datetime(2019, 12, 31)), (3, 2, datetime(2020, 2, 29)), (1, 1, datetime(1969, 7, 20))]
+
+
+@pytest.mark.parametrize('text', ['1,0,2020-02-30\n', '1,0,2020-13-01\n', '1,0\n', '1,0,2020-01-01,2\n',
+                                  'a,0,2020-01-01\n', 'clinic_id\n'])
+def test_read_csv_rejects_malformed_lines(tmp_path, text):
+    file_name = tmp_path / 'data.txt'
+    file_name.write_text(text)
+
+    with pytest.raises(ValueError):
+        storage.read_csv(str(file_name))
+
+
+def _read_lines(file_name):
+    data = []
+    with open(file_name) as f:
+        for line in f.readlines():
+            line = line.rstrip().split(',')
+            data.append((int(line[0]), int(line[1]), datetime.strptime(line[2], '%Y-%m-%d')))
+    return data
@@ -0,0 +1,47 @@
+from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.data.gen_data import cyclic
+from triage_ml.models.global_radius_variance import GlobalRadiusVariance
+from triage_ml.models.radius_variance import RadiusVariance
+
+from datetime import datetime
+import numpy as np
+
+
+def _dataset() -> DataSet:
+    return cyclic(datetime(2017, 1, 1), datetime(2019, 12, 31), clinics=2, seed=0)
+
+
+def test_create_ml_dataset_stacks_series():
+    dataset = _dataset()
+    model = GlobalRadiusVariance([1, 2], [0, 1, 2], seq_size=10, radius=3, time_interval=TimeInterval.WEEK)
+
+    series = model.create_series_ml_datasets(dataset)
+    ml_dataset = model.create_ml_dataset(dataset)
+
+    assert list(series) == [(c, s) for c in [1, 2] for s in [0, 1, 2]]
+    assert len(ml_dataset) == sum(len(data) for data in series.values())
+    assert [x.shape[1:] for x in ml_dataset.inputs] == [(10, 1), (43,), (1,), (1,)]
+
+    # Each series holds the same samples as a RadiusVariance trained on it alone
+    rv_model = RadiusVariance(seq_size=10, radius=3, time_interval=TimeInterval.WEEK)
+    partition = dataset.partition_on(['clinic_id', 'severity'])[(2, 1)]
+    expected = rv_model.create_ml_dataset(partition)
+    actual = model.series_samples(ml_dataset, 2, 1)
+    assert len(actual) == len(expected)
+    for x, y in zip(actual.inputs[:2] + actual.outputs, expected.inputs + expected.outputs):
+        np.testing.assert_array_equal(x, y)
+    assert set(actual.inputs[2][:, 0]) == {1} and set(actual.inputs[3][:, 0]) == {1}
+
+
+def test_predict_per_series():
+    dataset = _dataset()
+    model = GlobalRadiusVariance([1, 2], [0, 1, 2], seq_size=10, radius=3, time_interval=TimeInterval.WEEK)
+    ml_dataset = model.create_ml_dataset(dataset)
+
+    seeds = [x[[0, -1]] for x in ml_dataset.inputs]
+    predictions = model.predict(seeds, ml_dataset.inputs[1][:5])
+
+    assert predictions.shape == (5, 2, 2)
+    dates = np.repeat(ml_dataset.inputs[1][:1], 2, axis=0)
+    first = model.get_model()([seeds[0], dates, seeds[2], seeds[3]], training=False).numpy()
+    np.testing.assert_allclose(predictions[0], first, rtol=1e-5)
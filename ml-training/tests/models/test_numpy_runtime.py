@@ -0,0 +1,47 @@
+from triage_ml.models.numpy_runtime import NumpyRadiusVariance, export_weights
+from triage_ml.models.radius_variance import RadiusVariance
+from triage_ml.data.dataset import TimeInterval
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model = RadiusVariance(seq_size=5, radius=2, time_interval=TimeInterval.WEEK)
+
+    # Randomize every weight, biases included, so that no gate or activation goes untested
+    rng = np.random.RandomState(0)
+    model.get_model().set_weights([rng.normal(0, 0.5, w.shape) for w in model.get_model().get_weights()])
+
+    file_name = str(tmp_path_factory.mktemp('bundle') / 'weights.npz')
+    export_weights(model, file_name)
+    return model, NumpyRadiusVariance.load(file_name)
+
+
+def test_load_metadata(models):
+    _, runtime = models
+
+    assert runtime.seq_size == 5
+    assert runtime.radius == 2
+    assert runtime.time_interval == 'WEEK'
+
+
+def test_call_matches_keras(models):
+    model, runtime = models
+    rng = np.random.RandomState(1)
+    inputs = [rng.poisson(10, (16, 5, 1)).astype(np.float32), np.eye(43, dtype=np.float32)[rng.randint(0, 43, 16)]]
+
+    np.testing.assert_allclose(runtime(inputs), model.get_model()(inputs).numpy(), rtol=1e-4, atol=1e-5)
+
+
+def test_predict_matches_keras(models):
+    model, runtime = models
+    rng = np.random.RandomState(2)
+    seeds = rng.poisson(3, (8, 5, 1)).astype(np.float32)
+    dates = np.eye(43, dtype=np.float32)[rng.randint(0, 43, 12)]
+
+    preds = runtime.predict([seeds], dates)
+
+    assert preds.shape == (12, 8, 2)
+    np.testing.assert_allclose(preds, model.predict([seeds], dates), rtol=1e-4, atol=1e-4)
@@ -34,7 +34,7 @@ def test_train_model(test_dataset):
     weights = model.get_model().get_weights()
 
     model.get_model().compile(
-        optimizer=Adam(lr=0.001),
+        optimizer=Adam(learning_rate=0.001),
         loss='mse'
     )
     model.get_model().fit(x=ml_dataset.inputs, y=ml_dataset.outputs, epochs=1)
@@ -49,7 +49,7 @@ def test_prediction(test_dataset):
     model = RadiusVariance(seq_size=2, radius=1)
     ml_dataset = model.create_ml_dataset(test_dataset)
     model.get_model().compile(
-        optimizer=Adam(lr=0.001),
+        optimizer=Adam(learning_rate=0.001),
         loss='mse'
     )
 
@@ -62,7 +62,7 @@ def test_prediction_batch(test_dataset):
     model = RadiusVariance(seq_size=2, radius=1)
     ml_dataset = model.create_ml_dataset(test_dataset)
     model.get_model().compile(
-        optimizer=Adam(lr=0.001),
+        optimizer=Adam(learning_rate=0.001),
         loss='mse'
     )
 
@@ -71,6 +71,34 @@ def test_prediction_batch(test_dataset):
     assert y_hat.shape == (2, 2)
 
 
+def test_forecast_slides_window():
+    model = RadiusVariance(seq_size=3, radius=1)
+    rng = np.random.RandomState(0)
+    seeds = rng.randint(0, 10, (4, 3, 1)).astype(np.float32)
+    dates = np.eye(43, dtype=np.float32)[rng.randint(0, 43, 6)]
+
+    preds = model.predict([seeds], dates)
+
+    assert preds.shape == (6, 4, 2)
+    windows = seeds.copy()
+    for i, date in enumerate(dates):
+        expected = model.get_model()([windows, np.repeat(date[np.newaxis], 4, axis=0)]).numpy()
+        np.testing.assert_allclose(preds[i], expected, rtol=1e-5, atol=1e-6)
+        windows = np.concatenate([windows[:, 1:], expected[:, np.newaxis, :1]], axis=1)
+
+
+def test_forecast_per_seed_dates():
+    model = RadiusVariance(seq_size=2, radius=1)
+    seeds = np.arange(6, dtype=np.float32).reshape((3, 2, 1))
+    dates = np.eye(43, dtype=np.float32)[np.arange(15).reshape((5, 3))]
+
+    preds = model.predict([seeds], dates)
+    single = model.predict([seeds[1:2]], dates[:, 1])
+
+    assert preds.shape == (5, 3, 2)
+    np.testing.assert_allclose(preds[:, 1:2], single, rtol=1e-5, atol=1e-6)
+
+
 def test_create_ml_dataset(test_dataset):
     model = RadiusVariance(seq_size=2, radius=3)
     ml_dataset = model.create_ml_dataset(test_dataset)
@@ -109,3 +137,22 @@ def test_create_ml_dataset_week_interval(test_dataset):
     ml_dataset = model.create_ml_dataset(test_dataset)
 
     assert ml_dataset.inputs[0] == np.array([[4.]])
+
+
+def test_create_ml_dataset_radius_variance(test_dataset):
+    model = RadiusVariance(seq_size=1, radius=1)
+    ml_dataset = model.create_ml_dataset(test_dataset)
+
+    # Daily arrivals from 2020-01-01 to 2020-01-11
+    counts = [1, 0, 2, 1, 1, 0, 4, 0, 0, 0, 2]
+    expected = [[counts[i], np.var(counts[i - 1:i + 2])] for i in range(1, len(counts) - 1)]
+
+    assert np.array_equal(ml_dataset.outputs[0], np.array(expected[1:]))
+
+
+def test_create_ml_dataset_date_encoding(test_dataset):
+    model = RadiusVariance(seq_size=1, radius=1)
+    ml_dataset = model.create_ml_dataset(test_dataset)
+
+    # The first prediction is for 2020-01-03
+    assert np.flatnonzero(ml_dataset.inputs[1][0]).tolist() == [1, 11 + 3]
@@ -0,0 +1,88 @@
+from triage_ml.backtest import aggregate_metrics, fold_origins, main, train_slice
+from triage_ml.data.gen_data import cyclic
+
+from datetime import datetime
+import csv
+import os
+import pytest
+
+
+def test_fold_origins():
+    assert fold_origins(100, 4, 3, 2, 10) == [92, 94, 96]
+    assert fold_origins(100, 4, 10, 20, 30) == [36, 56, 76, 96]
+    assert fold_origins(10, 4, 3, 1, 10) == []
+    assert fold_origins(100, 4, 3, 2, 90, gap=4) == [94, 96]
+
+
+@pytest.mark.parametrize('window', [None, 10])
+def test_training_targets_end_before_origin(window):
+    radius, horizon = 3, 4
+    for origin in fold_origins(100, horizon, 10, 1, 20, gap=radius):
+        samples = range(100)[train_slice(origin, radius, window)]
+
+        assert len(samples) >= (min(window, 20) if window else 20)
+        # The variance target of sample i covers intervals i - radius to i + radius
+        assert all(i + radius < origin for i in samples)
+        assert not set(range(samples[-1] - radius, samples[-1] + radius + 1)) & set(range(origin, origin + horizon))
+        if window:
+            assert len(samples) == window
+
+
+def test_aggregate_metrics():
+    rows = [
+        {'horizon': 1, 'arrivals': 10, 'predicted_arrivals': 12, 'variance': 4, 'predicted_variance': 4},
+        {'horizon': 1, 'arrivals': 10, 'predicted_arrivals': 6, 'variance': 4, 'predicted_variance': 1},
+        {'horizon': 2, 'arrivals': 5, 'predicted_arrivals': 5, 'variance': 2, 'predicted_variance': 3},
+    ]
+
+    first, second = aggregate_metrics(rows)
+
+    assert first['horizon'] == 1 and first['forecasts'] == 2
+    assert first['arrivals_mae'] == 3
+    assert first['arrivals_rmse'] == pytest.approx(10**0.5)
+    assert first['arrivals_bias'] == -1
+    assert first['variance_mae'] == 1.5
+    assert second == {'horizon': 2, 'forecasts': 1, 'arrivals_mae': 0, 'arrivals_rmse': 0, 'arrivals_bias': 0,
+                      'variance_mae': 1, 'variance_rmse': 1}
+    assert aggregate_metrics([]) == []
+
+
+def test_backtest(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2014, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+
+    main(str_args=['-s', '0', '2', f'-d={dataset_file}', '--horizon=3', '-f=4', '--chains=2', '-e=1',
+                   '--warm_epochs=1', '--min_train=20', '-j=2', f'-o={tmp_path}'])
+
+    with open(os.path.join(tmp_path, 'forecasts.csv')) as f:
+        forecasts = list(csv.DictReader(f))
+    with open(os.path.join(tmp_path, 'metrics.csv')) as f:
+        metrics = list(csv.DictReader(f))
+
+    assert len(forecasts) == 2 * 4 * 3
+    assert {(row['clinic_id'], row['severity']) for row in forecasts} == {('1', '0'), ('1', '2')}
+    assert [row['horizon'] for row in metrics] == ['1', '2', '3']
+    assert all(row['forecasts'] == '8' for row in metrics)
+    assert all(float(row['arrivals_mae']) >= 0 for row in metrics)
+
+
+def test_backtest_model_options(tmp_path):
+    from triage_ml.data.dataset import TimeInterval
+    from triage_ml.models.radius_variance import RadiusVariance
+
+    dataset = cyclic(datetime(2014, 1, 1), datetime(2016, 12, 31))
+    dataset_file = str(tmp_path / 'data.txt')
+    dataset.write_to_file(dataset_file)
+
+    main(str_args=['-s', '0', f'-d={dataset_file}', '--horizon=2', '-f=1', '-e=1', '--min_train=20', '-j=1',
+                   '--seq_size=10', '--radius=3', '--time_interval=DAY', '--lstm_units=4', '--dense_units=8',
+                   '--dropout=0', f'-o={tmp_path}'])
+
+    with open(os.path.join(tmp_path, 'forecasts.csv')) as f:
+        forecasts = list(csv.DictReader(f))
+
+    # The only origin forecasts up to the last daily sample of the model's sequence size and radius
+    dataset.filter_mask('severity', lambda s: s == 0)
+    samples = len(RadiusVariance(seq_size=10, radius=3, time_interval=TimeInterval.DAY)
+                  .create_ml_dataset(dataset, strided=True))
+    assert [(row['origin'], row['horizon']) for row in forecasts] == [(str(samples - 2), '1'), (str(samples - 2), '2')]
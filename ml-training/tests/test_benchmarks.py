@@ -0,0 +1,26 @@
+from tests.benchmarks import harness
+from tests.benchmarks.__main__ import main
+
+import json
+
+
+def test_run_saves_results(tmp_path):
+    output = str(tmp_path / 'results.json')
+
+    main(['-b', 'filter_on', '--years', '1', '--clinics', '1', '2', '--min_time', '0', '-o', output])
+
+    with open(output) as f:
+        results = json.load(f)
+    assert 'commit' in results['environment']
+    assert [result['params'] for result in results['results']] == [{'years': 1, 'clinics': 1},
+                                                                  {'years': 1, 'clinics': 2}]
+    assert all(result['median'] > 0 and result['unit'] == 'arrivals/s' for result in results['results'])
+
+
+def test_compare_marks_regressions():
+    def results(median):
+        return {'results': [{'name': 'bench', 'params': {'years': 1}, 'median': median}]}
+
+    assert harness.compare(results(1.0), results(1.1)) == [f'{"bench(years=1)":50}   1.10x']
+    assert harness.compare(results(1.0), results(2.0))[0].endswith('REGRESSION')
+    assert harness.compare(results(1.0), {'results': []}) == []
@@ -0,0 +1,120 @@
+from triage_ml.checkpoints import CheckpointManager, restore, training_callbacks
+from triage_ml.data.gen_data import cyclic
+from triage_ml.train_radius_variance import create_model, loss, train
+
+from datetime import datetime
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.optimizers import Adam
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return cyclic(datetime(2016, 1, 1), datetime(2019, 12, 31), seed=0)
+
+
+def _compiled_model():
+    model = create_model().get_model()
+    model.compile(optimizer=Adam(), loss=loss)
+    return model
+
+
+def test_save_latest_and_clear(tmp_path):
+    checkpoints = CheckpointManager(str(tmp_path / 'checkpoints'), every=2)
+    assert checkpoints.latest() is None
+
+    model = _compiled_model()
+    checkpoints.save(model, 4)
+
+    model_file, epochs = checkpoints.latest()
+    assert epochs == 4
+    restored, initial_epoch = restore(_compiled_model(), loss, checkpoints, resume=True)
+    assert initial_epoch == 4
+    for expected, actual in zip(model.get_weights(), restored.get_weights()):
+        np.testing.assert_array_equal(expected, actual)
+
+    checkpoints.clear()
+    assert checkpoints.latest() is None
+
+
+def test_restore_keeps_optimizer_state(dataset, tmp_path):
+    checkpoints = CheckpointManager(str(tmp_path))
+    rv_model = create_model()
+    ml_dataset = rv_model.create_ml_dataset(dataset, strided=True)
+    model = _compiled_model()
+    model.fit(x=ml_dataset.inputs, y=ml_dataset.outputs, batch_size=32, epochs=1, verbose=0)
+    checkpoints.save(model, 1)
+
+    restored, _ = restore(_compiled_model(), loss, checkpoints, resume=True)
+
+    assert int(restored.optimizer.iterations.numpy()) == int(model.optimizer.iterations.numpy()) > 0
+    restored.fit(x=ml_dataset.inputs, y=ml_dataset.outputs, batch_size=32, epochs=2, initial_epoch=1, verbose=0)
+
+
+def test_clear_keeps_other_files(tmp_path):
+    checkpoints = CheckpointManager(str(tmp_path))
+    checkpoints.save(_compiled_model(), 1)
+    (tmp_path / 'weights.h5').write_bytes(b'weights')
+
+    checkpoints.clear()
+
+    assert checkpoints.latest() is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['weights.h5']
+
+    CheckpointManager(str(tmp_path / 'checkpoints')).clear()
+    checkpoints = CheckpointManager(str(tmp_path / 'checkpoints'))
+    checkpoints.save(_compiled_model(), 1)
+    checkpoints.clear()
+    assert not (tmp_path / 'checkpoints').exists()
+
+
+def test_resume_continues_from_checkpoint(dataset, tmp_path, monkeypatch):
+    checkpoints = CheckpointManager(str(tmp_path / 'checkpoints'))
+    # Keep the checkpoints of the first run, as if it had crashed before finishing
+    monkeypatch.setattr(checkpoints, 'clear', lambda: None)
+    _, _, _, history = train(dataset, epochs=3, output_file=str(tmp_path / 'weights.h5'),
+                             checkpoints=checkpoints)
+    assert history.epoch == [0, 1, 2]
+    assert checkpoints.latest()[1] == 3
+
+    monkeypatch.undo()
+    _, _, _, history = train(dataset, epochs=5, output_file=str(tmp_path / 'weights.h5'),
+                             checkpoints=checkpoints, resume=True)
+    assert history.epoch == [3, 4]
+    assert checkpoints.latest() is None
+
+
+def test_warm_start(tmp_path):
+    weights_file = str(tmp_path / 'weights.h5')
+    model = _compiled_model()
+    model.save(weights_file)
+
+    warm_model, initial_epoch = restore(_compiled_model(), loss, warm_start=weights_file)
+
+    assert initial_epoch == 0
+    for expected, actual in zip(model.get_weights(), warm_model.get_weights()):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_resume_without_checkpoint_warm_starts(tmp_path):
+    weights_file = str(tmp_path / 'weights.h5')
+    model = _compiled_model()
+    model.save(weights_file)
+    checkpoints = CheckpointManager(str(tmp_path / 'checkpoints'))
+
+    warm_model, initial_epoch = restore(_compiled_model(), loss, checkpoints, resume=True,
+                                        warm_start=weights_file)
+
+    assert initial_epoch == 0
+    np.testing.assert_array_equal(model.get_weights()[0], warm_model.get_weights()[0])
+
+
+def test_training_callbacks(tmp_path):
+    assert training_callbacks() == []
+
+    callbacks = training_callbacks(CheckpointManager(str(tmp_path)), patience=3)
+
+    assert len(callbacks) == 2
+    assert isinstance(callbacks[1], EarlyStopping)
+    assert callbacks[1].patience == 3 and callbacks[1].restore_best_weights
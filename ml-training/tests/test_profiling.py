@@ -0,0 +1,54 @@
+from triage_ml.data.gen_data import cyclic
+from triage_ml.profiling import Profiler
+from triage_ml.train import main
+
+from datetime import datetime
+import json
+import os
+import pstats
+import numpy as np
+
+
+def test_stages_measure_time_and_memory():
+    profiler = Profiler(trace_memory=True)
+
+    with profiler.stage('allocate'):
+        data = np.ones(2**23)
+    report = profiler.finish()
+
+    stage, = report['stages']
+    assert stage['name'] == 'allocate'
+    assert stage['seconds'] > 0
+    assert stage['traced_peak_mb'] >= 64
+    assert stage['rss_mb'] > 0 and stage['peak_rss_mb'] > 0
+    assert data.sum() == 2**23
+
+
+def test_stage_recorded_on_error():
+    profiler = Profiler()
+
+    try:
+        with profiler.stage('failing'):
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    assert [stage['name'] for stage in profiler.report()['stages']] == ['failing']
+
+
+def test_train_writes_report(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2018, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+    report_file = str(tmp_path / 'report.json')
+    cprofile_file = str(tmp_path / 'train.prof')
+
+    main(str_args=['-m=radius_variance', '-c=1', '-s=2', '-e=2', f'-d={dataset_file}',
+                   f'-w={tmp_path / "weights.h5"}', f'-r={tmp_path / "results.png"}',
+                   f'--profile_report={report_file}', f'--profile={cprofile_file}'])
+
+    with open(report_file) as f:
+        report = json.load(f)
+    assert [stage['name'] for stage in report['stages']] == ['load', 'filter', 'windows', 'training', 'save', 'plot']
+    assert [epoch['epoch'] for epoch in report['epochs']] == [0, 1]
+    assert all(epoch['samples_per_second'] > 0 for epoch in report['epochs'])
+    assert os.path.isfile(cprofile_file) and pstats.Stats(cprofile_file).total_calls > 0
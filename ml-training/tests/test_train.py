@@ -1,20 +1,21 @@
+from triage_ml.data.gen_data import cyclic
 from triage_ml.models.radius_variance import RadiusVariance
 from triage_ml.train import main
 
+from datetime import datetime
 import uuid
 import os
 
 
-class FakeObj:
-
-    def __getitem__(self, key):
-        return 'test'
+class FakeResponse:
 
+    status_code = 200
 
-class FakeResponse:
+    def __init__(self, data):
+        self.data = data
 
     def json(self):
-        return FakeObj()
+        return self.data
 
     def raise_for_status(self):
         return
@@ -22,25 +23,29 @@ class FakeResponse:
 
 class FakeRequests:
 
-    def __init__(self):
+    def __init__(self, arrivals):
+        self.arrivals = arrivals
         self.calls = []
 
-    def post(self, url, json=None, headers=None):
+    def post(self, url, json=None, headers=None, timeout=None):
         self.calls.append((url, json, headers))
-        return FakeResponse()
+        return FakeResponse({'token': 'test'} if url.endswith('/auth/login') else self.arrivals)
 
 
-def test_load_data_from_database():
+def test_load_data_from_database(tmp_path):
     """SRS: MOD-1"""
-    args = ['-m=radius_variance', '-c=0', '-s=1', '-sd=2010-01-01', '-ed=2020-01-01']
+    dataset = cyclic(datetime(2010, 1, 1), datetime(2020, 1, 1))
+    arrivals = [{'clinic_id': 0, 'severity': 1, 'date_received': str(day)}
+                for day in dataset.columns['date_received']]
+    args = ['-m=radius_variance', '-c=0', '-s=1', '-sd=2010-01-01', '-ed=2020-01-01', '-e=1',
+            f'-w={tmp_path / "weights.h5"}', f'-r={tmp_path / "results.png"}']
 
-    requests = FakeRequests()
-    try:
-        main(http=requests, str_args=args)
-    except AttributeError as ex:
-        assert str(ex) == "'NoneType' object has no attribute 'filter_on'"
+    requests = FakeRequests(arrivals)
+    main(http=requests, str_args=args)
 
-    requests.calls.index(('None/data/0/1', {'interval': ('10-00-01', '20-00-01')}, {'Authorization': 'Bearer test'}))
+    requests.calls.index(('None/data/0/1', {'interval': ('2010-01-01', '2020-01-01')},
+                          {'Authorization': 'Bearer test'}))
+    assert os.path.isfile(tmp_path / 'weights.h5')
 
 
 def test_write_to_disk():
@@ -52,3 +57,26 @@ def test_write_to_disk():
     assert os.path.isfile(file_name)
     os.remove(file_name)
     assert not os.path.isfile(file_name)
+
+
+def test_train_reuses_cached_windows(tmp_path, capsys):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2016, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+    args = ['-m=radius_variance', '-c=1', '-s=0', '-e=1', f'-d={dataset_file}', f'--cache_dir={tmp_path / "cache"}',
+            f'-w={tmp_path / "weights.h5"}', f'-r={tmp_path / "results.png"}']
+
+    main(str_args=args)
+    assert "'hits': 0, 'misses': 1" in capsys.readouterr().out
+    main(str_args=args)
+    assert "'hits': 1, 'misses': 0" in capsys.readouterr().out
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+
+
+def test_train_streams_dataset_in_chunks(tmp_path):
+    dataset_file = str(tmp_path / 'data.npz')
+    cyclic(datetime(2016, 1, 1), datetime(2019, 12, 31), clinics=2).write_to_file(dataset_file)
+
+    main(str_args=['-m=radius_variance', '-c=2', '-s=0', '-e=1', f'-d={dataset_file}', '--chunk_size=1000',
+                   f'-w={tmp_path / "weights.h5"}', f'-r={tmp_path / "results.png"}'])
+
+    assert os.path.isfile(tmp_path / 'weights.h5')
@@ -0,0 +1,109 @@
+from triage_ml.data.gen_data import cyclic
+from triage_ml.train_all import _train_options, main, parse_args
+
+from datetime import datetime
+import csv
+import os
+import pytest
+
+
+def test_train_all(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2018, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+    summary_file = str(tmp_path / 'summary.csv')
+
+    main(str_args=['-m=radius_variance', '-s', '0', '2', '-e=1', '-j=1', f'-d={dataset_file}',
+                   f'-o={tmp_path}', f'--summary={summary_file}'])
+
+    with open(summary_file) as f:
+        rows = list(csv.DictReader(f))
+
+    assert [(row['clinic_id'], row['severity']) for row in rows] == [('1', '0'), ('1', '2')]
+    for row in rows:
+        assert not row['error']
+        assert float(row['val_loss']) >= 0
+        assert os.path.isfile(row['weights'])
+        assert os.path.isfile(row['results'])
+
+
+def test_train_options(tmp_path):
+    (tmp_path / 'weights-1-0.h5').write_bytes(b'weights')
+    args = parse_args(['-m=radius_variance', f'--checkpoint_dir={tmp_path / "checkpoints"}', '--checkpoint_every=5',
+                       '--resume', f'--warm_start={tmp_path}', '--patience=3'])
+
+    options = _train_options(args, '1-0')
+    assert options['checkpoints'].directory == str(tmp_path / 'checkpoints' / '1-0')
+    assert options['checkpoints'].every == 5
+    assert options['warm_start'] == str(tmp_path / 'weights-1-0.h5')
+    assert options['resume'] and options['patience'] == 3
+
+    # Pairs without weights in the earlier run start from scratch
+    assert _train_options(args, '1-2')['warm_start'] is None
+    assert _train_options(parse_args(['-m=radius_variance']), '1-0') == {
+        'checkpoints': None, 'resume': False, 'warm_start': None, 'patience': None, 'cache': None}
+
+
+class FakeResponse:
+
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        return
+
+
+class FakeRequests:
+
+    def __init__(self):
+        self.uploads = []
+
+    def post(self, url, json=None, headers=None, timeout=None, files=None):
+        if files:
+            self.uploads.append((files['clinic_id'][1], files['severity'][1], files['compression'][1]))
+        return FakeResponse({'token': 'test', 'exists': False})
+
+
+def test_train_all_persists_weights(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2018, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+    summary_file = str(tmp_path / 'summary.csv')
+
+    http = FakeRequests()
+    main(http=http, str_args=['-m=radius_variance', '-s', '0', '2', '-e=1', '-j=1', '-p=1', '--compress_weights',
+                              f'-d={dataset_file}', f'-o={tmp_path}', f'--summary={summary_file}'])
+
+    with open(summary_file) as f:
+        rows = list(csv.DictReader(f))
+
+    assert sorted(http.uploads) == [(1, 0, 'gzip'), (1, 2, 'gzip')]
+    assert [row['uploaded'] for row in rows] == ['True', 'True']
+    assert not any(row['error'] for row in rows)
+
+
+def test_train_all_global(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2017, 1, 1), datetime(2019, 12, 31), clinics=2).write_to_file(dataset_file)
+    summary_file = str(tmp_path / 'summary.csv')
+
+    main(str_args=['-m=global_radius_variance', '-s', '0', '2', '-e=1', '-j=2', f'-d={dataset_file}',
+                   f'-o={tmp_path}', f'--summary={summary_file}'])
+
+    with open(summary_file) as f:
+        rows = list(csv.DictReader(f))
+
+    assert [(row['clinic_id'], row['severity']) for row in rows] == [('1', '0'), ('1', '2'), ('2', '0'), ('2', '2')]
+    assert {row['weights'] for row in rows} == {os.path.join(tmp_path, 'weights-global.h5')}
+    for row in rows:
+        assert not row['error']
+        assert float(row['val_loss']) >= 0
+        assert os.path.isfile(row['results'])
+
+
+def test_train_all_global_rejects_persist(tmp_path):
+    with pytest.raises(ValueError):
+        main(str_args=['-m=global_radius_variance', '-p=True', f'-d={tmp_path / "data.txt"}', f'-o={tmp_path}'])
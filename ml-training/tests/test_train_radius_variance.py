@@ -0,0 +1,26 @@
+from triage_ml.train_radius_variance import loss
+
+import numpy as np
+
+
+def test_loss_scores_every_sample():
+    y_true = np.full((5, 2), 10, dtype=np.float32)
+    y_pred = y_true.copy()
+    y_pred[3] = [12, 7]
+
+    sample_losses = np.asarray(loss(y_true, y_pred))
+
+    # Over-predicting arrivals by 2 and under-predicting the variance by 3, which is penalised 10 more times
+    np.testing.assert_allclose(sample_losses, [0, 0, 0, 2**2 + 3**2 + 10 * 3**2, 0])
+
+
+def test_batch_loss_matches_each_sample():
+    rng = np.random.default_rng(0)
+    y_true = rng.uniform(0, 20, (64, 2)).astype(np.float32)
+    y_pred = rng.uniform(0, 20, (64, 2)).astype(np.float32)
+
+    sample_losses = np.asarray(loss(y_true, y_pred))
+    expected = [float(np.asarray(loss(y_true[i:i + 1], y_pred[i:i + 1]))[0]) for i in range(len(y_true))]
+
+    assert sample_losses.shape == (64,)
+    np.testing.assert_allclose(sample_losses, expected, rtol=1e-6)
@@ -0,0 +1,256 @@
+from triage_ml.triage_api import TriageAPI
+
+from datetime import datetime
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import gzip
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+import pytest
+import requests
+
+
+class FakeTriageServer(ThreadingHTTPServer):
+    """
+    Serves one arrival per clinic and severity on each day of the requested interval, and keeps the
+    weights uploaded to it.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeTriageHandler)
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.requests = []
+        self.token = None
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.digest_checks = True
+        self.uploads = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class FakeTriageHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        path, query = urlsplit(self.path)[2:4]
+        body = self._read_body()
+        if self.headers['Content-Type'] == 'application/json':
+            body = json.loads(body)
+
+        with server.lock:
+            server.requests.append((path, body))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path == '/auth/login':
+                with server.lock:
+                    server.logins += 1
+                    server.token = f'token-{server.logins}'
+                return self._respond(200, {'token': server.token})
+
+            if self.headers['Authorization'] != f'Bearer {server.token}':
+                return self._respond(401, {})
+            with server.lock:
+                failed = server.failures > 0
+                server.failures -= failed
+            if failed:
+                return self._respond(503, {})
+
+            if path == '/upload/model/digest':
+                if not server.digest_checks:
+                    return self._respond(404, {})
+                uploaded = {(upload['clinic_id'], upload['severity'], upload['digest'], upload['accuracy'])
+                            for upload in server.uploads}
+                return self._respond(200, {'exists': (str(body['clinic_id']), str(body['severity']),
+                                                      body['digest'], body['accuracy']) in uploaded})
+            if path == '/upload/model':
+                message = BytesParser().parsebytes(f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode()
+                                                   + body)
+                fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                          for part in message.get_payload()}
+                weights = fields.pop('model_weights')
+                return self._upload({name: value.decode() for name, value in fields.items()}, weights)
+            if path == '/upload/model/stream':
+                return self._upload(dict(parse_qsl(query)), body)
+
+            time.sleep(0.05)
+            _, _, clinic_id, severity = path.split('/')
+            start, end = (np.datetime64(date) for date in body['interval'])
+            days = np.arange(start, end + 1)
+            return self._respond(200, [{'clinic_id': int(clinic_id), 'severity': int(severity),
+                                        'date_received': f'{day}T08:30:00'} for day in days])
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _read_body(self):
+        if self.headers['Transfer-Encoding'] != 'chunked':
+            return self.rfile.read(int(self.headers['Content-Length']))
+
+        body = b''
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if not size:
+                return body
+
+    def _upload(self, fields, weights):
+        if fields.get('compression') == 'gzip':
+            weights = gzip.decompress(weights)
+        assert hashlib.sha256(weights).hexdigest() == fields['digest']
+        with self.server.lock:
+            self.server.uploads.append(dict(fields, weights=weights,
+                                            chunked=self.headers['Transfer-Encoding'] == 'chunked'))
+        return self._respond(200, {})
+
+    def _respond(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeTriageServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_data(server):
+    api = TriageAPI(server.url, 'user', 'pass')
+
+    dataset = api.get_data(3, 2, datetime(2020, 1, 1), datetime(2020, 1, 31))
+
+    assert len(dataset) == 31
+    assert set(dataset.columns['clinic_id']) == {3} and set(dataset.columns['severity']) == {2}
+    assert dataset.columns['date_received'][0] == np.datetime64('2020-01-01')
+    assert dataset.columns['date_received'][-1] == np.datetime64('2020-01-31')
+    assert server.requests[0] == ('/auth/login', {'username': 'user', 'password': 'pass'})
+    assert server.requests[1] == ('/data/3/2', {'interval': ['2020-01-01', '2020-01-31']})
+
+
+def test_get_many_chunks_in_parallel(server):
+    api = TriageAPI(server.url, 'user', 'pass', max_workers=3, chunk_days=30)
+
+    partitions = api.get_many([(1, 0), (1, 1), (2, 0)], datetime(2020, 1, 1), datetime(2020, 12, 31))
+
+    assert list(partitions) == [(1, 0), (1, 1), (2, 0)]
+    for (clinic_id, severity), dataset in partitions.items():
+        assert len(dataset) == 366
+        assert set(dataset.columns['clinic_id']) == {clinic_id} and set(dataset.columns['severity']) == {severity}
+        assert np.all(np.diff(dataset.columns['date_received']).astype(int) == 1)
+
+    data_requests = [body for path, body in server.requests if path.startswith('/data/')]
+    assert len(data_requests) == 3 * 13
+    assert data_requests.count({'interval': ['2020-12-26', '2020-12-31']}) == 3
+    assert 1 < server.max_in_flight <= 3
+    assert server.logins == 1
+
+
+def test_refreshes_expired_token(server):
+    api = TriageAPI(server.url, 'user', 'pass')
+    api.get_data(1, 0, datetime(2020, 1, 1), datetime(2020, 1, 2))
+    server.token = 'expired'
+
+    assert len(api.get_data(1, 0, datetime(2020, 1, 1), datetime(2020, 1, 2))) == 2
+    assert api.token == 'token-2'
+
+
+def test_retries_unavailable_server(server):
+    api = TriageAPI(server.url, 'user', 'pass', retries=2, backoff=0.01)
+    server.failures = 2
+
+    assert len(api.get_data(1, 0, datetime(2020, 1, 1), datetime(2020, 1, 2))) == 2
+
+    server.failures = 3
+    with pytest.raises(requests.HTTPError):
+        api.get_data(1, 0, datetime(2020, 1, 1), datetime(2020, 1, 2))
+
+
+def test_retries_connection_errors():
+    api = TriageAPI('http://127.0.0.1:1', 'user', 'pass', retries=1, backoff=0.01, timeout=1)
+
+    with pytest.raises(requests.ConnectionError):
+        api.get_data(1, 0, datetime(2020, 1, 1), datetime(2020, 1, 2))
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('chunk_size', [None, 1000])
+def test_post_weights(server, tmp_path, compress, chunk_size):
+    weights_file = tmp_path / 'weights.h5'
+    weights_file.write_bytes(bytes(range(256)) * 20)
+    api = TriageAPI(server.url, 'user', 'pass')
+
+    assert api.post_weights(1, 2, str(weights_file), 0.5, compress=compress, chunk_size=chunk_size)
+
+    upload, = server.uploads
+    assert upload['weights'] == weights_file.read_bytes()
+    assert (upload['clinic_id'], upload['severity'], upload['accuracy']) == ('1', '2', '0.5')
+    assert upload['chunked'] == bool(chunk_size)
+
+
+def test_post_weights_skips_uploaded_weights(server, tmp_path):
+    weights_file = tmp_path / 'weights.h5'
+    weights_file.write_bytes(b'weights')
+
+    assert TriageAPI(server.url, 'user', 'pass').post_weights(1, 2, str(weights_file), 0.5)
+    api = TriageAPI(server.url, 'user', 'pass')
+    assert not api.post_weights(1, 2, str(weights_file), 0.5)
+    assert api.post_weights(1, 3, str(weights_file), 0.5)
+    assert len(server.uploads) == 2
+
+    weights_file.write_bytes(b'new weights')
+    assert api.post_weights(1, 2, str(weights_file), 0.5)
+    assert len(server.uploads) == 3
+
+
+@pytest.mark.parametrize('digest_checks', [True, False])
+def test_post_weights_uploads_new_accuracy_and_use(server, tmp_path, digest_checks):
+    weights_file = tmp_path / 'weights.h5'
+    weights_file.write_bytes(b'weights')
+    server.digest_checks = digest_checks
+    api = TriageAPI(server.url, 'user', 'pass')
+
+    assert api.post_weights(1, 2, str(weights_file), 0.5)
+    assert api.post_weights(1, 2, str(weights_file), 0.25)
+    assert not api.post_weights(1, 2, str(weights_file), 0.25)
+    # Identical weights are still sent to be put in use
+    assert api.post_weights(1, 2, str(weights_file), 0.25, make_in_use=True)
+    assert api.post_weights(1, 2, str(weights_file), 0.25, make_in_use=True)
+
+    assert [(upload['accuracy'], upload['make_in_use']) for upload in server.uploads] == \
+        [('0.5', 'False'), ('0.25', 'False'), ('0.25', 'True'), ('0.25', 'True')]
+
+
+def test_post_weights_without_digest_checks(server, tmp_path):
+    weights_file = tmp_path / 'weights.h5'
+    weights_file.write_bytes(b'weights')
+    server.digest_checks = False
+    api = TriageAPI(server.url, 'user', 'pass')
+
+    assert api.post_weights(1, 2, str(weights_file), 0.5)
+    # Known to this client, so not uploaded again
+    assert not api.post_weights(1, 2, str(weights_file), 0.5)
+    assert api.post_weights(1, 3, str(weights_file), 0.5)
+
+    assert len(server.uploads) == 2
+    assert [path for path, _ in server.requests].count('/upload/model/digest') == 1
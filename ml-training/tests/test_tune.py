@@ -0,0 +1,53 @@
+from triage_ml.data.gen_data import cyclic
+from triage_ml.tune import grid_trials, halving_rungs, main, random_trials
+
+from datetime import datetime
+import csv
+import os
+
+
+SPACE = {'seq_size': [10, 20, 30], 'lstm_units': [4, 8], 'dropout': [0.1]}
+
+
+def test_grid_trials():
+    trials = grid_trials(SPACE)
+
+    assert len(trials) == 6
+    assert trials[0] == {'seq_size': 10, 'lstm_units': 4, 'dropout': 0.1}
+    assert trials[-1] == {'seq_size': 30, 'lstm_units': 8, 'dropout': 0.1}
+
+
+def test_random_trials():
+    trials = random_trials(SPACE, 4, seed=0)
+
+    assert len(trials) == 4
+    assert all(trial in grid_trials(SPACE) for trial in trials)
+    assert len({tuple(trial.values()) for trial in trials}) == 4
+    assert trials == random_trials(SPACE, 4, seed=0)
+    assert len(random_trials(SPACE, 100)) == 6
+
+
+def test_halving_rungs():
+    assert halving_rungs(1, 27, 3) == [1, 3, 9, 27]
+    assert halving_rungs(5, 100, 3) == [5, 15, 45, 100]
+    assert halving_rungs(5, 5, 3) == [5]
+
+
+def test_halving_search(tmp_path):
+    dataset_file = str(tmp_path / 'data.txt')
+    cyclic(datetime(2016, 1, 1), datetime(2019, 12, 31)).write_to_file(dataset_file)
+    leaderboard_file = str(tmp_path / 'leaderboard.csv')
+
+    main(str_args=['-c=1', '-s=0', f'-d={dataset_file}', '--seq_size', '10', '20', '--lstm_units', '4', '8',
+                   '--search=halving', '-n=4', '--seed=0', '--min_epochs=1', '-e=2', '--eta=2', '-j=2',
+                   f'-o={tmp_path / "trials"}', f'--leaderboard={leaderboard_file}'])
+
+    with open(leaderboard_file) as f:
+        rows = list(csv.DictReader(f))
+
+    assert [row['rank'] for row in rows] == ['1', '2', '3', '4']
+    assert not any(row['error'] for row in rows)
+    assert [row['epochs'] for row in rows] == ['2', '2', '1', '1']
+    assert [row['status'] for row in rows] == ['complete', 'complete', 'pruned at rung 0', 'pruned at rung 0']
+    assert float(rows[0]['val_loss']) <= float(rows[1]['val_loss'])
+    assert all(os.path.isfile(row['weights']) for row in rows)
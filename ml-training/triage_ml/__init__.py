@@ -1,2 +1,38 @@
-from .train_radius_variance import train as train_radius_variance
-from .models.radius_variance import RadiusVariance
+import importlib
+import sys
+import types
+
+# Attributes imported on first access, so importing the package does not pay for TensorFlow
+_LAZY_ATTRIBUTES = {
+    'train_radius_variance': ('triage_ml.train_radius_variance', 'train'),
+    'RadiusVariance': ('triage_ml.models.radius_variance', 'RadiusVariance'),
+}
+
+
+class _Package(types.ModuleType):
+    """
+    Keeps the train_radius_variance function bound over the submodule of the same name.
+
+    The package used to import train_radius_variance.train as train_radius_variance eagerly, which rebound the name
+    from the submodule to the function, so triage_ml.train_radius_variance and even
+    `import triage_ml.train_radius_variance as m` give the function. Importing the submodule binds it on the package,
+    which would shadow the lazy __getattr__ and make the alias depend on whether the submodule was imported first.
+    """
+
+    def __setattr__(self, name, value):
+        if name in _LAZY_ATTRIBUTES and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    module, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module(module), attribute)
+    globals()[name] = value
+    return value
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,259 @@
+"""
+Rolling origin backtests of RadiusVariance models.
+
+Each fold trains on the samples before a forecast origin and forecasts the following intervals from it.
+The samples of every fold are views over one window array per series, and each fold warm-starts from
+the weights of the fold before it, so a fold only needs a few epochs on top of the first.
+"""
+from triage_ml.train import DATE_HELP, TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, frame_cache
+from triage_ml.triage_api import TriageAPI
+from triage_ml.data.dataset import TimeInterval
+from triage_ml.data.frame_cache import load_frame
+from triage_ml.workers import add_worker_arguments, jobs, load_partitions, worker_pool
+
+from concurrent.futures import as_completed
+from typing import Dict, List, Text, Tuple
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import numpy as np
+import requests
+
+FORECAST_FIELDS = ['clinic_id', 'severity', 'origin', 'horizon', 'arrivals', 'predicted_arrivals', 'variance',
+                   'predicted_variance']
+
+METRIC_FIELDS = ['horizon', 'forecasts', 'arrivals_mae', 'arrivals_rmse', 'arrivals_bias', 'variance_mae',
+                 'variance_rmse']
+
+MODEL_PARAMS = ['seq_size', 'radius', 'time_interval', 'lstm_units', 'dense_units', 'dropout']
+
+
+def fold_origins(samples: int, horizon: int, folds: int, step: int, min_train: int, gap=0) -> List[int]:
+    """
+    Choose the forecast origins of a backtest, the last origin forecasting up to the last sample.
+    :param samples: The number of samples of the series.
+    :param horizon: The number of intervals forecast from each origin.
+    :param folds: The maximum number of origins.
+    :param step: The number of intervals between origins.
+    :param min_train: The minimum number of samples to train on before the first origin.
+    :param gap: The number of samples left out between the training samples and each origin, see train_slice.
+    :return: The sample index of each origin, in order.
+    """
+    last = samples - horizon
+    return [origin for origin in range(last - (folds - 1) * step, last + 1, step) if origin - gap >= min_train]
+
+
+def train_slice(origin: int, radius: int, window: int = None) -> slice:
+    """
+    Choose the samples a fold trains on before its origin.
+
+    The variance target of a sample covers the counts up to radius intervals after its own, so the last
+    radius samples before the origin are left out, or their targets would include forecast arrivals.
+    :param origin: The sample index of the origin.
+    :param radius: The radius in intervals of the model's variance targets.
+    :param window: If set, at most this many samples are trained on instead of every earlier sample.
+    :return: The slice of the training samples.
+    """
+    end = max(origin - radius, 0)
+    return slice(max(end - window, 0) if window else 0, end)
+
+
+def _create_model(params: Dict):
+    """
+    :param params: The value of each of MODEL_PARAMS, the time interval by name.
+    :return: The RadiusVariance model of the parameters.
+    """
+    from triage_ml.models.radius_variance import RadiusVariance
+
+    return RadiusVariance(**dict(params, time_interval=TimeInterval[params['time_interval']]))
+
+
+def _backtest_chain(clinic_id: int, severity: int, params: Dict, frame_files: Tuple[Text], origins: List[int],
+                    horizon: int, window: int, epochs: int, warm_epochs: int, lr: float, batch_size: int) -> List[Dict]:
+    """
+    Backtest consecutive origins of a series, each fold warm-starting from the last.
+    :param params: The model parameters, see _create_model.
+    :param frame_files: The .npy files of the series' frame.
+    :param origins: The sample indices of the origins.
+    :param horizon: The number of intervals to forecast from each origin.
+    :param window: If set, each fold trains on at most this many samples before its origin instead of all of them,
+                   see train_slice.
+    :param epochs: The epochs the first fold trains for.
+    :param warm_epochs: The epochs each later fold trains for.
+    :return: A row per origin and horizon of the actual and forecast outputs.
+    """
+    from triage_ml.train_radius_variance import loss
+    from tensorflow.keras.optimizers import Adam
+
+    rv_model = _create_model(params)
+    ml_dataset = rv_model.ml_dataset_from_frame(load_frame(frame_files), strided=True)
+    rv_model.get_model().compile(optimizer=Adam(learning_rate=lr), loss=loss)
+
+    rows = []
+    for fold, origin in enumerate(origins):
+        train_data = ml_dataset[train_slice(origin, rv_model.radius, window)]
+        rv_model.get_model().fit(x=train_data.inputs,
+                                 y=train_data.outputs,
+                                 batch_size=batch_size,
+                                 epochs=warm_epochs if fold else epochs,
+                                 verbose=0)
+
+        test_data = ml_dataset[origin:origin + horizon]
+        predictions = rv_model.predict([test_data.inputs[0][:1]], test_data.inputs[1])[:, 0]
+        for h, (actual, predicted) in enumerate(zip(test_data.outputs[0], predictions), start=1):
+            rows.append({
+                'clinic_id': clinic_id,
+                'severity': severity,
+                'origin': origin,
+                'horizon': h,
+                'arrivals': float(actual[0]),
+                'predicted_arrivals': float(predicted[0]),
+                'variance': float(actual[1]),
+                'predicted_variance': float(predicted[1]),
+            })
+    return rows
+
+
+def aggregate_metrics(rows: List[Dict]) -> List[Dict]:
+    """
+    Aggregate the forecast errors of every series and origin by horizon.
+    :param rows: Forecast rows, as backtests return.
+    :return: A row of error metrics per horizon.
+    """
+    if not rows:
+        return []
+
+    horizons = np.array([row['horizon'] for row in rows])
+    errors = {name: np.array([row[f'predicted_{name}'] - row[name] for row in rows])
+              for name in ['arrivals', 'variance']}
+
+    metrics = []
+    for h in np.unique(horizons):
+        arrivals, variance = errors['arrivals'][horizons == h], errors['variance'][horizons == h]
+        metrics.append({
+            'horizon': int(h),
+            'forecasts': len(arrivals),
+            'arrivals_mae': float(np.mean(np.abs(arrivals))),
+            'arrivals_rmse': float(np.sqrt(np.mean(arrivals**2))),
+            'arrivals_bias': float(np.mean(arrivals)),
+            'variance_mae': float(np.mean(np.abs(variance))),
+            'variance_rmse': float(np.sqrt(np.mean(variance**2))),
+        })
+    return metrics
+
+
+def parse_args(args):
+    """
+    Parser configuration
+    :return: parsed augments object
+    """
+    parser = argparse.ArgumentParser(description='Backtest RadiusVariance forecasts over rolling origins.')
+
+    parser.add_argument('-c', '--clinic_ids', type=int, nargs='+',
+                        help='The IDs of the clinics to backtest. Defaults to every clinic in the dataset.')
+    parser.add_argument('-s', '--severities', type=int, nargs='+',
+                        help='The triage severity levels to backtest. Defaults to every severity in the dataset.')
+    parser.add_argument('--horizon', default=4, type=int,
+                        help='The number of intervals to forecast from each origin.')
+    parser.add_argument('-f', '--folds', default=10, type=int,
+                        help='The maximum number of origins to backtest each series from.')
+    parser.add_argument('--step', default=1, type=int,
+                        help='The number of intervals between origins.')
+    parser.add_argument('--window', default=None, type=int,
+                        help='Train each fold on a sliding window of this many samples before its origin instead '
+                             'of every earlier sample.')
+    parser.add_argument('--min_train', default=52, type=int,
+                        help='The minimum number of samples to train on before an origin.')
+    parser.add_argument('-e', '--epochs', default=100, type=int,
+                        help='The epochs the first fold of each chain trains for.')
+    parser.add_argument('--warm_epochs', default=10, type=int,
+                        help='The epochs each later fold trains for, starting from the weights of the fold before.')
+    parser.add_argument('--chains', default=1, type=int,
+                        help='Split the origins of each series into this many chains of consecutive folds, which '
+                             'run in parallel and each start cold.')
+    parser.add_argument('--seq_size', default=30, type=int,
+                        help='The number of previous intervals the model reads.')
+    parser.add_argument('--radius', default=15, type=int,
+                        help='The radius in --time_interval units used to compute arrival variance.')
+    parser.add_argument('--time_interval', default='WEEK', choices=[interval.name for interval in TimeInterval],
+                        help='The size of each unit time interval.')
+    parser.add_argument('--lstm_units', default=8, type=int,
+                        help='The number of units of the LSTM layer.')
+    parser.add_argument('--dense_units', default=64, type=int,
+                        help='The number of units of the hidden dense layer.')
+    parser.add_argument('--dropout', default=0.2, type=float,
+                        help='The dropout rate after the LSTM and hidden dense layers.')
+    parser.add_argument('-lr', '--learning_rate', default=0.001, type=float,
+                        help='The gradient descent learning rate.')
+    parser.add_argument('-b', '--batch_size', default=32, type=int,
+                        help='The number of samples in each training batch.')
+    add_worker_arguments(parser, 'chains', temporary_cache=True)
+    parser.add_argument('-o', '--output_dir', default='backtest', type=str,
+                        help='The directory to write forecasts.csv and metrics.csv to.')
+
+    # If pulling data from API
+    parser.add_argument('-sd', '--start_date', help=f'The start date of the data. Format: {DATE_HELP}')
+    parser.add_argument('-ed', '--end_date', help=f'The end date of the data. Format: {DATE_HELP}')
+
+    # If pulling data from the database
+    parser.add_argument('--db_table',
+                        help='An optional database table of arrivals to pull data from instead of the API.')
+    parser.add_argument('--db_connections', default=4, type=int,
+                        help='The maximum number of database connections used to pull data.')
+
+    # If using local data
+    parser.add_argument('-d', '--dataset',
+                        help='An optional local dataset (CSV or .npz) to backtest on instead')
+
+    return parser.parse_args(args)
+
+
+def main(http=requests, str_args=None):
+    """
+    Entrypoint for triage-backtest.
+    """
+    args = parse_args(str_args or sys.argv[1:])
+
+    partitions = load_partitions(args, TriageAPI(TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, http))
+    params = {name: getattr(args, name) for name in MODEL_PARAMS}
+    rv_model = _create_model(params)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp_dir, worker_pool(jobs(args), args.threads) as executor:
+        # Frames are cached under a hash of their series' counts, so every series shares one cache
+        cache = frame_cache(args, tmp_dir)
+        futures = {}
+        for (clinic_id, severity), dataset in partitions.items():
+            frame_files = cache.frame_files(rv_model, *dataset.daily_counts())
+
+            samples = len(rv_model.ml_dataset_from_frame(load_frame(tuple(frame_files)), strided=True))
+            origins = fold_origins(samples, args.horizon, args.folds, args.step, args.min_train, rv_model.radius)
+            for chain in np.array_split(origins, min(args.chains, len(origins))) if origins else []:
+                future = executor.submit(_backtest_chain, clinic_id, severity, params, tuple(frame_files),
+                                         chain.tolist(), args.horizon, args.window, args.epochs, args.warm_epochs,
+                                         args.learning_rate, args.batch_size)
+                futures[future] = (clinic_id, severity)
+            if not origins:
+                print(f'Clinic {clinic_id} severity {severity}: too few samples to backtest')
+        print(f'Frame cache: {cache.stats()}')
+
+        rows = []
+        for future in as_completed(futures):
+            clinic_id, severity = futures[future]
+            rows.extend(future.result())
+            print(f'Clinic {clinic_id} severity {severity}: chain done')
+
+    rows.sort(key=lambda row: (row['clinic_id'], row['severity'], row['origin'], row['horizon']))
+    metrics = aggregate_metrics(rows)
+    for file_name, fields, file_rows in [('forecasts.csv', FORECAST_FIELDS, rows),
+                                         ('metrics.csv', METRIC_FIELDS, metrics)]:
+        with open(os.path.join(args.output_dir, file_name), 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(file_rows)
+
+    for row in metrics:
+        print(f'Horizon {row["horizon"]:>3}: arrivals MAE {row["arrivals_mae"]:.3f}  '
+              f'RMSE {row["arrivals_rmse"]:.3f}  bias {row["arrivals_bias"]:+.3f}  ({row["forecasts"]} forecasts)')
@@ -0,0 +1,132 @@
+"""
+Checkpointing, resuming and warm-starting of training runs.
+"""
+from typing import List, Optional, Text, Tuple
+import json
+import os
+
+
+class CheckpointManager:
+    """
+    Saves the model of a training run, with its optimizer state, every few epochs.
+
+    A run that crashes can resume from its last checkpoint instead of starting over. Checkpoints are
+    written atomically, so a crash while saving leaves the previous checkpoint intact, and are cleared
+    once the run finishes.
+
+    Attributes:
+        directory: The directory checkpoints are kept in.
+        every: The number of epochs between checkpoints.
+    """
+
+    # The native Keras format, as Keras 3 cannot restore the optimizer state of an HDF5 model
+    MODEL_FILE = 'checkpoint.keras'
+    STATE_FILE = 'checkpoint.json'
+    # Keras picks the format from the extension, so the temporary file keeps it
+    TMP_MODEL_FILE = 'checkpoint.tmp.keras'
+
+    def __init__(self, directory: Text, every=1):
+        self.directory = directory
+        self.every = every
+
+    def latest(self) -> Optional[Tuple[Text, int]]:
+        """
+        :return: The model file of the latest checkpoint and the number of epochs trained by then, None if there
+                 is no checkpoint.
+        """
+        state_file = os.path.join(self.directory, self.STATE_FILE)
+        if not os.path.isfile(state_file):
+            return None
+
+        with open(state_file) as file:
+            state = json.load(file)
+        return os.path.join(self.directory, self.MODEL_FILE), state['epochs']
+
+    def save(self, model, epochs: int):
+        """
+        Save a checkpoint.
+        :param model: The compiled Keras model.
+        :param epochs: The number of epochs trained.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_model = os.path.join(self.directory, self.TMP_MODEL_FILE)
+        model.save(tmp_model)
+        os.replace(tmp_model, os.path.join(self.directory, self.MODEL_FILE))
+
+        tmp_state = os.path.join(self.directory, f'{self.STATE_FILE}.tmp')
+        with open(tmp_state, 'w') as file:
+            json.dump({'epochs': epochs}, file)
+        os.replace(tmp_state, os.path.join(self.directory, self.STATE_FILE))
+
+    def clear(self):
+        """
+        Remove every checkpoint, and the directory if nothing else is left in it.
+        """
+        for file in (self.MODEL_FILE, self.STATE_FILE, self.TMP_MODEL_FILE, f'{self.STATE_FILE}.tmp'):
+            try:
+                os.remove(os.path.join(self.directory, file))
+            except FileNotFoundError:
+                pass
+
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            # Missing, or holding other files
+            pass
+
+    def callback(self):
+        """
+        :return: A Keras callback saving a checkpoint every self.every epochs.
+        """
+        from tensorflow.keras.callbacks import Callback
+
+        manager = self
+
+        class CheckpointCallback(Callback):
+
+            def on_epoch_end(self, epoch, logs=None):
+                if (epoch + 1) % manager.every == 0:
+                    manager.save(self.model, epoch + 1)
+
+        return CheckpointCallback()
+
+
+def restore(model, loss, checkpoints: CheckpointManager = None, resume=False, warm_start: Text = None):
+    """
+    Restore a model before training, from the latest checkpoint or the weights of an earlier run.
+    :param model: The compiled Keras model, returned as is if nothing is restored.
+    :param loss: The custom loss the model is compiled with.
+    :param checkpoints: The checkpoints of the run.
+    :param resume: Whether to resume from the latest checkpoint, if there is one.
+    :param warm_start: An optional model or weights file of an earlier run to start from, when not resuming.
+    :return: The model to train and the number of epochs it has already trained.
+    """
+    latest = checkpoints.latest() if checkpoints and resume else None
+    if latest:
+        from tensorflow.keras.models import load_model
+
+        model_file, epochs = latest
+        print(f'Resuming from {model_file} after {epochs} epochs')
+        return load_model(model_file, custom_objects={'loss': loss}), epochs
+
+    if warm_start:
+        print(f'Warm-starting from {warm_start}')
+        model.load_weights(warm_start)
+    return model, 0
+
+
+def training_callbacks(checkpoints: CheckpointManager = None, patience: int = None) -> List:
+    """
+    :param checkpoints: If set, the checkpoints to save during training.
+    :param patience: If set, training stops after this many epochs without the validation loss improving, and the
+                     weights of the best epoch are restored.
+    :return: The Keras callbacks.
+    """
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    callbacks = []
+    if checkpoints:
+        callbacks.append(checkpoints.callback())
+    if patience:
+        callbacks.append(EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True))
+    return callbacks
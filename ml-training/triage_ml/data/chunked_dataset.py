@@ -0,0 +1,180 @@
+from triage_ml.data.dataset import DataSet, TimeInterval, _ATTRS, _group_codes
+from triage_ml.data import storage
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Text, Tuple
+from datetime import date
+import numpy as np
+
+# The approximate size of a clinic_id,severity,YYYY-MM-DD line, used to size CSV chunks
+_CSV_LINE_SIZE = 16
+
+
+class ChunkedDataSet:
+    """
+    A DataSet streamed in fixed-size chunks from a file or database, for arrival histories larger than memory.
+
+    Filters are recorded and applied to each chunk as it is read, and counts are aggregated chunk by
+    chunk, so memory is bounded by the chunk size and the number of days or groups counted rather than
+    by the number of arrivals. Each operation reads the source again.
+
+    RadiusVariance.create_ml_dataset only needs daily_counts, so it builds a MLDataSet from a
+    ChunkedDataSet without ever holding its arrivals.
+    """
+
+    def __init__(self, chunks: Callable[[], Iterable[DataSet]]):
+        """
+        Create a new ChunkedDataSet.
+        :param chunks: A function returning a new iterator of the source's chunks each time it is called.
+        """
+        self._chunks = chunks
+        self._filters = []
+
+    @classmethod
+    def read_from_file(cls, file_name: Text, chunk_size=1_000_000) -> 'ChunkedDataSet':
+        """
+        Stream a CSV or binary (.npz) DataSet file.
+
+        Binary columns are memory-mapped and read a slice at a time, unless the file is compressed.
+        :param file_name: The file to read.
+        :param chunk_size: The approximate number of data points in each chunk.
+        :return: The ChunkedDataSet
+        """
+        if storage.is_binary(file_name):
+            return cls(lambda: _npz_chunks(file_name, chunk_size))
+        return cls(lambda: _csv_chunks(file_name, chunk_size))
+
+    @classmethod
+    def from_database(cls, database, table: Text, clinic_id: int = None, severity: int = None,
+                      start_date: date = None, end_date: date = None, chunk_size=100_000) -> 'ChunkedDataSet':
+        """
+        Stream the arrivals of a database table through a server-side cursor, see Database.iter_arrivals.
+        :param database: The Database to read from.
+        :param chunk_size: The number of rows fetched at a time.
+        :return: The ChunkedDataSet
+        """
+        return cls(lambda: database.iter_arrivals(table, clinic_id, severity, start_date, end_date, chunk_size))
+
+    @classmethod
+    def from_dataset(cls, dataset: DataSet, chunk_size: int) -> 'ChunkedDataSet':
+        """
+        :return: A ChunkedDataSet reading the columns of an in-memory DataSet chunk_size data points at a time.
+        """
+        return cls(lambda: _column_chunks(dataset.columns, chunk_size))
+
+    def filter_on(self, attribute: Text, predicate: Callable[[Any], bool]):
+        """
+        Filter the ChunkedDataSet on a certain attribute with the given predicate, see DataSet.filter_on.
+
+        The predicate is applied to each chunk as it is read.
+        :param attribute: The attribute to filter on.
+        :param predicate: The predicate function
+        :return: The modified ChunkedDataSet
+        """
+        self._filters.append((DataSet.filter_on, attribute, predicate))
+        return self
+
+    def filter_mask(self, attribute: Text, predicate: Callable[[np.ndarray], np.ndarray]):
+        """
+        Filter the ChunkedDataSet on a certain attribute with a vectorized predicate, see DataSet.filter_mask.
+
+        The predicate is applied to the column of each chunk as it is read.
+        :param attribute: The attribute to filter on.
+        :param predicate: The predicate function
+        :return: The modified ChunkedDataSet
+        """
+        self._filters.append((DataSet.filter_mask, attribute, predicate))
+        return self
+
+    def daily_counts(self) -> Tuple[np.datetime64, np.ndarray]:
+        """
+        Count the data points received on each day, one chunk at a time.
+        :return: A tuple of the first day (None if there are no data points) and the number of data
+                 points received on each day from the first day to the last.
+        """
+        first, counts = None, np.zeros(0, dtype=np.int64)
+        for chunk in self:
+            chunk_first, chunk_counts = chunk.daily_counts()
+            if chunk_first is None:
+                continue
+            if first is None:
+                first, counts = chunk_first, chunk_counts.astype(np.int64)
+                continue
+
+            offset = (chunk_first - first).astype(np.int64)
+            # Only reallocated when a chunk reaches outside the days counted so far
+            if offset < 0 or offset + len(chunk_counts) > len(counts):
+                start = min(offset, 0)
+                grown = np.zeros(max(offset + len(chunk_counts), len(counts)) - start, dtype=np.int64)
+                grown[-start:len(counts) - start] = counts
+                first, counts, offset = first + start, grown, offset - start
+            counts[offset:offset + len(chunk_counts)] += chunk_counts
+        return first, counts
+
+    def group_by(self, attributes: List[Text], time_interval: TimeInterval = None) -> Dict[Text, np.ndarray]:
+        """
+        Count the data points of each distinct combination of attribute values, see DataSet.group_by.
+
+        The counts of each chunk are merged into the counts of the chunks before it.
+        :param attributes: The attributes to group on.
+        :param time_interval: If set, dates are grouped by the time interval they fall into instead of by day.
+        :return: A dictionary of columns with one row per group, ordered by value: the value of each grouped
+                 attribute and 'count' with the number of data points in the group.
+        """
+        groups = None
+        for chunk in self:
+            chunk_groups = chunk.group_by(attributes, time_interval)
+            groups = chunk_groups if groups is None else _merge_groups(attributes, [groups, chunk_groups])
+        return groups if groups is not None else DataSet([]).group_by(attributes, time_interval)
+
+    def to_dataset(self) -> DataSet:
+        """
+        :return: The filtered data points read into memory as a DataSet.
+        """
+        chunks = list(self)
+        if not chunks:
+            return DataSet([])
+        return DataSet.from_columns(*(np.concatenate([chunk.columns[attribute] for chunk in chunks])
+                                      for attribute in _ATTRS))
+
+    def __iter__(self) -> Iterator[DataSet]:
+        """
+        :return: An iterator of the filtered chunks, as DataSets.
+        """
+        for chunk in self._chunks():
+            for filter_method, attribute, predicate in self._filters:
+                filter_method(chunk, attribute, predicate)
+            if len(chunk):
+                yield chunk
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self)
+
+
+def _merge_groups(attributes: List[Text], parts: List[Dict[Text, np.ndarray]]) -> Dict[Text, np.ndarray]:
+    """
+    Merge the group counts of several chunks, summing the counts of groups found in more than one.
+    """
+    values = [np.concatenate([part[attribute] for part in parts]) for attribute in attributes]
+    keys = [column.astype(np.int64) if column.dtype.kind == 'M' else column for column in values]
+    codes, space, groups, group_keys = _group_codes(keys)
+
+    merged = {attribute: group_key.astype(column.dtype)
+              for attribute, column, group_key in zip(attributes, values, group_keys)}
+    counts = np.concatenate([part['count'] for part in parts])
+    merged['count'] = np.bincount(codes, weights=counts, minlength=space)[groups].astype(np.int64)
+    return merged
+
+
+def _column_chunks(columns: Dict[Text, np.ndarray], chunk_size: int) -> Iterator[DataSet]:
+    for start in range(0, len(columns[_ATTRS[0]]), chunk_size):
+        yield DataSet.from_columns(*(columns[attribute][start:start + chunk_size] for attribute in _ATTRS))
+
+
+def _npz_chunks(file_name: Text, chunk_size: int) -> Iterator[DataSet]:
+    # Slices of memory-mapped columns are only paged in as each chunk is read
+    yield from _column_chunks(storage.read_npz(file_name).columns, chunk_size)
+
+
+def _csv_chunks(file_name: Text, chunk_size: int) -> Iterator[DataSet]:
+    for rows in storage.iter_csv(file_name, block_size=chunk_size * _CSV_LINE_SIZE):
+        yield DataSet.from_columns(*(np.ascontiguousarray(rows[attribute]) for attribute in _ATTRS))
@@ -0,0 +1,138 @@
+from triage_ml.data.dataset import DataSet, MLDataSet
+
+from datetime import date
+from typing import Optional, Text, Tuple
+import os
+import numpy as np
+
+
+class CountStore:
+    """
+    A local store of the daily arrival counts of each clinic and severity.
+
+    Each series keeps a high-water mark, the last day it has been synced up to, so that only newer
+    arrivals need to be fetched. The high-water mark day itself is fetched again on the next sync as
+    it may only have been partially synced. Days before the high-water mark are never changed, which
+    lets the MLDataSet frames built from a series be extended instead of rebuilt.
+
+    Attributes:
+        directory: The directory the store is kept in.
+    """
+
+    def __init__(self, directory: Text):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def high_water_mark(self, clinic_id: int, severity: int) -> Optional[np.datetime64]:
+        """
+        :return: The last day the series has been synced up to, None if it has never been synced.
+        """
+        return self._load(clinic_id, severity)[2]
+
+    def daily_counts(self, clinic_id: int, severity: int) -> Tuple[np.datetime64, np.ndarray]:
+        """
+        :return: A tuple of the first day (None if there are no arrivals) and the number of arrivals on
+                 each day since then, as DataSet.daily_counts returns.
+        """
+        first, counts, _ = self._load(clinic_id, severity)
+        return first, counts
+
+    def update(self, clinic_id: int, severity: int, dataset: DataSet,
+               synced_until: date = None) -> Tuple[np.datetime64, np.ndarray]:
+        """
+        Merge newly fetched arrivals into a series.
+
+        Arrivals received on or after the high-water mark replace the stored counts of those days,
+        earlier arrivals have already been synced and are ignored.
+        :param clinic_id: The clinic of the arrivals.
+        :param severity: The severity of the arrivals.
+        :param dataset: The arrivals fetched since the high-water mark.
+        :param synced_until: The last day the arrivals were fetched up to, defaults to the last day received.
+        :return: The updated daily counts of the series.
+        """
+        first, counts, high_water_mark = self._load(clinic_id, severity)
+        new_first, new_counts = dataset.daily_counts()
+
+        if new_first is not None:
+            last_received = new_first + len(new_counts) - 1
+            new_days = new_first + np.arange(len(new_counts))
+            if high_water_mark is not None:
+                new_days, new_counts = new_days[new_days >= high_water_mark], new_counts[new_days >= high_water_mark]
+
+            if first is None:
+                received = new_days[new_counts > 0]
+                first = received[0] if len(received) else None
+                counts = np.zeros(0, dtype=np.int64)
+
+            if first is not None:
+                kept = len(counts)
+                if high_water_mark is not None:
+                    kept = min(kept, max((high_water_mark - first).astype(np.int64), 0))
+                offsets = (new_days - first).astype(np.int64)
+                in_range = offsets >= 0
+
+                merged = np.zeros(max(kept, offsets[-1] + 1 if len(offsets) else 0), dtype=np.int64)
+                merged[:kept] = counts[:kept]
+                merged[offsets[in_range]] = new_counts[in_range]
+                counts = merged
+
+            high_water_mark = last_received if high_water_mark is None else max(high_water_mark, last_received)
+
+        if synced_until is not None:
+            synced_until = np.datetime64(synced_until, 'D')
+            high_water_mark = synced_until if high_water_mark is None else max(high_water_mark, synced_until)
+
+        self._save(self._series_file(clinic_id, severity), first=first, counts=counts,
+                   high_water_mark=high_water_mark)
+        return first, counts
+
+    def ml_dataset(self, model, clinic_id: int, severity: int, strided=False) -> MLDataSet:
+        """
+        Build the MLDataSet of a series, extending the frame stored by the previous call.
+        :param model: The RadiusVariance model to build the MLDataSet for.
+        :param clinic_id: The clinic of the series.
+        :param severity: The severity of the series.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
+        :return: The MLDataSet
+        """
+        first, counts, _ = self._load(clinic_id, severity)
+        frame_file = self._frame_file(clinic_id, severity, model)
+
+        previous = None
+        if first is not None and os.path.isfile(frame_file):
+            with np.load(frame_file) as frame_npz:
+                if frame_npz['first'] == first:
+                    previous = [frame_npz[f'frame_{i}'] for i in range(3)]
+
+        frame = model.create_frame(first, counts, previous=previous)
+        self._save(frame_file, first=first, **{f'frame_{i}': part for i, part in enumerate(frame)})
+        return model.ml_dataset_from_frame(frame, strided=strided)
+
+    def _load(self, clinic_id: int, severity: int) -> Tuple[np.datetime64, np.ndarray, np.datetime64]:
+        series_file = self._series_file(clinic_id, severity)
+        if not os.path.isfile(series_file):
+            return None, np.zeros(0, dtype=np.int64), None
+
+        with np.load(series_file) as series:
+            return self._optional(series['first']), series['counts'], self._optional(series['high_water_mark'])
+
+    @staticmethod
+    def _optional(day: np.ndarray) -> Optional[np.datetime64]:
+        day = day[()]
+        return None if np.isnat(day) else day
+
+    @staticmethod
+    def _save(file_name: Text, **arrays):
+        arrays = {name: np.datetime64('NaT', 'D') if value is None else value for name, value in arrays.items()}
+
+        # Write to a temporary file first so an interrupted sync never leaves a corrupt series
+        with open(file_name + '.tmp', 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(file_name + '.tmp', file_name)
+
+    def _series_file(self, clinic_id: int, severity: int) -> Text:
+        return os.path.join(self.directory, f'counts-{clinic_id}-{severity}.npz')
+
+    def _frame_file(self, clinic_id: int, severity: int, model) -> Text:
+        interval = model.time_interval.name.lower()
+        return os.path.join(self.directory, f'frame-{clinic_id}-{severity}-{interval}-{model.radius}.npz')
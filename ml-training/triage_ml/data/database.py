@@ -1,24 +1,373 @@
+from triage_ml.data.dataset import DataSet, TimeInterval, _ATTRS
+
 import psycopg2
-from typing import Text, List, Tuple
+from psycopg2.pool import PoolError
+import re
+import threading
+import time
+import uuid
+import numpy as np
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterator, Text, List, Tuple
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# The SQL expression of the first day of the interval each date falls into, matching interval_start. Weeks
+# start on Sunday (date_trunc's weeks start on Monday), and the days of a year before its first Sunday form
+# their own week as with '%Y-%U'.
+_INTERVAL_STARTS = {
+    TimeInterval.DAY: "CAST(date_trunc('day', {date}) AS DATE)",
+    TimeInterval.WEEK: "GREATEST(CAST(date_trunc('week', {date} + interval '1 day') - interval '1 day' AS DATE), "
+                       "CAST(date_trunc('year', {date}) AS DATE))",
+}
+
+
+def _identifier(name: Text) -> Text:
+    """
+    Validate a table or column name before it is written into a query.
+    :param name: The name.
+    :return: The name.
+    """
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f'Invalid identifier: {name}')
+    return name
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of database connections.
+
+    Checkouts block while every connection is in use, the time spent waiting is tracked along with
+    how often the pool was exhausted.
+
+    Attributes:
+        min_size: The number of connections opened up front.
+        max_size: The maximum number of open connections.
+        checkouts: The number of connections checked out.
+        exhausted: The number of checkouts that had to wait for a connection to be returned.
+        wait_time: The total seconds spent waiting for connections.
+        max_wait_time: The longest a single checkout waited, in seconds.
+    """
+
+    def __init__(self, min_size: int, max_size: int, connect=psycopg2.connect, **connect_kwargs):
+        """
+        Create a new ConnectionPool.
+        :param min_size: The number of connections to open up front.
+        :param max_size: The maximum number of open connections.
+        :param connect: The function used to open connections.
+        :param connect_kwargs: The arguments to open connections with.
+        """
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1.')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self._connect = lambda: connect(**connect_kwargs)
+        self._condition = threading.Condition()
+        self._idle = [self._connect() for _ in range(min_size)]
+        self._size = min_size
+        self._closed = False
+
+        self.checkouts = 0
+        self.exhausted = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def getconn(self, timeout: float = None):
+        """
+        Check out a connection, opening a new one if none are idle and the pool is not full.
+        :param timeout: The maximum seconds to wait for a connection, waits forever if None.
+        :return: The connection.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            if self._closed:
+                raise PoolError('Connection pool is closed.')
+
+            if not self._idle and self._size >= self.max_size:
+                self.exhausted += 1
+                if not self._condition.wait_for(lambda: self._idle or self._size < self.max_size or self._closed,
+                                                timeout):
+                    raise PoolError('Timed out waiting for a connection.')
+                if self._closed:
+                    raise PoolError('Connection pool is closed.')
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._size += 1
+                conn = None
+
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+
+        return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Return a checked out connection to the pool.
+        :param conn: The connection.
+        :param close: Whether the connection should be closed instead of reused.
+        """
+        if not close:
+            # End the connection's transaction so the next user starts clean
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._condition:
+            if close or self._closed:
+                conn.close()
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Check out a connection for the duration of a with block.
+        :param timeout: The maximum seconds to wait for a connection, waits forever if None.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        except psycopg2.InterfaceError:
+            self.putconn(conn, close=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self) -> Dict[Text, float]:
+        """
+        :return: The pool's size and checkout counters.
+        """
+        with self._condition:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'exhausted': self.exhausted,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+            }
+
+    def closeall(self):
+        """
+        Close every idle connection, connections still checked out are closed when they are returned.
+        """
+        with self._condition:
+            self._closed = True
+            for conn in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
 
 
 class Database:
+    """
+    Reads patient arrival data from the Triage Database.
+
+    Arrival queries push clinic, severity and date filters down to the database and can aggregate
+    arrivals into per interval counts, so only the data that is needed is transferred.
+
+    A Database either owns a single connection or checks connections out of a shared ConnectionPool
+    for each query.
 
-    def __init__(self, dbname: Text, user: Text, password: Text, host: Text, port: int):
-        self.conn = psycopg2.connect(
+    Attributes:
+        conn: The database connection, None when pooled.
+        pool: The ConnectionPool, None when not pooled.
+        columns: The clinic_id, severity and date_received column names of arrival tables.
+    """
+
+    def __init__(self, dbname: Text = None, user: Text = None, password: Text = None, host: Text = None,
+                 port: int = None, columns: List[Text] = None, connect=psycopg2.connect, pool: ConnectionPool = None):
+        self.pool = pool
+        # Set by Database.pooled, see close
+        self._owns_pool = False
+        self.conn = None if pool else connect(
             dbname=dbname,
             user=user,
             password=password,
             host=host,
             port=port
         )
+        self.columns = [_identifier(column) for column in columns or _ATTRS]
+
+    @classmethod
+    def pooled(cls, dbname: Text, user: Text, password: Text, host: Text, port: int, min_size=1, max_size=4,
+               columns: List[Text] = None, connect=psycopg2.connect) -> 'Database':
+        """
+        Create a Database backed by a new ConnectionPool.
+
+        Databases for other tables or threads can share the pool through Database(pool=db.pool).
+        :param min_size: The number of connections to open up front.
+        :param max_size: The maximum number of open connections.
+        :return: The Database
+        """
+        pool = ConnectionPool(min_size, max_size, connect=connect, dbname=dbname, user=user, password=password,
+                              host=host, port=port)
+        database = cls(columns=columns, pool=pool)
+        database._owns_pool = True
+        return database
+
+    @contextmanager
+    def connection(self):
+        """
+        Get a connection for the duration of a with block, checking it out of the pool if pooled.
+        """
+        if self.pool:
+            with self.pool.connection() as conn:
+                yield conn
+        else:
+            yield self.conn
 
     def get_table_data(self, table: Text, columns: List[Text]) -> List[Tuple]:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT (%s) FROM %s', ','.join(columns), table)
-        rows = cursor.fetchall()
-        cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {", ".join(map(_identifier, columns))} FROM {_identifier(table)}')
+            rows = cursor.fetchall()
+            cursor.close()
         return rows
 
+    def iter_arrivals(self, table: Text, clinic_id: int = None, severity: int = None, start_date: date = None,
+                      end_date: date = None, batch_size=10000) -> Iterator[DataSet]:
+        """
+        Stream the arrivals matching the given filters, ordered by date received.
+
+        Rows are read through a named server-side cursor, so at most batch_size rows are held in memory.
+        :param table: The table of arrivals.
+        :param clinic_id: If set, only arrivals of this clinic are read.
+        :param severity: If set, only arrivals of this severity are read.
+        :param start_date: If set, only arrivals received on or after this date are read.
+        :param end_date: If set, only arrivals received on or before this date are read.
+        :param batch_size: The number of rows to fetch at a time.
+        :return: An iterator of DataSets with up to batch_size arrivals each.
+        """
+        where, params = self._where(clinic_id, severity, start_date, end_date)
+        query = f'SELECT {", ".join(self.columns)} FROM {_identifier(table)}{where} ORDER BY {self.columns[2]}'
+
+        with self.connection() as conn:
+            cursor = conn.cursor(name=f'triage_arrivals_{uuid.uuid4().hex}')
+            try:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield DataSet(rows)
+            finally:
+                cursor.close()
+
+    def get_arrivals(self, table: Text, clinic_id: int = None, severity: int = None, start_date: date = None,
+                     end_date: date = None, batch_size=10000) -> DataSet:
+        """
+        Read the arrivals matching the given filters, ordered by date received.
+
+        See iter_arrivals for the parameters.
+        :return: The DataSet of arrivals.
+        """
+        chunks = list(self.iter_arrivals(table, clinic_id, severity, start_date, end_date, batch_size))
+        if not chunks:
+            return DataSet([])
+
+        return DataSet.from_columns(*(np.concatenate([chunk.columns[attribute] for chunk in chunks])
+                                      for attribute in _ATTRS))
+
+    def get_arrival_counts(self, table: Text, time_interval=TimeInterval.DAY, clinic_id: int = None,
+                           severity: int = None, start_date: date = None,
+                           end_date: date = None) -> List[Tuple[int, int, date, int]]:
+        """
+        Count the arrivals matching the given filters in each clinic, severity and time interval.
+
+        Intervals are computed by the database and start on the same days as DataSet.group_by's: weeks
+        start on Sunday, except for the days of a year before its first Sunday.
+        :param table: The table of arrivals.
+        :param time_interval: The size of each interval.
+        :param clinic_id: If set, only arrivals of this clinic are counted.
+        :param severity: If set, only arrivals of this severity are counted.
+        :param start_date: If set, only arrivals received on or after this date are counted.
+        :param end_date: If set, only arrivals received on or before this date are counted.
+        :return: A list of (clinic_id, severity, interval start, count) tuples ordered by clinic, severity and date.
+        """
+        where, params = self._where(clinic_id, severity, start_date, end_date)
+        clinic_column, severity_column, date_column = self.columns
+        interval_start = _INTERVAL_STARTS[time_interval].format(date=date_column)
+        query = f'SELECT {clinic_column}, {severity_column}, {interval_start}, COUNT(*) ' \
+                f'FROM {_identifier(table)}{where} GROUP BY 1, 2, 3 ORDER BY 1, 2, 3'
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def get_daily_counts(self, table: Text, clinic_id: int, severity: int, start_date: date = None,
+                         end_date: date = None) -> Tuple[np.datetime64, np.ndarray]:
+        """
+        Count the arrivals of a clinic and severity on each day, as DataSet.daily_counts does.
+        :param table: The table of arrivals.
+        :param clinic_id: The clinic to count arrivals of.
+        :param severity: The severity to count arrivals of.
+        :param start_date: If set, only arrivals received on or after this date are counted.
+        :param end_date: If set, only arrivals received on or before this date are counted.
+        :return: A tuple of the first day (None if there are no arrivals) and the number of arrivals on
+                 each day from the first day to the last.
+        """
+        rows = self.get_arrival_counts(table, TimeInterval.DAY, clinic_id, severity, start_date, end_date)
+        if not rows:
+            return None, np.zeros(0, dtype=np.int64)
+
+        days = np.array([row[2] for row in rows], dtype='datetime64[D]')
+        first = days.min()
+        return first, np.bincount((days - first).astype(np.int64), weights=[row[3] for row in rows]).astype(np.int64)
+
+    def _where(self, clinic_id: int, severity: int, start_date: date, end_date: date) -> Tuple[Text, List]:
+        """
+        Build the WHERE clause of an arrival query.
+        :return: A tuple of the clause and its parameters.
+        """
+        clinic_column, severity_column, date_column = self.columns
+        conditions = [
+            (f'{clinic_column} = %s', clinic_id),
+            (f'{severity_column} = %s', severity),
+            (f'{date_column} >= %s', start_date),
+            (f'{date_column} <= %s', end_date),
+        ]
+        conditions = [(condition, param) for condition, param in conditions if param is not None]
+        if not conditions:
+            return '', []
+
+        return ' WHERE ' + ' AND '.join(condition for condition, _ in conditions), [param for _, param in conditions]
+
     def close(self):
-        self.conn.close()
+        """
+        Close the Database's connection, or its pool if it was created by Database.pooled.
+
+        A pool passed to the constructor may be shared with other Databases and is left open, as
+        pooled connections are already returned after each query.
+        """
+        if self._owns_pool:
+            self.pool.closeall()
+        elif not self.pool:
+            self.conn.close()
@@ -1,10 +1,25 @@
 from collections import namedtuple
+from operator import itemgetter
 from typing import Any, Dict, List, Tuple, Text, Callable
+from datetime import date
 from enum import Enum, auto
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 _ATTRS = ['clinic_id', 'severity', 'date_received']
 
+# The typed storage of each DataPoint attribute.
+_DTYPES = {
+    'clinic_id': np.dtype(np.int32),
+    'severity': np.dtype(np.int8),
+    'date_received': np.dtype('datetime64[D]'),
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# The reductions DataSet.group_by computes over the data points of each group.
+REDUCTIONS = ('sum', 'mean', 'min', 'max')
+
 DataPoint = namedtuple('DataPoint', _ATTRS)
 
 
@@ -13,12 +28,137 @@ class TimeInterval(Enum):
     WEEK = auto()
 
 
+def interval_index(days: np.ndarray, time_interval: TimeInterval) -> np.ndarray:
+    """
+    Compute the time interval each day falls into.
+
+    Days are their own interval. Weeks follow the '%Y-%U' convention: weeks start on Sunday and
+    the days of a year before its first Sunday are week 0. Indices increase with the date, but
+    are not contiguous across years for weeks.
+    :param days: An array of datetime64[D] days.
+    :param time_interval: The size of each interval.
+    :return: An int64 array with the interval index of each day.
+    """
+    epoch_days = days.astype('datetime64[D]').astype(np.int64)
+    if time_interval == TimeInterval.WEEK:
+        years = days.astype('datetime64[Y]')
+        year_days = epoch_days - years.astype('datetime64[D]').astype(np.int64)
+        week_days = (epoch_days + 4) % 7  # 1970-01-01 was a Thursday, Sunday is 0
+        return years.astype(np.int64) * 54 + (year_days + 7 - week_days) // 7
+    else:
+        return epoch_days
+
+
+def interval_start(indices: np.ndarray, time_interval: TimeInterval) -> np.ndarray:
+    """
+    Compute the first day of each time interval, the inverse of interval_index.
+    :param indices: An array of interval indices, as interval_index computes.
+    :param time_interval: The size of each interval.
+    :return: A datetime64[D] array with the first day of each interval.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if time_interval == TimeInterval.WEEK:
+        years, weeks = np.divmod(indices, 54)
+        new_year = years.astype('datetime64[Y]').astype('datetime64[D]')
+        first_sunday = (3 - new_year.astype(np.int64)) % 7  # 1970-01-01 was a Thursday
+        return np.where(weeks == 0, new_year, new_year + first_sunday + 7 * (weeks - 1))
+    else:
+        return indices.astype('datetime64[D]')
+
+
+def _group_codes(keys: List[np.ndarray]) -> Tuple[np.ndarray, int, Any, List[np.ndarray]]:
+    """
+    Number the distinct combinations of key values, in the order of the values.
+
+    Integer keys spanning a small enough range are numbered by their offsets from their minimum in a
+    single pass, so every possible combination has a code and groups are the codes that occur. Other
+    keys are numbered by sorting their distinct values.
+    :param keys: The keys of each data point, one array per key.
+    :return: The code of each data point, the number of codes, the codes of the groups that occur and the
+             key values of each group.
+    """
+    rows = len(keys[0])
+    if rows and all(key.dtype.kind in 'iu' for key in keys):
+        lows = [int(key.min()) for key in keys]
+        sizes = [int(key.max()) - low + 1 for key, low in zip(keys, lows)]
+        if np.prod(sizes, dtype=object) <= max(4 * rows, 2**22):
+            codes = np.zeros(rows, dtype=np.int64)
+            for key, low, size in zip(keys, lows, sizes):
+                codes *= size
+                codes += key
+                codes -= low
+            space = int(np.prod(sizes))
+            groups = np.flatnonzero(np.bincount(codes, minlength=space))
+            return codes, space, groups, [low + offsets for low, offsets in zip(lows, np.unravel_index(groups, sizes))]
+
+    codes, size = np.zeros(rows, dtype=np.int64), 1
+    for key in keys:
+        values, inverse = np.unique(key, return_inverse=True)
+        if size * len(values) >= 2**62:
+            # Renumber the combinations so far densely so the codes cannot overflow
+            codes = np.unique(codes, return_inverse=True)[1].ravel()
+            size = int(codes.max()) + 1 if rows else 1
+        codes = codes * len(values) + inverse.ravel()
+        size *= len(values)
+
+    _, first, codes = np.unique(codes, return_index=True, return_inverse=True)
+    return codes.ravel(), len(first), slice(None), [key[first] for key in keys]
+
+
+def _to_column(attribute: Text, values) -> np.ndarray:
+    """
+    Convert a sequence of attribute values into a typed column.
+
+    Values that do not fit the attribute's typed schema are kept as an object column so that
+    arbitrary data can still be stored.
+    :param attribute: The attribute the values belong to.
+    :param values: The sequence of values.
+    :return: The column.
+    """
+    dtype = _DTYPES[attribute]
+    if not len(values):
+        return np.empty(0, dtype=dtype)
+
+    if isinstance(values, np.ndarray) and values.dtype == dtype:
+        return values
+    elif isinstance(values, np.ndarray) and values.dtype.kind == dtype.kind:
+        column = values
+    elif dtype.kind == 'M' and isinstance(values[0], date):
+        # Converting through ordinals is an order of magnitude faster than NumPy's datetime parsing
+        try:
+            ordinals = np.fromiter(map(date.toordinal, values), dtype=np.int64, count=len(values))
+            return (ordinals - _EPOCH_ORDINAL).astype(dtype)
+        except TypeError:
+            column = None
+    else:
+        try:
+            column = np.asarray(values)
+        except ValueError:
+            column = None
+
+    if column is not None and column.ndim == 1:
+        if dtype.kind == 'M' and column.dtype.kind == 'M':
+            return column.astype(dtype)
+        elif dtype.kind == 'i' and column.dtype.kind in 'iu':
+            info = np.iinfo(dtype)
+            if info.min <= column.min() and column.max() <= info.max:
+                return column.astype(dtype)
+            return column
+
+    column = np.empty(len(values), dtype=object)
+    column[:] = list(values)
+    return column
+
+
 class DataSet:
     """
     Stores a set of patient arrival data pulled from the Triage Database.
 
+    The data is stored column-wise with one typed NumPy array per DataPoint attribute
+    (int32 clinic_id, int8 severity and datetime64[D] date_received).
+
     Attributes:
-        data: A list of DataPoint tuples.
+        columns: A dictionary of attribute names to their column.
     """
 
     def __init__(self, data: List[Tuple]):
@@ -28,25 +168,75 @@ class DataSet:
         Tuples must fit the structure (length) of DataPoint.
         :param data: The list of data tuples.
         """
+        if isinstance(data, DataSet):
+            self.columns = dict(data.columns)
+            return
+
         # Tuple must fit structure of DataPoint
         if len(data) and len(data[0]) != len(_ATTRS):
             raise ValueError('Invalid data argument.')
 
-        self.data = [DataPoint(*item) for item in data]
+        self.columns = {
+            attribute: _to_column(attribute, list(map(itemgetter(i), data)))
+            for i, attribute in enumerate(_ATTRS)
+        }
+
+    @classmethod
+    def from_columns(cls, clinic_id, severity, date_received) -> 'DataSet':
+        """
+        Create a new DataSet directly from its columns without building any tuples.
+        :param clinic_id: The clinic ID of each data point.
+        :param severity: The severity of each data point.
+        :param date_received: The date each data point was received.
+        :return: The DataSet
+        """
+        columns = (clinic_id, severity, date_received)
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError('Columns must all have the same length.')
+
+        dataset = cls.__new__(cls)
+        dataset.columns = {attribute: _to_column(attribute, column) for attribute, column in zip(_ATTRS, columns)}
+        return dataset
+
+    @property
+    def data(self) -> List[DataPoint]:
+        """
+        :return: The DataSet as a list of DataPoint tuples.
+        """
+        return [DataPoint(*values) for values in zip(*(self._values(attribute) for attribute in _ATTRS))]
 
     def filter_on(self, attribute: Text, predicate: Callable[[Any], bool]):
         """
         Filter the DataSet on a certain attribute with the given predicate.
 
         Any data points whose specified attribute does not meet the predicate are
-        removed.
+        removed. The predicate is applied to each value, see filter_mask to filter
+        with a predicate over the whole column at once.
         :param attribute: The attribute to filter on.
         :param predicate: The predicate function
         :return: The modified DataSet
         """
-        attr_idx = _ATTRS.index(attribute)
-        self.data = list(filter(lambda data_point: predicate(data_point[attr_idx]), self.data))
-        return self
+        return self._take(np.fromiter(map(predicate, self._values(attribute)), dtype=bool, count=len(self)))
+
+    def filter_mask(self, attribute: Text, predicate: Callable[[np.ndarray], np.ndarray]):
+        """
+        Filter the DataSet on a certain attribute with a vectorized predicate.
+
+        The predicate is applied to the attribute's whole column at once and must
+        return a boolean mask of the data points to keep.
+        :param attribute: The attribute to filter on.
+        :param predicate: The predicate function
+        :return: The modified DataSet
+        """
+        column = self.columns[attribute]
+        if column.dtype.kind == 'M':
+            # At day precision NumPy compares dates to datetime operands as objects, which fails
+            column = column.astype('datetime64[us]')
+
+        mask = np.asarray(predicate(column))
+        if mask.dtype != bool or mask.shape != (len(self),):
+            raise ValueError(f'The predicate must return a boolean mask of {len(self)} values.')
+        return self._take(mask)
 
     def order_by(self, attribute: Text, descending=False):
         """
@@ -55,84 +245,292 @@ class DataSet:
         :param descending: A boolean, whether the data should ordered as descending.
         :return: The modified DataSet
         """
-        attr_idx = _ATTRS.index(attribute)
-        self.data = sorted(self.data, key=lambda data_point: data_point[attr_idx], reverse=descending)
-        return self
+        column = self.columns[attribute]
+        if descending:
+            # Keep equal values in their original order, as a reversed stable sort does
+            order = (len(column) - 1 - np.argsort(column[::-1], kind='stable'))[::-1]
+        else:
+            order = np.argsort(column, kind='stable')
+
+        return self._take(order)
 
     def aggregate_on(self, attribute: Text, key: Callable[[Any], Any]) -> Dict[Any, List[DataPoint]]:
         """
         Produces an aggregation of DataPoints where the attribute keys are equal.
+
+        The key function is only evaluated once for each distinct attribute value. Use group_by when only
+        the number of DataPoints of each key is needed.
         :param attribute: The attribute to aggregate on.
         :param key: A function to get the equivalence property of the attribute.
         :return: A Dictionary of attributes to their aggregated DataPoints.
         """
-        attr_idx = _ATTRS.index(attribute)
-        sorted_data = sorted(self.data, key=lambda data_point: key(data_point[attr_idx]))
+        if not len(self):
+            return {}
 
-        aggregation = {}
-        agg = None
-        for data_point in sorted_data:
-            if agg:
-                if key(data_point[attr_idx]) == key(agg[1][-1][attr_idx]):
-                    agg[1].append(data_point)
-                    continue
-                else:
-                    aggregation[key(agg[0])] = agg[1]
+        uniques, inverse = np.unique(self.columns[attribute], return_inverse=True)
+        unique_keys = [key(value) for value in self._values(attribute, uniques)]
+        sorted_keys = sorted(set(unique_keys))
+        key_index = {k: i for i, k in enumerate(sorted_keys)}
 
-            agg = (data_point[attr_idx], [data_point])
+        groups = np.array([key_index[k] for k in unique_keys])[inverse.ravel()]
+        order = np.argsort(groups, kind='stable')
+        bounds = np.cumsum(np.bincount(groups, minlength=len(sorted_keys)))[:-1]
 
-        if agg:
-            aggregation[key(agg[0])] = agg[1]
+        data = self.data
+        return {
+            k: [data[i] for i in indices]
+            for k, indices in zip(sorted_keys, np.split(order, bounds))
+        }
 
-        return aggregation
+    def group_by(self, attributes: List[Text], time_interval: TimeInterval = None,
+                 reductions: Dict[Text, Tuple[Text, Text]] = None) -> Dict[Text, np.ndarray]:
+        """
+        Count the data points of each distinct combination of attribute values, such as each clinic,
+        severity and week, in one pass over the columns.
+
+        No rows are sorted or copied: when the attribute values span small enough ranges, which clinic
+        IDs, severities and dates do, every data point is counted with a single bincount.
+        :param attributes: The attributes to group on.
+        :param time_interval: If set, dates are grouped by the time interval they fall into instead of by day.
+        :param reductions: An optional dictionary of names to (attribute, reduction) pairs, computed over the
+                           data points of each group in the same pass. Reductions are one of REDUCTIONS, dates
+                           may only be reduced by 'min' or 'max'.
+        :return: A dictionary of columns with one row per group, ordered by value: the value of each grouped
+                 attribute (the first day of the interval for grouped dates), 'count' with the number of data
+                 points in the group, and one column per reduction.
+        """
+        reductions = reductions or {}
+        for name, (attribute, reduction) in reductions.items():
+            if reduction not in REDUCTIONS:
+                raise ValueError(f'Unknown reduction {reduction!r} of {name!r}, expected one of {REDUCTIONS}.')
+            if self.columns[attribute].dtype.kind == 'M' and reduction not in ('min', 'max'):
+                raise ValueError(f'Dates can only be reduced by min or max, not {reduction!r}.')
+
+        time_interval = time_interval or TimeInterval.DAY
+        keys = [interval_index(self.columns[attribute], time_interval) if self.columns[attribute].dtype.kind == 'M'
+                else self.columns[attribute] for attribute in attributes]
+        codes, space, groups, values = _group_codes(keys)
+
+        result = {}
+        for attribute, group_values in zip(attributes, values):
+            column = self.columns[attribute]
+            result[attribute] = (interval_start(group_values, time_interval) if column.dtype.kind == 'M'
+                                 else group_values.astype(column.dtype))
+        counts = np.bincount(codes, minlength=space)[groups]
+        result['count'] = counts
+
+        for name, (attribute, reduction) in reductions.items():
+            column = self.columns[attribute]
+            is_date = column.dtype.kind == 'M'
+            column = column.astype('datetime64[D]').astype(np.int64) if is_date else column
+            if reduction in ('sum', 'mean'):
+                reduced = np.bincount(codes, weights=column, minlength=space)[groups]
+                result[name] = reduced / counts if reduction == 'mean' else reduced
+            else:
+                ufunc = np.minimum if reduction == 'min' else np.maximum
+                reduced = np.zeros(space, dtype=column.dtype)
+                if len(column):
+                    reduced[:] = column.max() if reduction == 'min' else column.min()
+                    ufunc.at(reduced, codes, column)
+                result[name] = reduced[groups].astype('datetime64[D]') if is_date else reduced[groups]
+        return result
+
+    def partition_on(self, attributes: List[Text]) -> Dict[Tuple, 'DataSet']:
+        """
+        Split the DataSet into one DataSet per distinct combination of attribute values.
+        :param attributes: The attributes to partition on.
+        :return: A Dictionary of attribute value tuples to their DataSet, ordered by value.
+        """
+        if not len(self):
+            return {}
+
+        codes = np.zeros(len(self), dtype=np.int64)
+        uniques = []
+        for attribute in attributes:
+            values, inverse = np.unique(self.columns[attribute], return_inverse=True)
+            codes = codes * len(values) + inverse.ravel()
+            uniques.append(self._values(attribute, values))
+
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+
+        partitions = {}
+        for indices in np.split(order, bounds):
+            code, key = codes[indices[0]], []
+            for values in reversed(uniques):
+                code, value_idx = divmod(code, len(values))
+                key.insert(0, values[value_idx])
+            partitions[tuple(key)] = self._select(indices)
+
+        return partitions
+
+    def daily_counts(self) -> Tuple[np.datetime64, np.ndarray]:
+        """
+        Count the data points received on each day.
+        :return: A tuple of the first day (None if the DataSet is empty) and the number of data
+                 points received on each day from the first day to the last.
+        """
+        days = self.columns['date_received'].astype('datetime64[D]')
+        if not len(days):
+            return None, np.zeros(0, dtype=np.int64)
+
+        first = days.min()
+        return first, np.bincount((days - first).astype(np.int64))
+
+    @classmethod
+    def read_from_file(cls, file_name: str, clinic_id: int = None, severity: int = None) -> 'DataSet':
+        """
+        Reads a DataSet from the provided CSV or binary (.npz) file.
+
+        The columns of binary files are memory-mapped.
+        :param file_name: The file to read.
+        :param clinic_id: If set, only the data of this clinic is kept.
+        :param severity: If set, only the data of this severity is kept.
+        :return: The DataSet
+        """
+        from triage_ml.data import storage
+        return storage.load_dataset(file_name, clinic_id, severity)
 
     def write_to_file(self, file_name: str):
         """
         Writes the DataSet to the provided file.
+
+        Files ending in .npz are written in the binary format, all others as CSV.
         :param file_name: The file to write to.
         """
-        lines = []
-        for datum in self.data:
-            serialized_datum = (
-                str(datum.clinic_id),
-                str(datum.severity),
-                datum.date_received.strftime('%Y-%m-%d'),
-            )
-            lines.append(','.join(serialized_datum))
+        if file_name.endswith('.npz'):
+            from triage_ml.data import storage
+            return storage.write_npz(self, file_name)
+
+        dates = self.columns['date_received']
+        if dates.dtype.kind == 'M':
+            dates = dates.astype(str)
+        else:
+            dates = [date_received.strftime('%Y-%m-%d') for date_received in dates]
+
+        lines = [
+            ','.join(serialized_datum)
+            for serialized_datum in zip(map(str, self._values('clinic_id')), map(str, self._values('severity')), dates)
+        ]
 
         with open(file_name, 'w') as file:
             file.write('\n'.join(lines))
 
+    def _take(self, index):
+        self.columns = {attribute: column[index] for attribute, column in self.columns.items()}
+        return self
+
+    def _select(self, index) -> 'DataSet':
+        dataset = DataSet.__new__(DataSet)
+        dataset.columns = {attribute: column[index] for attribute, column in self.columns.items()}
+        return dataset
+
+    def _values(self, attribute: Text, column: np.ndarray = None) -> List:
+        """
+        Get the values of a column as Python objects.
+        :param attribute: The attribute of the column.
+        :param column: The column, defaults to the DataSet's own column for the attribute.
+        :return: The list of values.
+        """
+        column = self.columns[attribute] if column is None else column
+        if column.dtype.kind == 'M':
+            column = column.astype('datetime64[us]')
+        return column.tolist()
+
     def __len__(self):
-        return len(self.data)
+        return len(self.columns['clinic_id'])
 
     def __getitem__(self, index):
-        return self.data[index]
+        if isinstance(index, slice):
+            return self._select(index)
+        index = range(len(self))[index]
+        return DataPoint(*(self._values(attribute, self.columns[attribute][index:index + 1])[0]
+                           for attribute in _ATTRS))
 
 
 class MLDataSet:
+    """
+    Stores the inputs and outputs used to train a model.
+
+    Attributes:
+        inputs: A list of model inputs, sequence inputs come first.
+        outputs: A list of model outputs.
+        seq_size: The length of each sequence input.
+        strided: Whether sequence inputs are read-only views over their series.
+    """
+
+    def __init__(self, seq_inputs: List[np.array], other_inputs: List[np.array], outputs: List[np.array], seq_size,
+                 strided=False):
+        """
+        Create a new MLDataSet.
 
-    def __init__(self, seq_inputs: List[np.array], other_inputs: List[np.array], outputs: List[np.array], seq_size):
+        Each sequence input series is turned into the seq_size previous values of every sample,
+        the first seq_size samples of every input and output are dropped as they have no full sequence.
+        :param seq_inputs: The series to build sequence inputs from.
+        :param other_inputs: The remaining inputs.
+        :param outputs: The outputs.
+        :param seq_size: The length of each sequence.
+        :param strided: Whether sequence inputs should be read-only views over their series instead of copies.
+        """
         self.seq_size = seq_size
+        self.strided = strided
         self.inputs = [self._setup_seq(x) for x in seq_inputs] + [x[seq_size:] for x in other_inputs]
         self.outputs = [y[seq_size:] for y in outputs]
 
     def _setup_seq(self, data):
+        size = len(data) - self.seq_size
+        if size <= 0:
+            return np.array([])
+
+        if self.strided:
+            data = np.asarray(data)
+            return as_strided(data, shape=(size, self.seq_size) + data.shape[1:],
+                              strides=data.strides[:1] + data.strides, writeable=False)
+
         seq_data = []
         for i in range(self.seq_size, len(data)):
             seq_data.append(data[i-self.seq_size:i])
-        seq_data = np.stack(seq_data) if seq_data else np.array(seq_data)
-        return seq_data
+        return np.stack(seq_data)
+
+    @classmethod
+    def concatenate(cls, ml_datasets: List['MLDataSet']) -> 'MLDataSet':
+        """
+        Stack the samples of MLDataSets with the same inputs and outputs into one MLDataSet.
+        :param ml_datasets: The MLDataSets, at least one.
+        :return: The MLDataSet, whose inputs and outputs are copies.
+        """
+        # Empty sequence inputs do not have the shape of the others
+        ml_datasets = [data for data in ml_datasets if len(data)] or ml_datasets[:1]
+        ml_dataset = cls.__new__(cls)
+        ml_dataset.seq_size = ml_datasets[0].seq_size
+        ml_dataset.strided = False
+        ml_dataset.inputs = [np.concatenate(x) for x in zip(*(data.inputs for data in ml_datasets))]
+        ml_dataset.outputs = [np.concatenate(y) for y in zip(*(data.outputs for data in ml_datasets))]
+        return ml_dataset
 
     def split(self, point=0.5):
         """
-        Split the MLDataSet into two MLDataSets at a given point
+        Split the MLDataSet into two MLDataSets at a given point.
+
+        The inputs and outputs of both MLDataSets are views over the inputs and outputs of this one.
         :param point: The point to split the MLDataSet (0,1)
         :return: A Tuple (MLDataSet, MLDataSet)
         """
-        split_idx = int(len(self.inputs[0]) * point)
-        s1 = MLDataSet([], [x[:split_idx] for x in self.inputs],
-                       [y[:split_idx] for y in self.outputs], self.seq_size)
-        s2 = MLDataSet([], [x[split_idx:] for x in self.inputs],
-                       [y[split_idx:] for y in self.outputs], self.seq_size)
-        return s1, s2
+        split_idx = int(len(self) * point)
+        return self[:split_idx], self[split_idx:]
+
+    def __len__(self):
+        return len(self.inputs[0]) if self.inputs else 0
+
+    def __getitem__(self, index: slice):
+        """
+        :param index: A slice of samples.
+        :return: A MLDataSet whose inputs and outputs are views over the sliced samples.
+        """
+        ml_dataset = MLDataSet.__new__(MLDataSet)
+        ml_dataset.seq_size = self.seq_size
+        ml_dataset.strided = self.strided
+        ml_dataset.inputs = [x[index] for x in self.inputs]
+        ml_dataset.outputs = [y[index] for y in self.outputs]
+        return ml_dataset
@@ -0,0 +1,163 @@
+from triage_ml.data.dataset import DataSet, MLDataSet
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Text, Tuple
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Bumped whenever create_frame changes what it builds, so frames cached before are never reused
+FRAME_VERSION = 1
+
+
+class FrameCache:
+    """
+    An on-disk cache of the frames MLDataSets are windowed from.
+
+    Building a frame from arrivals is the costly part of building a MLDataSet, and a frame depends only on
+    the daily arrival counts and the model's radius and time interval. Frames are stored as .npy files
+    under a hash of these, and memory-mapped when loaded, so runs on unchanged data skip preprocessing and
+    share the pages of one copy. Windowing a frame by any sequence size is a read-only view.
+
+    When the cache grows beyond its size limit, the least recently used frames are evicted, except those
+    used through this instance so that a run never loses the frames it is training on.
+
+    Attributes:
+        directory: The directory frames are kept in.
+        max_bytes: The size the cache is kept under, or None for no limit.
+        hits: The number of frames loaded from the cache.
+        misses: The number of frames built and added to the cache.
+        evictions: The number of frames evicted from the cache.
+    """
+
+    def __init__(self, directory: Text, max_bytes: int = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._used = set()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, start: Optional[np.datetime64], daily_counts: np.ndarray) -> Text:
+        """
+        :param model: The RadiusVariance model the frame is built for.
+        :param start: The day of the first count.
+        :param daily_counts: The number of arrivals on each day from the start day.
+        :return: The hash the frame is cached under.
+        """
+        digest = hashlib.sha256(f'{FRAME_VERSION}:{model.radius}:{model.time_interval.name}:{start}:'.encode())
+        digest.update(np.ascontiguousarray(daily_counts, dtype=np.int64).data)
+        return digest.hexdigest()
+
+    def frame_files(self, model, start: Optional[np.datetime64], daily_counts: np.ndarray) -> List[Text]:
+        """
+        Build the frame of some daily counts unless it is already cached.
+        :param model: The RadiusVariance model to build the frame with.
+        :param start: The day of the first count.
+        :param daily_counts: The number of arrivals on each day from the start day.
+        :return: The .npy files of the frame.
+        """
+        key = self.key(model, start, daily_counts)
+        entry = os.path.join(self.directory, key)
+        self._used.add(key)
+
+        if os.path.isdir(entry):
+            self.hits += 1
+            # The modification time orders entries for eviction
+            os.utime(entry)
+        else:
+            self.misses += 1
+            tmp_entry = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+            for i, array in enumerate(model.create_frame(start, daily_counts)):
+                np.save(os.path.join(tmp_entry, f'frame-{i}.npy'), array)
+            try:
+                os.rename(tmp_entry, entry)
+            except OSError:
+                # Another process cached the same frame first
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+            self._evict()
+
+        return [os.path.join(entry, f'frame-{i}.npy') for i in range(3)]
+
+    def frame(self, model, start: Optional[np.datetime64], daily_counts: np.ndarray) -> List[np.ndarray]:
+        """
+        :return: The frame of some daily counts, memory-mapped read-only from the cache.
+        """
+        return [np.load(file, mmap_mode='r') for file in self.frame_files(model, start, daily_counts)]
+
+    def ml_dataset(self, model, dataset: DataSet, strided=False) -> MLDataSet:
+        """
+        Build a MLDataSet as model.create_ml_dataset does, from a cached frame.
+        :param model: The RadiusVariance model to build the MLDataSet for.
+        :param dataset: The DataSet to construct the MLDataSet from.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
+        :return: The MLDataSet
+        """
+        return model.ml_dataset_from_frame(self.frame(model, *dataset.daily_counts()), strided=strided)
+
+    def size(self) -> int:
+        """
+        :return: The number of bytes of every cached frame.
+        """
+        return sum(size for _, _, size in self._entries())
+
+    def stats(self) -> Dict[Text, int]:
+        """
+        :return: The cache's size and hit, miss and eviction counters.
+        """
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, _, size in entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _entries(self) -> List[Tuple[Text, float, int]]:
+        """
+        :return: The key, last use and size of every cached frame.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if key.startswith('.tmp-') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+                entries.append((key, os.path.getmtime(entry), size))
+            except FileNotFoundError:
+                # Evicted by another process
+                pass
+        return entries
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(entry_size for _, _, entry_size in entries)
+        for key, _, entry_size in entries:
+            if size <= self.max_bytes:
+                break
+            if key in self._used:
+                continue
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            size -= entry_size
+            self.evictions += 1
+
+
+@lru_cache(maxsize=8)
+def load_frame(files: Tuple[Text]) -> List[np.ndarray]:
+    """
+    Memory-map a frame read-only from its .npy files.
+
+    The last frames loaded are kept, so a worker process reuses them across the tasks it runs on the same frame.
+    :param files: The .npy files of the frame, as FrameCache.frame_files returns them.
+    :return: The frame
+    """
+    return [np.load(file, mmap_mode='r') for file in files]
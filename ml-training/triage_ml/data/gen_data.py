@@ -1,44 +1,179 @@
 import argparse
-import math
-import random
 from datetime import datetime, timedelta
+from typing import Iterator, Text
 
-from triage_ml.data.dataset import DataSet
+from triage_ml.data.dataset import DataSet, _ATTRS
+from triage_ml.data import storage
 import triage_ml.data.visualizations as visualizations
+import numpy as np
 
 
 SEVERITY_PROBS = [0.1, 0.4, 1.0]
 
+# The approximate number of arrivals generated at a time when streaming
+_CHUNK_SIZE = 2**22
 
-def get_random_severity():
-    ran = random.random()
-    for i in range(len(SEVERITY_PROBS)):
-        if ran < SEVERITY_PROBS[i]:
-            return i
 
+def cyclic_rates(days: int, clinics=1, random_multiple=0, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    The number of arrivals expected on each day of a yearly cycle with a slow upward trend.
+    :param days: The number of days.
+    :param clinics: The number of clinics, every clinic after the first is scaled by a random factor.
+    :param random_multiple: The amount of uniform noise added to each day.
+    :param rng: The random generator to draw with.
+    :return: An array of rates of shape (days, clinics).
+    """
+    rng = rng or np.random.default_rng()
+    d = np.arange(days)[:, np.newaxis]
+    scale = np.concatenate([[1], rng.uniform(0.5, 2, clinics - 1)])
+    noise = random_multiple * rng.random((days, clinics)) if random_multiple else 0
+    return (20 + d / 300 + 2 * np.sin(2 * np.pi * d / 365)) * scale + noise
 
-def cyclic(start_date: datetime, end_date: datetime, random_multiple=0) -> DataSet:
-    fn = lambda d: max(round(
-        20 + d/300 + 2*math.sin(2 * math.pi * d/365) + random_multiple*random.random()
-    ), 0)
-    data = []
-    i = 0
-    for d, date in enumerate(date_range(start_date, end_date)):
-        arrivals = fn(d)
-        for arrival in range(arrivals):
-            data.append((1, get_random_severity(), date))
-            i += 1
 
-    return DataSet(data)
+def _rounded_cyclic(random_multiple=0):
+    return lambda days, clinics, rng: np.maximum(np.round(cyclic_rates(days, clinics, random_multiple, rng)), 0) \
+        .astype(np.int64)
 
 
 DATE_FORMAT = '%Y-%m-%d'
+
+# Methods generating the number of arrivals of each day and clinic, as an array of shape (days, clinics)
 GEN_METHODS = {
-    'cyclic': cyclic,
-    'random_cyclic': lambda sd, ed: cyclic(sd, ed, 2)
+    'cyclic': _rounded_cyclic(),
+    'random_cyclic': _rounded_cyclic(2),
+    'poisson': lambda days, clinics, rng: rng.poisson(cyclic_rates(days, clinics, rng=rng)),
 }
 
 
+def arrival_counts(start_date: datetime, end_date: datetime, method='cyclic', clinics=1,
+                   seed: int = None) -> np.ndarray:
+    """
+    Generate the number of arrivals of every day, clinic and severity.
+
+    Severities are split from each day's arrivals with a single multinomial draw, which follows the
+    same distribution as drawing the severity of every arrival.
+    :param start_date: The first day.
+    :param end_date: The last day.
+    :param method: The name of the GEN_METHODS method to generate daily arrivals with.
+    :param clinics: The number of clinics, with IDs from 1.
+    :param seed: The seed of the random generator.
+    :return: An array of counts of shape (days, clinics, severities).
+    """
+    rng = np.random.default_rng(seed)
+    daily = GEN_METHODS[method](max((end_date - start_date).days + 1, 0), clinics, rng)
+    return rng.multinomial(daily, np.diff(SEVERITY_PROBS, prepend=0))
+
+
+def to_dataset(start_date: datetime, counts: np.ndarray) -> DataSet:
+    """
+    Expand arrival counts into a single DataSet, see iter_arrivals.
+    """
+    chunks = list(iter_arrivals(start_date, counts, chunk_size=max(int(counts.sum()), 1)))
+    return chunks[0] if chunks else DataSet([])
+
+
+def iter_arrivals(start_date: datetime, counts: np.ndarray, chunk_size=_CHUNK_SIZE) -> Iterator[DataSet]:
+    """
+    Expand arrival counts into DataSets of arrivals, ordered by date, clinic and severity.
+    :param start_date: The day of the first counts.
+    :param counts: The counts of shape (days, clinics, severities) from arrival_counts.
+    :param chunk_size: The approximate number of arrivals in each DataSet.
+    :return: An iterator of DataSets.
+    """
+    for day, chunk in _iter_day_blocks(counts, chunk_size):
+        yield DataSet.from_columns(*(_column(attribute, start_date, day, chunk) for attribute in _ATTRS))
+
+
+def _column(attribute: Text, start_date: datetime, day: int, chunk: np.ndarray) -> np.ndarray:
+    """
+    Expand a block of arrival counts into the column of a DataPoint attribute.
+    :return: The column.
+    """
+    _, clinics, severities = chunk.shape
+    keys = np.arange(chunk.size)
+    if attribute == 'clinic_id':
+        values = (keys // severities) % clinics + 1
+    elif attribute == 'severity':
+        values = keys % severities
+    else:
+        values = np.datetime64(start_date, 'D') + day + keys // (clinics * severities)
+    return np.repeat(values, chunk.ravel())
+
+
+def _iter_day_blocks(counts: np.ndarray, chunk_size: int) -> Iterator:
+    """
+    Split counts into blocks of consecutive days with about chunk_size arrivals each.
+    :return: An iterator of (first day index, counts) blocks.
+    """
+    ends = np.cumsum(counts.reshape(len(counts), -1).sum(axis=1))
+    day = 0
+    while day < len(counts):
+        done = ends[day - 1] if day else 0
+        end = max(int(np.searchsorted(ends, done + chunk_size, side='right')), day + 1)
+        yield day, counts[day:end]
+        day = end
+
+
+def write_csv(start_date: datetime, counts: np.ndarray, file_name: Text, chunk_size=_CHUNK_SIZE):
+    """
+    Stream arrivals to a CSV file of clinic_id,severity,YYYY-MM-DD lines.
+
+    Arrivals of the same day, clinic and severity share a line, so each line is formatted once and
+    repeated as bytes.
+    :param start_date: The day of the first counts.
+    :param counts: The counts of shape (days, clinics, severities) from arrival_counts.
+    :param file_name: The file to write to.
+    :param chunk_size: The approximate number of arrivals to format at a time.
+    """
+    start = np.datetime64(start_date, 'D')
+    _, clinics, severities = counts.shape
+    prefixes = np.char.add(np.char.add(np.arange(1, clinics + 1).astype(bytes)[:, np.newaxis], b','),
+                           np.char.add(np.arange(severities).astype(bytes), b','))
+
+    with open(file_name, 'wb') as file:
+        for day, chunk in _iter_day_blocks(counts, chunk_size):
+            dates = np.char.add(np.datetime_as_string(start + day + np.arange(len(chunk))).astype(bytes), b'\n')
+            lines = np.char.add(prefixes, dates[:, np.newaxis, np.newaxis]).ravel()
+            repeats = chunk.ravel()
+
+            # Lines are fixed width within runs of clinic IDs with the same number of digits
+            widths = np.char.str_len(lines)
+            runs = np.flatnonzero(np.diff(widths)) + 1
+            for run_lines, run_repeats in zip(np.split(lines, runs), np.split(repeats, runs)):
+                file.write(np.repeat(run_lines.astype(run_lines.dtype.char + str(len(run_lines[0]))),
+                                     run_repeats).tobytes())
+
+
+def write_npz(start_date: datetime, counts: np.ndarray, file_name: Text, chunk_size=_CHUNK_SIZE):
+    """
+    Stream arrivals to a binary (.npz) file.
+    :param start_date: The day of the first counts.
+    :param counts: The counts of shape (days, clinics, severities) from arrival_counts.
+    :param file_name: The file to write to.
+    :param chunk_size: The approximate number of arrivals to write at a time.
+    """
+    def column_chunks(attribute):
+        for day, chunk in _iter_day_blocks(counts, chunk_size):
+            yield _column(attribute, start_date, day, chunk)
+
+    storage.write_npz_columns(file_name, int(counts.sum()), column_chunks)
+
+
+def cyclic(start_date: datetime, end_date: datetime, random_multiple=0, clinics=1, seed: int = None) -> DataSet:
+    """
+    Generate a DataSet of arrivals following a yearly cycle.
+    :param start_date: The first day.
+    :param end_date: The last day.
+    :param random_multiple: The amount of uniform noise added to each day.
+    :param clinics: The number of clinics, with IDs from 1.
+    :param seed: The seed of the random generator.
+    :return: The DataSet
+    """
+    rng = np.random.default_rng(seed)
+    daily = _rounded_cyclic(random_multiple)(max((end_date - start_date).days + 1, 0), clinics, rng)
+    return to_dataset(start_date, rng.multinomial(daily, np.diff(SEVERITY_PROBS, prepend=0)))
+
+
 def date_range(min_date: datetime, max_date: datetime):
     for n in range(int((max_date - min_date).days) + 1):
         yield min_date + timedelta(n)
@@ -54,11 +189,15 @@ def parse_args():
     parser.add_argument('-m', '--method', required=True, choices=GEN_METHODS.keys(),
                         help='The method to use to generate data.')
     parser.add_argument('-sd', '--start_date', required=True,
-                        help=f'The start date of the data. Format: {DATE_FORMAT}')
+                        help=f'The start date of the data. Format: {DATE_FORMAT.replace("%", "%%")}')
     parser.add_argument('-ed', '--end_date', required=True,
-                        help=f'The end date of the data. Format: {DATE_FORMAT}')
+                        help=f'The end date of the data. Format: {DATE_FORMAT.replace("%", "%%")}')
     parser.add_argument('-o', '--output_file', default='generated_data.txt',
-                        help='The file to output the data to.')
+                        help='The file to output the data to. Files ending in .npz are written in the binary format.')
+    parser.add_argument('-c', '--clinics', default=1, type=int,
+                        help='The number of clinics to generate data for.')
+    parser.add_argument('--seed', default=None, type=int,
+                        help='The seed of the random generator, for reproducible data.')
     parser.add_argument('-v', '--visualization', type=str, default=None,
                         help='If set, will write a visualization image to the specified path.')
 
@@ -70,11 +209,14 @@ def main():
     start_date = datetime.strptime(args.start_date, DATE_FORMAT)
     end_date = datetime.strptime(args.end_date, DATE_FORMAT)
 
-    dataset = GEN_METHODS[args.method](start_date, end_date)
+    counts = arrival_counts(start_date, end_date, args.method, args.clinics, args.seed)
 
-    dataset.write_to_file(args.output_file)
+    # Arrivals are streamed to the output, only the counts are held in memory
+    if args.output_file.endswith('.npz'):
+        write_npz(start_date, counts, args.output_file)
+    else:
+        write_csv(start_date, counts, args.output_file)
 
     if args.visualization:
-        visualizations.visualize_dataset_arrivals(dataset, args.visualization)
-
-
+        visualizations.visualize_daily_counts(np.datetime64(start_date, 'D'), counts.sum(axis=(1, 2)),
+                                              args.visualization)
@@ -0,0 +1,59 @@
+from triage_ml.data.dataset import MLDataSet
+
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import tensorflow as tf
+
+PIPELINES = ['numpy', 'tfdata']
+
+
+def _sequence_series(windows: np.ndarray, seq_size: int) -> np.ndarray:
+    """
+    Recover the series a sequence input was windowed from.
+    :param windows: The sequence input, one window of seq_size values per sample.
+    :param seq_size: The length of each window.
+    :return: The series, seq_size - 1 values longer than the number of windows.
+    """
+    if not len(windows):
+        return np.zeros((0, 1), dtype=np.float32)
+    return np.concatenate([windows[0], windows[1:, -1]]).astype(np.float32)
+
+
+def make_dataset(ml_dataset: MLDataSet, batch_size=32, shuffle=False, num_parallel_calls=None) -> 'tf.data.Dataset':
+    """
+    Build a streaming tf.data.Dataset from a MLDataSet.
+
+    Sequence inputs are re-windowed from their series inside the pipeline, so only a single copy
+    of each series is held in memory. Samples are cached after the first epoch and batches are
+    prefetched so input preparation overlaps with training.
+    :param ml_dataset: The MLDataSet to stream, its first input must be its only sequence input.
+    :param batch_size: The number of samples in each batch.
+    :param shuffle: Whether samples should be shuffled every epoch.
+    :param num_parallel_calls: The number of samples to prepare in parallel, tuned automatically if None.
+    :return: A dataset of (inputs, outputs) batches.
+    """
+    import tensorflow as tf
+
+    if num_parallel_calls is None:
+        num_parallel_calls = tf.data.experimental.AUTOTUNE
+
+    seq_size = ml_dataset.seq_size
+    series = _sequence_series(ml_dataset.inputs[0], seq_size)
+
+    sequences = tf.data.Dataset.from_tensor_slices(series) \
+        .window(seq_size, shift=1, drop_remainder=True) \
+        .flat_map(lambda window: window.batch(seq_size))
+    others = tf.data.Dataset.from_tensor_slices(tuple(x.astype(np.float32) for x in ml_dataset.inputs[1:]))
+    outputs = tf.data.Dataset.from_tensor_slices(tuple(y.astype(np.float32) for y in ml_dataset.outputs))
+
+    dataset = tf.data.Dataset.zip((sequences, others, outputs)) \
+        .map(lambda sequence, other, output: ((sequence,) + other, output if len(output) > 1 else output[0]),
+             num_parallel_calls=num_parallel_calls) \
+        .cache()
+
+    if shuffle:
+        dataset = dataset.shuffle(max(len(ml_dataset), 1), reshuffle_each_iteration=True)
+
+    return dataset.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE)
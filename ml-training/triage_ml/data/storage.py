@@ -0,0 +1,240 @@
+from triage_ml.data.dataset import DataSet, _ATTRS, _DTYPES
+
+from typing import Callable, Dict, Iterable, Iterator, Text
+import argparse
+import struct
+import zipfile
+import numpy as np
+
+_ZIP_MAGIC = b'PK\x03\x04'
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+_CSV_DTYPE = np.dtype([(attribute, dtype) for attribute, dtype in _DTYPES.items()])
+_CSV_BLOCK_SIZE = 16 * 2**20
+_CSV_SEPARATORS = str.maketrans(',-', '  ')
+
+
+def is_binary(file_name: Text) -> bool:
+    """
+    :param file_name: The file to check.
+    :return: Whether the file is a binary (.npz) DataSet rather than CSV.
+    """
+    with open(file_name, 'rb') as file:
+        return file.read(len(_ZIP_MAGIC)) == _ZIP_MAGIC
+
+
+def iter_csv(file_name: Text, block_size=_CSV_BLOCK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Read a CSV file of clinic_id,severity,YYYY-MM-DD lines in chunks.
+
+    Each chunk is parsed in bulk by NumPy's C number parser, no Python objects are created per line.
+    :param file_name: The file to read.
+    :param block_size: The approximate number of bytes to parse at a time.
+    :return: An iterator of structured arrays with one field per DataPoint attribute.
+    """
+    with open(file_name) as file:
+        remainder = ''
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+
+            # Only parse complete lines, the rest is carried over to the next block
+            block = remainder + block
+            end = block.rfind('\n') + 1
+            block, remainder = block[:end], block[end:]
+            if block:
+                yield _parse_csv(block)
+
+        if remainder:
+            yield _parse_csv(remainder)
+
+
+def _parse_csv(text: Text) -> np.ndarray:
+    """
+    Parse clinic_id,severity,YYYY-MM-DD lines into a structured array.
+
+    The separators are replaced with spaces so that each line is read as five integers by np.fromstring,
+    which unlike np.loadtxt before NumPy 1.23 does not run Python code per line.
+    """
+    lines = text.count(',') // 2
+    fields = np.fromstring(text.translate(_CSV_SEPARATORS), dtype=np.int64, sep=' ') if lines else \
+        np.zeros(0, dtype=np.int64)
+    if text.count(',') != 2 * lines or text.count('-') != 2 * lines or len(fields) != 5 * lines or \
+            not lines and text.strip():
+        raise ValueError('Expected clinic_id,severity,YYYY-MM-DD lines.')
+
+    clinic_id, severity, year, month, day = fields.reshape(lines, 5).T
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + (day - 1)
+    if np.any((month < 1) | (month > 12) | (day < 1) | (dates.astype('datetime64[M]') != months)):
+        raise ValueError('Invalid date.')
+
+    rows = np.empty(lines, dtype=_CSV_DTYPE)
+    rows['clinic_id'] = clinic_id
+    rows['severity'] = severity
+    rows['date_received'] = dates
+    return rows
+
+
+def read_csv(file_name: Text, clinic_id: int = None, severity: int = None, block_size=_CSV_BLOCK_SIZE) -> DataSet:
+    """
+    Read a DataSet from a CSV file of clinic_id,severity,YYYY-MM-DD lines.
+
+    Filters are applied to each chunk as it is read so that filtered out lines are never held in memory.
+    :param file_name: The file to read.
+    :param clinic_id: If set, only the data of this clinic is read.
+    :param severity: If set, only the data of this severity is read.
+    :param block_size: The approximate number of bytes to parse at a time.
+    :return: The DataSet
+    """
+    chunks = []
+    for chunk in iter_csv(file_name, block_size):
+        if clinic_id is not None:
+            chunk = chunk[chunk['clinic_id'] == clinic_id]
+        if severity is not None:
+            chunk = chunk[chunk['severity'] == severity]
+        chunks.append(chunk)
+
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=_CSV_DTYPE)
+    return DataSet.from_columns(*(np.ascontiguousarray(rows[attribute]) for attribute in _ATTRS))
+
+
+def write_npz(dataset: DataSet, file_name: Text):
+    """
+    Write a DataSet to an uncompressed .npz file with one array per column.
+    :param dataset: The DataSet to write.
+    :param file_name: The file to write to.
+    """
+    for attribute, column in dataset.columns.items():
+        if column.dtype == object:
+            raise ValueError(f'Column {attribute} does not fit the binary format.')
+
+    # Write through a file object so NumPy does not append a second .npz extension
+    with open(file_name, 'wb') as file:
+        np.savez(file, **dataset.columns)
+
+
+def write_npz_columns(file_name: Text, length: int, column_chunks: Callable[[Text], Iterable[np.ndarray]]):
+    """
+    Stream a DataSet to an uncompressed .npz file without holding it in memory.
+
+    Columns are written one after the other, so the chunks of each column are requested separately.
+    :param file_name: The file to write to.
+    :param length: The number of data points.
+    :param column_chunks: A function returning the chunks of a DataPoint attribute's column, which
+                          must add up to length values.
+    """
+    with zipfile.ZipFile(file_name, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for attribute in _ATTRS:
+            dtype = _DTYPES[attribute]
+            with archive.open(f'{attribute}.npy', 'w', force_zip64=True) as member:
+                np.lib.format.write_array_header_1_0(member, {
+                    'descr': np.lib.format.dtype_to_descr(dtype),
+                    'fortran_order': False,
+                    'shape': (length,),
+                })
+
+                written = 0
+                for chunk in column_chunks(attribute):
+                    member.write(np.ascontiguousarray(chunk, dtype=dtype).tobytes())
+                    written += len(chunk)
+
+            if written != length:
+                raise ValueError(f'Column {attribute} has {written} values, expected {length}.')
+
+
+def read_npz(file_name: Text, mmap=True) -> DataSet:
+    """
+    Read a DataSet from a .npz file.
+    :param file_name: The file to read.
+    :param mmap: Whether columns should be memory-mapped instead of read into memory.
+    :return: The DataSet
+    """
+    if mmap:
+        columns = _mmap_npz(file_name)
+    else:
+        with np.load(file_name) as npz:
+            columns = {name: npz[name] for name in npz.files}
+
+    return DataSet.from_columns(*(columns[attribute] for attribute in _ATTRS))
+
+
+def _mmap_npz(file_name: Text) -> Dict[Text, np.ndarray]:
+    """
+    Memory-map every array stored in an .npz file.
+
+    Arrays stored in a compressed .npz cannot be mapped and are read into memory instead.
+    :param file_name: The .npz file.
+    :return: A dictionary of array names to their arrays.
+    """
+    arrays = {}
+    with zipfile.ZipFile(file_name) as archive, open(file_name, 'rb') as file:
+        for member in archive.infolist():
+            name = member.filename[:-len('.npy')]
+            if member.compress_type != zipfile.ZIP_STORED:
+                with archive.open(member) as array_file:
+                    arrays[name] = np.lib.format.read_array(array_file)
+                continue
+
+            # The array starts after the member's local header, whose extra field may differ from the central one
+            file.seek(member.header_offset)
+            local_header = file.read(_ZIP_LOCAL_HEADER_SIZE)
+            name_size, extra_size = struct.unpack('<HH', local_header[26:30])
+            file.seek(member.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_size + extra_size)
+
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+
+            if np.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(file_name, dtype=dtype, mode='r', offset=file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+
+    return arrays
+
+
+def load_dataset(file_name: Text, clinic_id: int = None, severity: int = None) -> DataSet:
+    """
+    Read a DataSet from a CSV or binary file, detecting the format from the file's contents.
+    :param file_name: The file to read.
+    :param clinic_id: If set, only the data of this clinic is kept.
+    :param severity: If set, only the data of this severity is kept.
+    :return: The DataSet
+    """
+    if not is_binary(file_name):
+        return read_csv(file_name, clinic_id, severity)
+
+    dataset = read_npz(file_name)
+    if clinic_id is not None:
+        dataset.filter_mask('clinic_id', lambda c_id: c_id == clinic_id)
+    if severity is not None:
+        dataset.filter_mask('severity', lambda s: s == severity)
+    return dataset
+
+
+def parse_args():
+    """
+    Parser configuration
+    :return: parsed augments object
+    """
+    parser = argparse.ArgumentParser(description='Convert a DataSet between the CSV and binary (.npz) formats.')
+
+    parser.add_argument('input_file',
+                        help='The DataSet to convert, in either format.')
+    parser.add_argument('output_file',
+                        help='The file to write to. Files ending in .npz are written in the binary format.')
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    Entrypoint for triage-convert.
+    """
+    args = parse_args()
+    load_dataset(args.input_file).write_to_file(args.output_file)
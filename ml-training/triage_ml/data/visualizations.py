@@ -2,35 +2,28 @@ from triage_ml.data.dataset import DataSet, MLDataSet
 from triage_ml.models.prediction_model import PredictionModel
 
 import numpy as np
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
 
 
-def _date_range(min_date: datetime, max_date: datetime):
-    for n in range(int((max_date - min_date).days) + 1):
-        yield min_date + timedelta(n)
+def visualize_dataset_arrivals(dataset: DataSet, output_file: str):
+    # Days without arrivals are plotted as zero
+    visualize_daily_counts(*dataset.daily_counts(), output_file)
 
 
-def visualize_dataset_arrivals(dataset: DataSet, output_file: str):
-    dataset.order_by('date_received')
-    first = dataset[0].date_received
-    last = dataset[-1].date_received
-    agg = dataset.aggregate_on('date_received', lambda dr: str(dr.date()))
-    x = list(_date_range(first, last))
-    x2 = []
-    y = []
-    i = 0
-    for x_val in x:
-        i += 1
-        x2.append(i)
-        y.append(len(agg[str(x_val.date())]) if str(x_val.date()) in agg else 0)
-
-    plt.plot_date(x, y, markersize=2)
+def visualize_daily_counts(first: np.datetime64, counts: np.ndarray, output_file: str):
+    import matplotlib.pyplot as plt
+
+    days = first + np.arange(len(counts)) if first is not None else np.zeros(0, dtype='datetime64[D]')
+
+    plt.figure()
+    plt.plot(days, counts, 'o', markersize=2)
     plt.gcf().autofmt_xdate()
     plt.savefig(output_file)
+    plt.close()
 
 
 def visualize_training_results(model: PredictionModel, train_data: MLDataSet, test_data: MLDataSet, output_file: str):
+    import matplotlib.pyplot as plt
+
     train_size = len(train_data.inputs[0])
     test_size = len(test_data.inputs[0])
 
@@ -46,15 +39,17 @@ def visualize_training_results(model: PredictionModel, train_data: MLDataSet, te
     # data = [x[np.newaxis, -1] for x in train_data.inputs]
     # print(data)
     # print(model.get_model()(data))
-    preds = model.predict([x[np.newaxis, -1] for x in train_data.inputs], test_data.inputs[1])
+    preds = model.predict([np.array(x[np.newaxis, -1]) for x in train_data.inputs], test_data.inputs[1])
     for i in range(test_size):
         gt.append(test_data.outputs[0][i][0])
         pred.append(preds[i][0][0])
         print(test_data.outputs[0][i], preds[i][0])
 
+    plt.figure()
     plt.plot(train, label='Train data')
     plt.plot(gt, label='Test data')
     plt.plot(pred, label='Predicted')
     plt.legend()
     plt.savefig(output_file)
+    plt.close()
 
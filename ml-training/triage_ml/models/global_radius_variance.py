@@ -0,0 +1,181 @@
+from triage_ml.models.prediction_model import PredictionModel
+from triage_ml.models.radius_variance import RadiusVariance
+from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval
+from triage_ml.data.frame_cache import FrameCache
+
+from functools import partial
+from typing import Dict, List, Tuple
+from tensorflow.keras import Model
+from tensorflow.keras.layers import Input, LSTM, Dropout, Concatenate, Dense, Embedding, Flatten
+import tensorflow as tf
+import numpy as np
+
+
+class GlobalRadiusVariance(PredictionModel):
+    """
+    Predicts arrivals and the variance of arrivals of every clinic and severity with one shared network.
+
+    Samples are built like RadiusVariance samples from each (clinic_id, severity) series, and carry the
+    series' clinic and severity indices as two extra inputs. These are looked up in learned embeddings,
+    so the network learns what the series have in common and how each differs.
+
+    Inputs are [sequences (n, seq_size, 1), date encodings (n, 43), clinic indices (n, 1), severity indices (n, 1)].
+
+    Attributes:
+        clinic_ids: The clinics the model predicts, in embedding order.
+        severities: The severities the model predicts, in embedding order.
+    """
+
+    def __init__(self, clinic_ids: List[int], severities: List[int], seq_size=30, radius=15,
+                 time_interval=TimeInterval.DAY, clinic_embedding=8, severity_embedding=2, lstm_units=16,
+                 dense_units=64, dropout=0.2):
+        """
+        Construct a new GlobalRadiusVariance.
+        :param clinic_ids: The clinics to predict.
+        :param severities: The severities to predict.
+        :param seq_size: How many previous intervals the model requires to predict.
+        :param radius: The radius in time_interval units used to compute arrival variance.
+        :param time_interval: The size of each unit time interval.
+        :param clinic_embedding: The size of each clinic's embedding.
+        :param severity_embedding: The size of each severity's embedding.
+        :param lstm_units: The number of units of the LSTM layer reading the sequence input.
+        :param dense_units: The number of units of the hidden dense layer.
+        :param dropout: The dropout rate after the LSTM and hidden dense layers.
+        """
+        self.clinic_ids = list(clinic_ids)
+        self.severities = list(severities)
+        self.seq_size = seq_size
+        self.radius = radius
+        self.time_interval = time_interval
+        self.clinic_embedding = clinic_embedding
+        self.severity_embedding = severity_embedding
+        self.lstm_units = lstm_units
+        self.dense_units = dense_units
+        self.dropout = dropout
+        self.model = None
+        self._forecast = None
+
+        # Builds the frame of each series
+        self._series_model = RadiusVariance(seq_size=seq_size, radius=radius, time_interval=time_interval)
+
+    def _init_model(self):
+        seq_input = Input(shape=(self.seq_size, 1), name='seq_input')
+        date_input = Input(shape=(12 + 31,), name='date_input')  # One-hot encoding of month and day of month
+        clinic_input = Input(shape=(1,), dtype='int32', name='clinic_input')
+        severity_input = Input(shape=(1,), dtype='int32', name='severity_input')
+
+        clinic = Flatten()(Embedding(len(self.clinic_ids), self.clinic_embedding)(clinic_input))
+        severity = Flatten()(Embedding(len(self.severities), self.severity_embedding)(severity_input))
+
+        x = LSTM(units=self.lstm_units, activation='tanh')(seq_input)
+        x = Dropout(self.dropout)(x)
+
+        x = Concatenate(axis=1)([x, date_input, clinic, severity])
+
+        x = Dense(units=self.dense_units, activation='tanh')(x)
+        x = Dropout(self.dropout)(x)
+
+        output = Dense(units=2, activation='relu')(x)
+
+        self.model = Model(name='global_radius_variance', inputs=[seq_input, date_input, clinic_input, severity_input],
+                           outputs=output)
+
+    def series_index(self, clinic_id: int, severity: int) -> Tuple[int, int]:
+        """
+        :return: The embedding indices of a clinic and severity.
+        """
+        return self.clinic_ids.index(clinic_id), self.severities.index(severity)
+
+    def create_ml_dataset(self, dataset: DataSet, strided=False) -> MLDataSet:
+        """
+        Build a MLDataSet stacking the samples of every clinic and severity of a DataSet.
+        :param dataset: The DataSet to construct the MLDataSet from.
+        :param strided: Unused, stacked sequence inputs are always copies.
+        :return: The MLDataSet
+        """
+        return MLDataSet.concatenate(list(self.create_series_ml_datasets(dataset).values()))
+
+    def create_series_ml_datasets(self, dataset: DataSet, strided=False,
+                                  cache: FrameCache = None) -> Dict[Tuple[int, int], MLDataSet]:
+        """
+        Build the MLDataSet of each clinic and severity of a DataSet.
+        :param dataset: The DataSet to construct the MLDataSets from.
+        :param strided: Whether the sequence inputs should be read-only views over the arrival counts.
+        :param cache: An optional FrameCache to load the frame of each series from.
+        :return: A dictionary of (clinic_id, severity) pairs to their MLDataSet.
+        """
+        build_frame = partial(cache.frame, self._series_model) if cache else self._series_model.create_frame
+        return {pair: self.series_ml_dataset(*pair, build_frame(*series.daily_counts()), strided=strided)
+                for pair, series in dataset.partition_on(['clinic_id', 'severity']).items()}
+
+    def series_ml_dataset(self, clinic_id: int, severity: int, frame: List[np.ndarray], strided=False) -> MLDataSet:
+        """
+        :param clinic_id: The clinic of the series.
+        :param severity: The severity of the series.
+        :param frame: The frame of the series, as RadiusVariance.create_frame builds.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
+        :return: The MLDataSet of the series.
+        """
+        clinic_index, severity_index = self.series_index(clinic_id, severity)
+        rows = len(frame[0])
+        ids = [np.full((rows, 1), clinic_index, dtype=np.int32), np.full((rows, 1), severity_index, dtype=np.int32)]
+        return MLDataSet(frame[0:1], frame[1:2] + ids, frame[2:], self.seq_size, strided=strided)
+
+    def series_samples(self, ml_dataset: MLDataSet, clinic_id: int, severity: int) -> MLDataSet:
+        """
+        Select the samples of one clinic and severity from a stacked MLDataSet.
+        :param ml_dataset: The stacked MLDataSet.
+        :param clinic_id: The clinic of the series.
+        :param severity: The severity of the series.
+        :return: The MLDataSet of the series' samples, in order.
+        """
+        clinic_index, severity_index = self.series_index(clinic_id, severity)
+        return ml_dataset[(ml_dataset.inputs[2][:, 0] == clinic_index) & (ml_dataset.inputs[3][:, 0] == severity_index)]
+
+    def predict(self, seed_data: List[np.ndarray], date_encodings: np.ndarray) -> np.ndarray:
+        """
+        Forecast one or more intervals ahead of a batch of seed sequences, of any mix of series.
+        :param seed_data: The inputs to seed the model with, as in a MLDataSet. The date encodings are ignored.
+        :param date_encodings: The encodings of the dates to predict on, either (horizon, 43) for every
+                               seed or (horizon, batch, 43).
+        :return: The predictions, of shape (horizon, batch, 2).
+        """
+        sequences = np.asarray(seed_data[0], dtype=np.float32)
+        dates = np.asarray(date_encodings, dtype=np.float32)
+        if dates.ndim == 2:
+            dates = np.broadcast_to(dates[:, np.newaxis], (len(dates), len(sequences), dates.shape[-1]))
+
+        if self._forecast is None:
+            self._forecast = tf.function(self._forecast_steps, input_signature=[
+                tf.TensorSpec([None, self.seq_size, 1], tf.float32),
+                tf.TensorSpec([None, None, 12 + 31], tf.float32),
+                tf.TensorSpec([None, 1], tf.int32),
+                tf.TensorSpec([None, 1], tf.int32),
+            ])
+
+        return self._forecast(tf.constant(sequences), tf.constant(dates),
+                              tf.constant(np.asarray(seed_data[2], dtype=np.int32)),
+                              tf.constant(np.asarray(seed_data[3], dtype=np.int32))).numpy()
+
+    def _forecast_steps(self, sequences: tf.Tensor, dates: tf.Tensor, clinics: tf.Tensor,
+                        severities: tf.Tensor) -> tf.Tensor:
+        model = self.get_model()
+        horizon = tf.shape(dates)[0]
+
+        def step(i, windows, predictions):
+            pred = model([windows, dates[i], clinics, severities], training=False)
+            # Slide each window forward by one interval, the prediction becoming its newest count
+            windows = tf.concat([windows[:, 1:], pred[:, tf.newaxis, :1]], axis=1)
+            return i + 1, windows, predictions.write(i, pred)
+
+        predictions = tf.TensorArray(tf.float32, size=horizon, element_shape=tf.TensorShape([None, 2]))
+        _, _, predictions = tf.while_loop(lambda i, *_: i < horizon, step, (0, sequences, predictions))
+        return predictions.stack()
+
+    def get_model(self):
+        """
+        :return: The Keras model.
+        """
+        if self.model is None:
+            self._init_model()
+        return self.model
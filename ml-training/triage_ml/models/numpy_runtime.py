@@ -0,0 +1,136 @@
+"""
+A NumPy runtime for trained RadiusVariance models.
+
+Serving forecasts through the runtime only needs NumPy and the exported weight bundle, neither
+TensorFlow nor Keras are imported.
+"""
+from typing import Dict, List, Text
+import numpy as np
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 0.5 * (1 + np.tanh(0.5 * x)),  # Equal to 1 / (1 + exp(-x)) without overflowing
+    'tanh': np.tanh,
+}
+
+
+def export_weights(rv_model, file_name: Text):
+    """
+    Export the weights of a RadiusVariance model to a NumPy weight bundle (.npz).
+    :param rv_model: The RadiusVariance model.
+    :param file_name: The file to write the bundle to.
+    """
+    bundle = {
+        'seq_size': np.array(rv_model.seq_size),
+        'radius': np.array(rv_model.radius),
+        'time_interval': np.array(rv_model.time_interval.name),
+    }
+
+    dense_layers = 0
+    for layer in rv_model.get_model().layers:
+        config = layer.get_config()
+        kind = type(layer).__name__
+        if kind == 'LSTM':
+            bundle['lstm_kernel'], bundle['lstm_recurrent_kernel'], bundle['lstm_bias'] = layer.get_weights()
+            bundle['lstm_activation'] = np.array(config['activation'])
+            bundle['lstm_recurrent_activation'] = np.array(config['recurrent_activation'])
+        elif kind == 'Dense':
+            prefix = f'dense_{dense_layers}'
+            bundle[f'{prefix}_kernel'], bundle[f'{prefix}_bias'] = layer.get_weights()
+            bundle[f'{prefix}_activation'] = np.array(config['activation'])
+            dense_layers += 1
+        elif layer.get_weights():
+            raise ValueError(f'Layer {layer.name} ({kind}) cannot be exported.')
+
+    # Write through a file object so NumPy does not append a second .npz extension
+    with open(file_name, 'wb') as file:
+        np.savez(file, **bundle)
+
+
+class NumpyRadiusVariance:
+    """
+    Runs the inference of an exported RadiusVariance model with NumPy.
+
+    Attributes:
+        seq_size: How many previous intervals the model requires to predict.
+        radius: The radius in time_interval units the model's variance was trained on.
+        time_interval: The name of the model's TimeInterval.
+    """
+
+    def __init__(self, weights: Dict[Text, np.ndarray]):
+        """
+        Create a new NumpyRadiusVariance.
+        :param weights: The arrays of a weight bundle written by export_weights.
+        """
+        self.seq_size = int(weights['seq_size'])
+        self.radius = int(weights['radius'])
+        self.time_interval = str(weights['time_interval'])
+
+        self._lstm = [weights[f'lstm_{name}'].astype(np.float32) for name in ['kernel', 'recurrent_kernel', 'bias']]
+        self._lstm_activation = _ACTIVATIONS[str(weights['lstm_activation'])]
+        self._lstm_recurrent_activation = _ACTIVATIONS[str(weights['lstm_recurrent_activation'])]
+
+        self._dense = []
+        while f'dense_{len(self._dense)}_kernel' in weights:
+            prefix = f'dense_{len(self._dense)}'
+            self._dense.append((weights[f'{prefix}_kernel'].astype(np.float32),
+                                weights[f'{prefix}_bias'].astype(np.float32),
+                                _ACTIVATIONS[str(weights[f'{prefix}_activation'])]))
+
+    @classmethod
+    def load(cls, file_name: Text) -> 'NumpyRadiusVariance':
+        """
+        :param file_name: A weight bundle written by export_weights.
+        :return: The NumpyRadiusVariance
+        """
+        with np.load(file_name) as weights:
+            return cls(dict(weights))
+
+    def __call__(self, inputs: List[np.ndarray]) -> np.ndarray:
+        """
+        Run the model on a batch of inputs, as the Keras model does when not training.
+        :param inputs: The sequence input of shape (batch, seq_size, 1) and date input of shape (batch, 43).
+        :return: The outputs, of shape (batch, 2).
+        """
+        sequences, dates = (np.asarray(x, dtype=np.float32) for x in inputs)
+        kernel, recurrent_kernel, bias = self._lstm
+        units = recurrent_kernel.shape[0]
+
+        # The input contribution of every step is computed at once, gates are ordered input, forget, cell, output
+        gates = sequences @ kernel + bias
+        h = np.zeros((len(sequences), units), dtype=np.float32)
+        c = np.zeros((len(sequences), units), dtype=np.float32)
+        for t in range(sequences.shape[1]):
+            z = gates[:, t] + h @ recurrent_kernel
+            gate = self._lstm_recurrent_activation(z)
+            c = gate[:, units:2 * units] * c + gate[:, :units] * self._lstm_activation(z[:, 2 * units:3 * units])
+            h = gate[:, 3 * units:] * self._lstm_activation(c)
+
+        x = np.concatenate([h, dates], axis=1)
+        for dense_kernel, dense_bias, activation in self._dense:
+            x = activation(x @ dense_kernel + dense_bias)
+        return x
+
+    def predict(self, seed_data: List[np.ndarray], date_encodings: np.ndarray) -> np.ndarray:
+        """
+        Forecast one or more intervals ahead of a batch of seed sequences, as RadiusVariance.predict does.
+        :param seed_data: The data to seed the model with, the sequence input of shape (batch, seq_size, 1)
+                          followed by any other inputs, which are ignored.
+        :param date_encodings: The encodings of the dates to predict on, either (horizon, 43) for every
+                               seed or (horizon, batch, 43).
+        :return: The predictions, of shape (horizon, batch, 2).
+        """
+        windows = np.array(seed_data[0], dtype=np.float32)
+        dates = np.asarray(date_encodings, dtype=np.float32)
+        if dates.ndim == 2:
+            dates = np.broadcast_to(dates[:, np.newaxis], (len(dates), len(windows), dates.shape[-1]))
+
+        predictions = np.zeros((len(dates), len(windows), len(self._dense[-1][1])), dtype=np.float32)
+        for i, date in enumerate(dates):
+            predictions[i] = self([windows, date])
+            # Slide each window forward by one interval, the prediction becoming its newest count
+            windows[:, :-1] = windows[:, 1:]
+            windows[:, -1, 0] = predictions[i, :, 0]
+
+        return predictions
@@ -1,5 +1,9 @@
 from triage_ml.data.dataset import DataSet, MLDataSet
-from tensorflow.keras.models import Model
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tensorflow.keras.models import Model
 
 
 class PredictionModel:
@@ -7,7 +11,7 @@ class PredictionModel:
     def create_ml_dataset(self, dataset: DataSet) -> MLDataSet:
         raise NotImplementedError()
 
-    def get_model(self) -> Model:
+    def get_model(self) -> 'Model':
         raise NotImplementedError()
 
     def predict(self, seed_data, length):
@@ -1,11 +1,12 @@
 from triage_ml.models.prediction_model import PredictionModel
-from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval
+from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval, interval_index
 
 from typing import List
 from tensorflow.keras import Model
 from tensorflow.keras.layers import Input, LSTM, Dropout, Concatenate, Dense
-from datetime import datetime, timedelta
+import tensorflow as tf
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 
 class RadiusVariance(PredictionModel):
@@ -20,29 +21,37 @@ class RadiusVariance(PredictionModel):
      radius of the prediction day.
     """
 
-    def __init__(self, seq_size=30, radius=15, time_interval=TimeInterval.DAY):
+    def __init__(self, seq_size=30, radius=15, time_interval=TimeInterval.DAY, lstm_units=8, dense_units=64,
+                 dropout=0.2):
         """
         Construct a new RadiusVariance.
         :param seq_size: How many previous days does the model require to predict.
         :param radius: The radius in time_interval units used to compute arrival variance.
         :param time_interval: The size of each unit time interval.
+        :param lstm_units: The number of units of the LSTM layer reading the sequence input.
+        :param dense_units: The number of units of the hidden dense layer.
+        :param dropout: The dropout rate after the LSTM and hidden dense layers.
         """
         self.seq_size = seq_size
         self.radius = radius
         self.time_interval = time_interval
+        self.lstm_units = lstm_units
+        self.dense_units = dense_units
+        self.dropout = dropout
         self.model = None
+        self._forecast = None
 
     def _init_model(self):
         seq_input = Input(shape=(self.seq_size, 1), name='seq_input')
-        date_input = Input(shape=(12 + 31), name='date_input')  # One-hot encoding of month and day of month
+        date_input = Input(shape=(12 + 31,), name='date_input')  # One-hot encoding of month and day of month
 
-        x = LSTM(units=8, activation='tanh')(seq_input)
-        x = Dropout(0.2)(x)
+        x = LSTM(units=self.lstm_units, activation='tanh')(seq_input)
+        x = Dropout(self.dropout)(x)
 
         x = Concatenate(axis=1)([x, date_input])
 
-        x = Dense(units=64, activation='tanh')(x)
-        x = Dropout(0.2)(x)
+        x = Dense(units=self.dense_units, activation='tanh')(x)
+        x = Dropout(self.dropout)(x)
         """
         x = Dense(units=512, activation='tanh')(x)
         x = Dropout(0.2)(x)
@@ -54,91 +63,162 @@ class RadiusVariance(PredictionModel):
 
         self.model = Model(name='radius_variance', inputs=[seq_input, date_input], outputs=output)
 
-    def create_ml_dataset(self, dataset: DataSet) -> MLDataSet:
+    def create_ml_dataset(self, dataset: DataSet, strided=False) -> MLDataSet:
         """
         Build a MLDataSet compatible with RadiusVariance using the provided DataSet.
         :param dataset: The DataSet to construct the MLDataSet from.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
         :return: The MLDataSet
         """
-        if len(dataset):
-            dataset.order_by('date_received')
-            first = dataset[0]
-            last = dataset[-1]
-            min_date = first.date_received + self._timedelta(self.radius)
-            max_date = last.date_received - self._timedelta(self.radius)
+        return self.create_ml_dataset_from_counts(*dataset.daily_counts(), strided=strided)
 
-            if self.time_interval == TimeInterval.WEEK:
-                date_aggregation = dataset.aggregate_on('date_received', lambda dr: self._datestr(dr))
-            else:
-                date_aggregation = dataset.aggregate_on('date_received', lambda dr: self._datestr(dr))
+    def create_ml_dataset_from_counts(self, start: np.datetime64, daily_counts: np.ndarray, strided=False) -> MLDataSet:
+        """
+        Build a MLDataSet compatible with RadiusVariance from per day arrival counts.
+        :param start: The day of the first count.
+        :param daily_counts: The number of arrivals on each day from the start day.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
+        :return: The MLDataSet
+        """
+        return self.ml_dataset_from_frame(self.create_frame(start, daily_counts), strided=strided)
 
-            date_range = list(self._date_range(min_date, max_date))
+    def create_frame(self, start: np.datetime64, daily_counts: np.ndarray,
+                     previous: List[np.ndarray] = None) -> List[np.ndarray]:
+        """
+        Build the rows of a MLDataSet, before sequences are windowed, from per day arrival counts.
+
+        A frame holds one row per interval: [arrivals (n, 1), date encodings (n, 43), outputs (n, 2)].
+        Given the frame built from an earlier prefix of the same counts, only the rows that new counts
+        can affect are computed and the rest are reused.
+        :param start: The day of the first count.
+        :param daily_counts: The number of arrivals on each day from the start day.
+        :param previous: A frame built from earlier counts with the same first arrival day.
+        :return: The frame.
+        """
+        received = np.flatnonzero(daily_counts)
+        if len(received):
+            first = np.datetime64(start, 'D') + received[0]
+            daily_counts = daily_counts[received[0]:received[-1] + 1]
+            size = self._interval_count(received[-1] - received[0] - 2 * self._interval_days(self.radius))
         else:
-            date_range = []
+            first, size = None, 0
 
-        x = [np.zeros((len(date_range), 1)), np.zeros((len(date_range), 12 + 31))]
-        y = [np.zeros((len(date_range), 2))]
+        # The last previous row's window ends in the interval of the last previous arrival, which may have grown
+        row_start = min(max(len(previous[0]) - 1, 0), size) if previous is not None else 0
+        rows = size - row_start
 
-        for i, date in enumerate(date_range):
-            date_str = self._datestr(date)
-            val = len(date_aggregation[date_str]) if date_str in date_aggregation else 0
+        x = [np.zeros((rows, 1)), np.zeros((rows, 12 + 31))]
+        y = [np.zeros((rows, 2))]
 
-            radius_vals = []
-            for j in range(-self.radius, self.radius + 1):
-                j_date_str = self._datestr(date + self._timedelta(j))
-                radius_vals.append(len(date_aggregation[j_date_str]) if j_date_str in date_aggregation else 0)
-            variance = np.var(radius_vals)
+        if rows:
+            counts = self._interval_counts(first, daily_counts, row_start, size + 2 * self.radius).astype(np.float64)
+            windows = as_strided(counts, shape=(rows, 2 * self.radius + 1), strides=counts.strides * 2,
+                                 writeable=False)
+            variance = np.var(windows, axis=1)
 
-            one_hot_date = np.zeros(12 + 31)
-            one_hot_date[date.date().month] = 1
-            one_hot_date[11 + date.date().day] = 1
+            dates = first + self._interval_days(np.arange(row_start + self.radius, size + self.radius))
+            months = dates.astype('datetime64[M]')
+            row_idx = np.arange(rows)
+            x[1][row_idx, months.astype(np.int64) % 12 + 1] = 1
+            x[1][row_idx, 12 + (dates - months.astype('datetime64[D]')).astype(np.int64)] = 1
 
-            x[0][i] = val
-            x[1][i] = one_hot_date
-            y[0][i] = [val, variance]
+            x[0][:, 0] = counts[self.radius:self.radius + rows]
+            y[0][:, 0] = x[0][:, 0]
+            y[0][:, 1] = variance
 
-        return MLDataSet(x[0:1], x[1:], y, self.seq_size)
+        frame = x + y
+        if row_start:
+            frame = [np.concatenate([old[:row_start], new]) for old, new in zip(previous, frame)]
+        return frame
 
-    def predict(self, seed_data: List[np.ndarray], date_encodings) -> List[np.ndarray]:
+    def ml_dataset_from_frame(self, frame: List[np.ndarray], strided=False) -> MLDataSet:
         """
-        Predict one of more times.
-        :param seed_data: The data to seed the model with.
-        :param date_encodings: The encodings of the dates to predict on
-        :return: A list of predictions.
+        :param frame: A frame built by create_frame.
+        :param strided: Whether the sequence input should be a read-only view over the arrival counts.
+        :return: The MLDataSet of the frame.
         """
-        predictions = []
-        for date in date_encodings:
-            seed_data[1] = date[np.newaxis, :]
+        return MLDataSet(frame[0:1], frame[1:2], frame[2:], self.seq_size, strided=strided)
 
-            pred = self.model(seed_data)
-
-            predictions.append(pred)
-            seed_data[0][0] = seed_data[0][0][:1] + [[pred[0][0]]]
+    def _interval_counts(self, first: np.datetime64, daily_counts: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """
+        Count the arrivals in a range of time intervals, interval 0 being the interval of the first day.
+        :param first: The day of the first count.
+        :param daily_counts: The number of arrivals on each day from the first day.
+        :param start: The first interval to count.
+        :param stop: The interval to stop counting at.
+        :return: An int64 array of the arrivals in each interval.
+        """
+        # Interval dates step from the first day, and each interval is at most a week either side of its date
+        dates = first + self._interval_days(np.arange(start, stop))
+        low = max(self._interval_days(start) - 6, 0)
+        high = min(self._interval_days(stop - 1) + 7, len(daily_counts))
 
-        return predictions
+        counts = np.zeros(stop - start, dtype=np.int64)
+        if high <= low:
+            return counts
 
-    def _date_range(self, min_date: datetime, max_date: datetime):
-        if self.time_interval == TimeInterval.WEEK:
-            size = int((max_date - min_date).days / 7) + 1
-            delta = timedelta(weeks=1)
-        else:
-            size = int((max_date - min_date).days) + 1
-            delta = timedelta(days=1)
+        intervals = interval_index(first + np.arange(low, high), self.time_interval)
+        totals = np.bincount(intervals - intervals[0], weights=daily_counts[low:high]).astype(np.int64)
 
-        for n in range(size):
-            yield min_date + n*delta
+        offsets = interval_index(dates, self.time_interval) - intervals[0]
+        in_range = (offsets >= 0) & (offsets < len(totals))
+        counts[in_range] = totals[offsets[in_range]]
+        return counts
 
-    def _timedelta(self, amount):
+    def _interval_count(self, days: int) -> int:
+        """
+        :param days: The number of days between the first and last interval dates.
+        :return: The number of interval dates.
+        """
         if self.time_interval == TimeInterval.WEEK:
-            return timedelta(weeks=amount)
+            return max(int(days / 7) + 1, 0)
         else:
-            return timedelta(days=amount)
+            return max(days + 1, 0)
 
-    def _datestr(self, date):
+    def _interval_days(self, amount):
         if self.time_interval == TimeInterval.WEEK:
-            return datetime.strftime(date, '%Y-%U')
+            return amount * 7
         else:
-            return str(date.date())
+            return amount
+
+    def predict(self, seed_data: List[np.ndarray], date_encodings: np.ndarray) -> np.ndarray:
+        """
+        Forecast one or more intervals ahead of a batch of seed sequences.
+
+        Each prediction is fed back as the newest arrival count of its sequence window. The whole
+        forecast runs as a single compiled loop, however many seeds and intervals there are.
+        :param seed_data: The data to seed the model with, the sequence input of shape (batch, seq_size, 1)
+                          followed by any other inputs, which are ignored.
+        :param date_encodings: The encodings of the dates to predict on, either (horizon, 43) for every
+                               seed or (horizon, batch, 43).
+        :return: The predictions, of shape (horizon, batch, 2).
+        """
+        sequences = np.asarray(seed_data[0], dtype=np.float32)
+        dates = np.asarray(date_encodings, dtype=np.float32)
+        if dates.ndim == 2:
+            dates = np.broadcast_to(dates[:, np.newaxis], (len(dates), len(sequences), dates.shape[-1]))
+
+        if self._forecast is None:
+            self._forecast = tf.function(self._forecast_steps, input_signature=[
+                tf.TensorSpec([None, self.seq_size, 1], tf.float32),
+                tf.TensorSpec([None, None, 12 + 31], tf.float32),
+            ])
+
+        return self._forecast(tf.constant(sequences), tf.constant(dates)).numpy()
+
+    def _forecast_steps(self, sequences: tf.Tensor, dates: tf.Tensor) -> tf.Tensor:
+        model = self.get_model()
+        horizon = tf.shape(dates)[0]
+
+        def step(i, windows, predictions):
+            pred = model([windows, dates[i]], training=False)
+            # Slide each window forward by one interval, the prediction becoming its newest count
+            windows = tf.concat([windows[:, 1:], pred[:, tf.newaxis, :1]], axis=1)
+            return i + 1, windows, predictions.write(i, pred)
+
+        predictions = tf.TensorArray(tf.float32, size=horizon, element_shape=tf.TensorShape([None, 2]))
+        _, _, predictions = tf.while_loop(lambda i, *_: i < horizon, step, (0, sequences, predictions))
+        return predictions.stack()
 
     def get_model(self):
         """
@@ -0,0 +1,168 @@
+"""
+Per-stage timing and memory instrumentation for training runs.
+"""
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Text
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+_MB = 2**20
+
+
+def rss() -> Optional[int]:
+    """
+    :return: The current resident set size of the process in bytes, None if it is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss() -> int:
+    """
+    :return: The peak resident set size of the process so far in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """
+    Records the wall time and memory use of each stage of a run.
+
+    Attributes:
+        trace_memory: Whether the peak Python memory allocated in each stage is traced with tracemalloc,
+                      which slows allocation heavy stages down.
+        stages: The measurements of each completed stage, in order.
+        epochs: The measurements of each training epoch, recorded by the throughput callback.
+    """
+
+    def __init__(self, trace_memory=False, cprofile_file: Text = None):
+        """
+        Create a new Profiler.
+        :param trace_memory: Whether to trace the peak Python memory allocated in each stage.
+        :param cprofile_file: If set, the whole run is profiled with cProfile and its stats dumped to this file.
+        """
+        self.trace_memory = trace_memory
+        self.cprofile_file = cprofile_file
+        self.stages = []
+        self.epochs = []
+
+        self._start = time.perf_counter()
+        self._cprofile = None
+        if cprofile_file:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: Text):
+        """
+        Measure a stage of the run for the duration of a with block.
+        :param name: The name of the stage.
+        """
+        if self.trace_memory:
+            # Restarting clears the traces and their peak, so only the stage's own allocations are measured.
+            # Unlike tracemalloc.reset_peak, this also works before Python 3.9.
+            tracemalloc.stop()
+            tracemalloc.start()
+        rss_before = rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            rss_after = rss()
+            measurement = {
+                'name': name,
+                'seconds': seconds,
+                'rss_mb': _to_mb(rss_after),
+                'rss_delta_mb': _to_mb(rss_after - rss_before) if rss_before is not None else None,
+                'peak_rss_mb': _to_mb(peak_rss()),
+            }
+            if self.trace_memory:
+                measurement['traced_peak_mb'] = _to_mb(tracemalloc.get_traced_memory()[1])
+            self.stages.append(measurement)
+
+    def record_epoch(self, epoch: int, seconds: float, samples: int):
+        """
+        Record the throughput of a training epoch.
+        :param epoch: The index of the epoch.
+        :param seconds: How long the epoch took.
+        :param samples: The number of samples trained on in the epoch.
+        """
+        self.epochs.append({
+            'epoch': epoch,
+            'seconds': seconds,
+            'samples': samples,
+            'samples_per_second': samples / seconds if seconds else None,
+        })
+
+    def report(self) -> Dict:
+        """
+        :return: The measurements of the run so far.
+        """
+        return {
+            'total_seconds': time.perf_counter() - self._start,
+            'peak_rss_mb': _to_mb(peak_rss()),
+            'stages': self.stages,
+            'epochs': self.epochs,
+        }
+
+    def finish(self, report_file: Text = None) -> Dict:
+        """
+        Stop profiling, dumping the cProfile stats if enabled.
+        :param report_file: If set, the JSON report is written to this file.
+        :return: The report.
+        """
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+            self._cprofile = None
+        if self.trace_memory:
+            tracemalloc.stop()
+
+        report = self.report()
+        if report_file:
+            with open(report_file, 'w') as file:
+                json.dump(report, file, indent=2)
+        return report
+
+    def summary(self) -> List[Text]:
+        """
+        :return: A line describing each stage.
+        """
+        return [f'{stage["name"]:>12}: {stage["seconds"]:9.3f}s  rss {stage["rss_mb"]}MB  '
+                f'peak rss {stage["peak_rss_mb"]}MB' for stage in self.stages]
+
+
+def throughput_callback(profiler: Profiler, samples: int):
+    """
+    Create a Keras callback recording the samples per second of each training epoch.
+    :param profiler: The Profiler to record epochs to.
+    :param samples: The number of samples in each epoch.
+    :return: The callback.
+    """
+    from tensorflow.keras.callbacks import Callback
+
+    class ThroughputCallback(Callback):
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            profiler.record_epoch(epoch, time.perf_counter() - self.epoch_start, samples)
+
+    return ThroughputCallback()
+
+
+def _to_mb(size: Optional[int]) -> Optional[float]:
+    return None if size is None else round(size / _MB, 1)
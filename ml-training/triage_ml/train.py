@@ -1,11 +1,18 @@
-from triage_ml import train_radius_variance
+from triage_ml.data.count_store import CountStore
+from triage_ml.data.chunked_dataset import ChunkedDataSet
 from triage_ml.data.dataset import DataSet
+from triage_ml.data.pipeline import PIPELINES
 from triage_ml.triage_api import TriageAPI
+from triage_ml.profiling import Profiler
+from triage_ml.checkpoints import CheckpointManager
+from triage_ml.data.frame_cache import FrameCache
 from triage_ml.data.visualizations import visualize_training_results
 
 import sys
+from types import ModuleType
 from typing import Text
 from datetime import datetime
+import importlib
 import os
 import argparse
 import requests
@@ -16,24 +23,40 @@ TRIAGE_API_USER = os.getenv('TRIAGE_API_USER')
 TRIAGE_API_PASS = os.getenv('TRIAGE_API_PASS')
 
 DATE_FORMAT = '%Y-%m-%d'
+# The date format as an argparse help string, which expands % itself
+DATE_HELP = DATE_FORMAT.replace('%', '%%')
 
+# Model names to the modules that train them, which are only imported once a model is trained
 MODELS = {
-    'radius_variance': train_radius_variance
+    'radius_variance': 'triage_ml.train_radius_variance',
+    'global_radius_variance': 'triage_ml.train_global_radius_variance',
 }
 
+# Models training one network over every clinic and severity instead of one per pair
+GLOBAL_MODELS = {'global_radius_variance'}
 
-def _load_dataset_from_file(file_name: Text) -> DataSet:
-    data = []
-    with open(file_name) as f:
-        for line in f.readlines():
-            line = line.rstrip().split(',')
-            data.append((
-                int(line[0]),
-                int(line[1]),
-                datetime.strptime(line[2], '%Y-%m-%d'),
-            ))
 
-    return DataSet(data)
+def load_trainer(model: Text) -> ModuleType:
+    """
+    Import the module that trains a model.
+    :param model: The name of the model.
+    :return: The module, providing train(dataset, ...) and create_model().
+    """
+    return importlib.import_module(MODELS[model])
+
+
+def _load_dataset_from_file(file_name: Text, clinic_id: int = None, severity: int = None) -> DataSet:
+    return DataSet.read_from_file(file_name, clinic_id, severity)
+
+
+def frame_cache(args, directory: Text = None) -> FrameCache:
+    """
+    :param directory: The directory to cache frames in when --cache_dir is not set.
+    :return: The FrameCache of --cache_dir or the directory, None if neither is set.
+    """
+    if not (args.cache_dir or directory):
+        return None
+    return FrameCache(args.cache_dir or directory, args.cache_size * 2**20 if args.cache_size else None)
 
 
 def parse_args(args):
@@ -57,16 +80,56 @@ def parse_args(args):
                         help='Whether training weights should be persisted to database.')
     parser.add_argument('-w', '--weights', default='weights.h5', type=str,
                         help='The path to write training weights to.')
+    parser.add_argument('-x', '--export', default=None, type=str,
+                        help='An optional path to export the trained weights to as a NumPy weight bundle (.npz), '
+                             'which can be served without TensorFlow.')
     parser.add_argument('-r', '--results', default='results.png', type=str,
                         help='The path to write the results graph to.')
+    parser.add_argument('--pipeline', default='numpy', choices=PIPELINES,
+                        help='How training data is fed to the model: in-memory NumPy arrays or a streaming '
+                             'tf.data pipeline.')
+    parser.add_argument('-b', '--batch_size', default=32, type=int,
+                        help='The number of samples in each training batch.')
+    parser.add_argument('--store', default=None, type=str,
+                        help='An optional directory of previously synced arrival counts. Only arrivals since the '
+                             'last sync are fetched and the training data is extended instead of rebuilt.')
+    parser.add_argument('--cache_dir', default=None, type=str,
+                        help='An optional directory to cache the preprocessed training data in, so later runs on '
+                             'the same data skip preprocessing.')
+    parser.add_argument('--cache_size', default=None, type=int,
+                        help='The number of megabytes --cache_dir is kept under by evicting its least recently used '
+                             'data.')
+    parser.add_argument('--checkpoint_dir', default=None, type=str,
+                        help='An optional directory to checkpoint the model and optimizer state to during training.')
+    parser.add_argument('--checkpoint_every', default=1, type=int,
+                        help='The number of epochs between checkpoints.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume training from the latest checkpoint in --checkpoint_dir, if there is one.')
+    parser.add_argument('--warm_start', default=None, type=str,
+                        help='An optional weights file of an earlier run to start training from instead of a random '
+                             'initialization.')
+    parser.add_argument('--patience', default=None, type=int,
+                        help='Stop training after this many epochs without the validation loss improving, keeping '
+                             'the weights of the best epoch.')
+
+    parser.add_argument('--profile_report', default=None, type=str,
+                        help='An optional path to write a JSON report of the time and memory used by each stage to.')
+    parser.add_argument('--trace_memory', action='store_true',
+                        help='Trace the peak Python memory allocated in each stage with tracemalloc, which slows '
+                             'the run down.')
+    parser.add_argument('--profile', default=None, type=str,
+                        help='An optional path to dump cProfile stats of the whole run to.')
 
     # If pulling data from API
-    parser.add_argument('-sd', '--start_date', help=f'The start date of the data. Format: {DATE_FORMAT}')
-    parser.add_argument('-ed', '--end_date', help=f'The end date of the data. Format: {DATE_FORMAT}')
+    parser.add_argument('-sd', '--start_date', help=f'The start date of the data. Format: {DATE_HELP}')
+    parser.add_argument('-ed', '--end_date', help=f'The end date of the data. Format: {DATE_HELP}')
 
     # If using local data
     parser.add_argument('-d', '--dataset',
-                        help='An optional local dataset to train on instead')
+                        help='An optional local dataset (CSV or .npz) to train on instead')
+    parser.add_argument('--chunk_size', default=None, type=int,
+                        help='Stream the local dataset in chunks of about this many arrivals instead of reading it '
+                             'into memory, for datasets larger than memory.')
 
     return parser.parse_args(args)
 
@@ -76,23 +139,70 @@ def main(http=requests, str_args=None):
     Entrypoint for triage-train.
     """
     args = parse_args(str_args or sys.argv[1:])
-    triage_api = TriageAPI(TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, http)
-
-    if args.dataset:
-        dataset = _load_dataset_from_file(args.dataset)
-    else:
-        start_date = datetime.strptime(args.start_date, DATE_FORMAT)
-        end_date = datetime.strptime(args.end_date, DATE_FORMAT)
-        dataset = triage_api.get_data(args.clinic_id, args.severity, start_date, end_date)
-
-    dataset.filter_on('clinic_id', lambda c_id: c_id == args.clinic_id)
-    dataset.filter_on('severity', lambda s: s == args.severity)
-    trained_model, train_data, test_data, history = train_radius_variance(dataset,
-                                                                          epochs=args.epochs,
-                                                                          lr=args.learning_rate,
-                                                                          output_file=args.weights)
+    trainer = load_trainer(args.model)
+    profiler = Profiler(trace_memory=args.trace_memory, cprofile_file=args.profile)
+    try:
+        _train(args, trainer, TriageAPI(TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, http), profiler)
+    finally:
+        profiler.finish(args.profile_report)
+        print('\n'.join(profiler.summary()))
+
+
+def _train(args, trainer: ModuleType, triage_api: TriageAPI, profiler: Profiler):
+    if args.store and args.model in GLOBAL_MODELS:
+        raise ValueError('--store is not supported by global models.')
+    if args.chunk_size and args.model in GLOBAL_MODELS:
+        raise ValueError('--chunk_size is not supported by global models.')
+    store = CountStore(args.store) if args.store else None
+    synced = store.high_water_mark(args.clinic_id, args.severity) if store else None
+    synced_until = None
+
+    with profiler.stage('load'):
+        if args.dataset and args.chunk_size:
+            # Only the daily counts of the filtered arrivals are ever held in memory
+            dataset = ChunkedDataSet.read_from_file(args.dataset, args.chunk_size)
+        elif args.dataset:
+            dataset = _load_dataset_from_file(args.dataset, args.clinic_id, args.severity)
+        else:
+            start_date = datetime.strptime(args.start_date, DATE_FORMAT)
+            end_date = datetime.strptime(args.end_date, DATE_FORMAT)
+            if synced is not None:
+                # The last synced day is fetched again as it may only have been partially synced
+                start_date = max(start_date, datetime.combine(synced.tolist(), datetime.min.time()))
+            dataset = triage_api.get_data(args.clinic_id, args.severity, start_date, end_date)
+            synced_until = end_date
+
+    with profiler.stage('filter'):
+        dataset.filter_mask('clinic_id', lambda c_id: c_id == args.clinic_id)
+        dataset.filter_mask('severity', lambda s: s == args.severity)
+
+    ml_dataset = None
+    if store:
+        with profiler.stage('sync'):
+            if synced is not None:
+                dataset.filter_mask('date_received', lambda d: d >= synced)
+            store.update(args.clinic_id, args.severity, dataset, synced_until)
+            ml_dataset = store.ml_dataset(trainer.create_model(), args.clinic_id, args.severity, strided=True)
+
+    checkpoints = CheckpointManager(args.checkpoint_dir, args.checkpoint_every) if args.checkpoint_dir else None
+    trained_model, train_data, test_data, history = trainer.train(dataset,
+                                                                  epochs=args.epochs,
+                                                                  lr=args.learning_rate,
+                                                                  output_file=args.weights,
+                                                                  pipeline_mode=args.pipeline,
+                                                                  batch_size=args.batch_size,
+                                                                  ml_dataset=ml_dataset,
+                                                                  export_file=args.export,
+                                                                  profiler=profiler,
+                                                                  checkpoints=checkpoints,
+                                                                  resume=args.resume,
+                                                                  warm_start=args.warm_start,
+                                                                  patience=args.patience,
+                                                                  cache=frame_cache(args))
 
     if args.persist:
-        triage_api.post_weights(args.clinic_id, args.severity, args.weights, history.history['val_loss'][-1])
+        with profiler.stage('persist'):
+            triage_api.post_weights(args.clinic_id, args.severity, args.weights, history.history['val_loss'][-1])
 
-    visualize_training_results(trained_model, train_data, test_data, args.results)
+    with profiler.stage('plot'):
+        visualize_training_results(trained_model, train_data, test_data, args.results)
@@ -0,0 +1,261 @@
+from triage_ml.data.dataset import DataSet, _ATTRS
+from triage_ml.data.pipeline import PIPELINES
+from triage_ml.train import DATE_HELP, GLOBAL_MODELS, MODELS, TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, \
+    frame_cache, load_trainer
+from triage_ml.triage_api import TriageAPI
+from triage_ml.checkpoints import CheckpointManager
+from triage_ml.workers import add_worker_arguments, jobs, load_partitions, worker_pool
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+import argparse
+import csv
+import os
+import sys
+import time
+import numpy as np
+import requests
+
+SUMMARY_FIELDS = ['clinic_id', 'severity', 'arrivals', 'val_loss', 'seconds', 'weights', 'results', 'uploaded',
+                  'error']
+
+
+def _train_pair(model: str, clinic_id: int, severity: int, dataset: DataSet, epochs: int, lr: float,
+                weights_file: str, results_file: str, pipeline_mode: str, batch_size: int, **train_options) -> Dict:
+    """
+    Train one model on the data of a single clinic and severity.
+    :param train_options: Caching, checkpointing, resuming, warm-starting and early stopping options passed on to the
+                          trainer.
+    :return: The summary row of the training run, in a list.
+    """
+    from triage_ml.data.visualizations import visualize_training_results
+
+    start = time.time()
+    trained_model, train_data, test_data, history = load_trainer(model).train(dataset,
+                                                                              epochs=epochs,
+                                                                              lr=lr,
+                                                                              output_file=weights_file,
+                                                                              pipeline_mode=pipeline_mode,
+                                                                              batch_size=batch_size,
+                                                                              **train_options)
+    visualize_training_results(trained_model, train_data, test_data, results_file)
+
+    return [{
+        'clinic_id': clinic_id,
+        'severity': severity,
+        'arrivals': len(dataset),
+        'val_loss': history.history.get('val_loss', [None])[-1],
+        'seconds': round(time.time() - start, 3),
+        'weights': weights_file,
+        'results': results_file,
+        'uploaded': None,
+        'error': None,
+    }]
+
+
+def _train_global(model: str, partitions: Dict[Tuple[int, int], DataSet], epochs: int, lr: float, output_dir: str,
+                  pipeline_mode: str, batch_size: int, **train_options) -> List[Dict]:
+    """
+    Train one global model on the data of every clinic and severity.
+    :param train_options: Caching, checkpointing, resuming, warm-starting and early stopping options passed on to the
+                          trainer.
+    :return: The summary row of each clinic and severity, with its own validation loss and results graph.
+    """
+    from triage_ml.data.visualizations import visualize_training_results
+
+    start = time.time()
+    trainer = load_trainer(model)
+    dataset = DataSet.from_columns(*(np.concatenate([partition.columns[attribute] for partition in partitions.values()])
+                                     for attribute in _ATTRS))
+    weights_file = os.path.join(output_dir, 'weights-global.h5')
+    global_model, train_data, test_data, history = trainer.train(dataset,
+                                                                 epochs=epochs,
+                                                                 lr=lr,
+                                                                 output_file=weights_file,
+                                                                 pipeline_mode=pipeline_mode,
+                                                                 batch_size=batch_size,
+                                                                 **train_options)
+    metrics = trainer.series_metrics(global_model, test_data)
+    seconds = round(time.time() - start, 3)
+
+    rows = []
+    for (clinic_id, severity), partition in partitions.items():
+        results_file = None
+        series_train = global_model.series_samples(train_data, clinic_id, severity)
+        series_test = global_model.series_samples(test_data, clinic_id, severity)
+        if len(series_train) and len(series_test):
+            results_file = os.path.join(output_dir, f'results-{clinic_id}-{severity}.png')
+            visualize_training_results(global_model, series_train, series_test, results_file)
+
+        rows.append({
+            'clinic_id': clinic_id,
+            'severity': severity,
+            'arrivals': len(partition),
+            'val_loss': metrics.get((clinic_id, severity), {}).get('loss'),
+            'seconds': seconds,
+            'weights': weights_file,
+            'results': results_file,
+            'uploaded': None,
+            'error': None,
+        })
+    return rows
+
+
+def _train_options(args, name: str) -> Dict:
+    """
+    :param name: The name of the model's weights and checkpoints, e.g. '1-0' or 'global'.
+    :return: The caching, checkpointing, resuming, warm-starting and early stopping options of a model.
+    """
+    warm_start = os.path.join(args.warm_start, f'weights-{name}.h5') if args.warm_start else None
+    return {
+        'checkpoints': (CheckpointManager(os.path.join(args.checkpoint_dir, name), args.checkpoint_every)
+                        if args.checkpoint_dir else None),
+        'resume': args.resume,
+        # Pairs new since the earlier run start from scratch
+        'warm_start': warm_start if warm_start and os.path.isfile(warm_start) else None,
+        'patience': args.patience,
+        'cache': frame_cache(args),
+    }
+
+
+def parse_args(args):
+    """
+    Parser configuration
+    :return: parsed augments object
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-m', '--model', required=True, choices=MODELS.keys(),
+                        help='The name of the model to train.')
+    parser.add_argument('-c', '--clinic_ids', type=int, nargs='+',
+                        help='The IDs of the clinics to train on. Defaults to every clinic in the dataset.')
+    parser.add_argument('-s', '--severities', type=int, nargs='+',
+                        help='The triage severity levels to train on. Defaults to every severity in the dataset.')
+    parser.add_argument('-e', '--epochs', default=100, type=int,
+                        help='Number of passes through the dataset to train for.')
+    parser.add_argument('-lr', '--learning_rate', default=0.001, type=float,
+                        help='The gradient descent learning rate.')
+    parser.add_argument('-p', '--persist', default=False, type=bool,
+                        help='Whether training weights should be persisted to database.')
+    parser.add_argument('-o', '--output_dir', default='.', type=str,
+                        help='The directory to write training weights and results graphs to.')
+    parser.add_argument('--compress_weights', action='store_true',
+                        help='Gzip weights before persisting them.')
+    parser.add_argument('--upload_chunk_size', default=None, type=int,
+                        help='Stream persisted weights to the API in chunks of this many bytes instead of a multipart '
+                             'form.')
+    parser.add_argument('--summary', default='summary.csv', type=str,
+                        help='The path to write the CSV summary of every training run to.')
+    parser.add_argument('--pipeline', default='numpy', choices=PIPELINES,
+                        help='How training data is fed to the model: in-memory NumPy arrays or a streaming '
+                             'tf.data pipeline.')
+    parser.add_argument('-b', '--batch_size', default=32, type=int,
+                        help='The number of samples in each training batch.')
+    add_worker_arguments(parser, 'models')
+    parser.add_argument('--checkpoint_dir', default=None, type=str,
+                        help='An optional directory to checkpoint each model and its optimizer state to during '
+                             'training, in a subdirectory per clinic and severity.')
+    parser.add_argument('--checkpoint_every', default=1, type=int,
+                        help='The number of epochs between checkpoints.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume training each model from its latest checkpoint in --checkpoint_dir, if it has '
+                             'one.')
+    parser.add_argument('--warm_start', default=None, type=str,
+                        help='An optional output directory of an earlier run. Each model starts training from its '
+                             'weights there, if it has any, instead of a random initialization.')
+    parser.add_argument('--patience', default=None, type=int,
+                        help='Stop training a model after this many epochs without the validation loss improving, '
+                             'keeping the weights of the best epoch.')
+
+    # If pulling data from API
+    parser.add_argument('-sd', '--start_date', help=f'The start date of the data. Format: {DATE_HELP}')
+    parser.add_argument('-ed', '--end_date', help=f'The end date of the data. Format: {DATE_HELP}')
+
+    parser.add_argument('--api_workers', default=4, type=int,
+                        help='The maximum number of concurrent requests used to pull data from the API.')
+    parser.add_argument('--api_chunk_days', default=None, type=int,
+                        help='Pull data from the API in date ranges of this many days, fetched in parallel.')
+
+    # If pulling data from the database
+    parser.add_argument('--db_table',
+                        help='An optional database table of arrivals to pull data from instead of the API.')
+    parser.add_argument('--db_connections', default=4, type=int,
+                        help='The maximum number of database connections used to pull data.')
+
+    # If using local data
+    parser.add_argument('-d', '--dataset',
+                        help='An optional local dataset (CSV or .npz) to train on instead')
+
+    return parser.parse_args(args)
+
+
+def main(http=requests, str_args=None):
+    """
+    Entrypoint for triage-train-all.
+    """
+    args = parse_args(str_args or sys.argv[1:])
+    if args.persist and args.model in GLOBAL_MODELS:
+        # The API stores weights per clinic and severity, so the shared weights would be uploaded once per pair
+        raise ValueError('--persist is not supported by global models.')
+    triage_api = TriageAPI(TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, http, max_workers=args.api_workers,
+                           chunk_days=args.api_chunk_days)
+    partitions = load_partitions(args, triage_api)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    # A global model is trained by a single process with the threads of every job
+    global_model = args.model in GLOBAL_MODELS
+    workers, threads = (1, jobs(args) * args.threads) if global_model else (jobs(args), args.threads)
+
+    # Weights are uploaded on threads of the parent while the workers go on to train other clinics and severities
+    with worker_pool(workers, threads) as executor, ThreadPoolExecutor(max_workers=args.api_workers) as uploader:
+        futures = {}
+        if global_model:
+            future = executor.submit(_train_global, args.model, partitions, args.epochs, args.learning_rate,
+                                     args.output_dir, args.pipeline, args.batch_size, **_train_options(args, 'global'))
+            futures[future] = [(clinic_id, severity, len(dataset))
+                               for (clinic_id, severity), dataset in partitions.items()]
+        else:
+            for (clinic_id, severity), dataset in partitions.items():
+                weights_file = os.path.join(args.output_dir, f'weights-{clinic_id}-{severity}.h5')
+                results_file = os.path.join(args.output_dir, f'results-{clinic_id}-{severity}.png')
+                future = executor.submit(_train_pair, args.model, clinic_id, severity, dataset, args.epochs,
+                                         args.learning_rate, weights_file, results_file, args.pipeline,
+                                         args.batch_size, **_train_options(args, f'{clinic_id}-{severity}'))
+                futures[future] = [(clinic_id, severity, len(dataset))]
+
+        rows = []
+        uploads = {}
+        for future in as_completed(futures):
+            try:
+                trained = future.result()
+            except Exception as ex:
+                trained = [dict({field: None for field in SUMMARY_FIELDS},
+                                clinic_id=clinic_id, severity=severity, arrivals=arrivals, error=repr(ex))
+                           for clinic_id, severity, arrivals in futures[future]]
+
+            for row in trained:
+                if args.persist and not row['error']:
+                    upload = uploader.submit(triage_api.post_weights, row['clinic_id'], row['severity'],
+                                             row['weights'], row['val_loss'], compress=args.compress_weights,
+                                             chunk_size=args.upload_chunk_size)
+                    uploads[upload] = row
+
+                print(f'Clinic {row["clinic_id"]} severity {row["severity"]}: '
+                      + (row['error'] or f'val_loss={row["val_loss"]}'))
+                rows.append(row)
+
+        for upload in as_completed(uploads):
+            row = uploads[upload]
+            try:
+                row['uploaded'] = upload.result()
+            except Exception as ex:
+                row['error'] = f'Upload failed: {ex!r}'
+                print(f'Clinic {row["clinic_id"]} severity {row["severity"]}: {row["error"]}')
+
+    with open(args.summary, 'w', newline='') as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda r: (r['clinic_id'], r['severity'])))
+
+    if any(row['error'] for row in rows):
+        sys.exit(1)
@@ -0,0 +1,99 @@
+from triage_ml.models.global_radius_variance import GlobalRadiusVariance
+from triage_ml.data.dataset import DataSet, MLDataSet, TimeInterval
+from triage_ml.profiling import Profiler, throughput_callback
+from triage_ml.checkpoints import CheckpointManager, restore, training_callbacks
+from triage_ml.data.frame_cache import FrameCache
+from triage_ml.train_radius_variance import loss
+
+from typing import Dict, List, Tuple
+from tensorflow.keras.optimizers import Adam
+import tensorflow as tf
+import numpy as np
+
+
+def create_model(clinic_ids: List[int], severities: List[int]) -> GlobalRadiusVariance:
+    return GlobalRadiusVariance(clinic_ids, severities, seq_size=30, radius=15, time_interval=TimeInterval.WEEK)
+
+
+def train(dataset: DataSet, epochs: int, lr=0.001, valid_split=0.2, output_file='weights.h5', pipeline_mode='numpy',
+          batch_size=32, ml_dataset=None, export_file=None, profiler: Profiler = None,
+          checkpoints: CheckpointManager = None, resume=False, warm_start: str = None, patience: int = None,
+          cache: FrameCache = None):
+    """
+    Train one model on every clinic and severity of a DataSet.
+
+    Each series is split chronologically, so every series is both trained and validated on. Batches
+    hold batch_size samples per series, so the more series there are the larger the batches.
+    """
+    if pipeline_mode != 'numpy' or ml_dataset is not None or export_file:
+        raise ValueError('Global models are only trained from NumPy arrays built from a DataSet, and cannot be '
+                         'exported as NumPy weight bundles.')
+
+    profiler = profiler or Profiler()
+    global_model = create_model(np.unique(dataset.columns['clinic_id']).tolist(),
+                                np.unique(dataset.columns['severity']).tolist())
+    global_model.get_model().summary()
+
+    with profiler.stage('windows'):
+        splits = [ml_dataset.split(1 - valid_split)
+                  for ml_dataset in global_model.create_series_ml_datasets(dataset, strided=True, cache=cache).values()]
+        train_data = MLDataSet.concatenate([train_split for train_split, _ in splits])
+        test_data = MLDataSet.concatenate([test_split for _, test_split in splits])
+    if cache:
+        print(f'Frame cache: {cache.stats()}')
+    print(len(train_data), len(test_data))
+
+    global_model.get_model().compile(
+        optimizer=Adam(learning_rate=lr),
+        loss=loss
+    )
+    global_model.model, initial_epoch = restore(global_model.get_model(), loss, checkpoints, resume, warm_start)
+
+    with profiler.stage('training'):
+        history = global_model.get_model().fit(
+            x=train_data.inputs,
+            y=train_data.outputs,
+            validation_data=(test_data.inputs, test_data.outputs),
+            batch_size=batch_size * max(len(splits), 1),
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            shuffle=True,
+            callbacks=[throughput_callback(profiler, len(train_data))] + training_callbacks(checkpoints, patience))
+
+    with profiler.stage('save'):
+        global_model.get_model().save(output_file)
+        # The run is complete, so there is nothing left to resume
+        if checkpoints:
+            checkpoints.clear()
+    return global_model, train_data, test_data, history
+
+
+def series_metrics(global_model: GlobalRadiusVariance, ml_dataset: MLDataSet,
+                   batch_size=4096) -> Dict[Tuple[int, int], Dict]:
+    """
+    Evaluate a model on the samples of each clinic and severity of a stacked MLDataSet.
+    :param global_model: The model.
+    :param ml_dataset: The stacked MLDataSet, e.g. the test data returned by train.
+    :param batch_size: The number of samples to predict at once.
+    :return: A dictionary of (clinic_id, severity) pairs to their number of samples, mean loss and mean absolute
+             error of arrivals.
+    """
+    if not len(ml_dataset):
+        return {}
+
+    predictions = global_model.get_model().predict(ml_dataset.inputs, batch_size=batch_size, verbose=0)
+    actual = ml_dataset.outputs[0].astype(np.float32)
+    losses = loss(tf.constant(actual), tf.constant(predictions)).numpy()
+    errors = np.abs(actual[:, 0] - predictions[:, 0])
+
+    metrics = {}
+    series = np.stack([ml_dataset.inputs[2][:, 0], ml_dataset.inputs[3][:, 0]], axis=1)
+    for clinic_index, severity_index in np.unique(series, axis=0):
+        mask = (series[:, 0] == clinic_index) & (series[:, 1] == severity_index)
+        pair = (global_model.clinic_ids[clinic_index], global_model.severities[severity_index])
+        metrics[pair] = {
+            'samples': int(mask.sum()),
+            'loss': float(losses[mask].mean()),
+            'arrivals_mae': float(errors[mask].mean()),
+        }
+    return metrics
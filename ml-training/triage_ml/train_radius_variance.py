@@ -1,5 +1,10 @@
 from triage_ml.models.radius_variance import RadiusVariance
 from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.data import pipeline
+from triage_ml.models import numpy_runtime
+from triage_ml.profiling import Profiler, throughput_callback
+from triage_ml.checkpoints import CheckpointManager, restore, training_callbacks
+from triage_ml.data.frame_cache import FrameCache
 
 from tensorflow.keras.optimizers import Adam
 from collections import namedtuple
@@ -7,30 +12,71 @@ import tensorflow as tf
 
 
 def loss(y_true, y_pred):
-    return (y_true[0] - y_pred[0])**2 \
-           + (y_true[1] - y_pred[1])**2 \
-           + 10 * tf.math.maximum(y_true[0] - y_pred[0], 0)**2 \
-           + 10 * tf.math.maximum(y_true[1] - y_pred[1], 0)**2
+    """
+    The squared error of the arrivals and variance each sample predicts, under-predicting either is penalised
+    more heavily.
+    :param y_true: The (arrivals, variance) outputs of a batch, one row per sample.
+    :param y_pred: The predicted outputs of the batch.
+    :return: The loss of each sample of the batch.
+    """
+    return (y_true[:, 0] - y_pred[:, 0])**2 \
+           + (y_true[:, 1] - y_pred[:, 1])**2 \
+           + 10 * tf.math.maximum(y_true[:, 0] - y_pred[:, 0], 0)**2 \
+           + 10 * tf.math.maximum(y_true[:, 1] - y_pred[:, 1], 0)**2
 
 
-def train(dataset: DataSet, epochs: int, lr=0.001, valid_split=0.2, output_file='weights.h5'):
-    rv_model = RadiusVariance(seq_size=30, radius=15, time_interval=TimeInterval.WEEK)
+def create_model() -> RadiusVariance:
+    return RadiusVariance(seq_size=30, radius=15, time_interval=TimeInterval.WEEK)
+
+
+def train(dataset: DataSet, epochs: int, lr=0.001, valid_split=0.2, output_file='weights.h5', pipeline_mode='numpy',
+          batch_size=32, ml_dataset=None, export_file=None, profiler: Profiler = None,
+          checkpoints: CheckpointManager = None, resume=False, warm_start: str = None, patience: int = None,
+          cache: FrameCache = None):
+    profiler = profiler or Profiler()
+    rv_model = create_model()
     rv_model.get_model().summary()
 
-    ml_dataset = rv_model.create_ml_dataset(dataset)
-    train_data, test_data = ml_dataset.split(1 - valid_split)
+    with profiler.stage('windows'):
+        # A prebuilt MLDataSet (e.g. extended from a CountStore) saves rebuilding it from every arrival
+        if ml_dataset is None and cache:
+            ml_dataset = cache.ml_dataset(rv_model, dataset, strided=True)
+            print(f'Frame cache: {cache.stats()}')
+        elif ml_dataset is None:
+            ml_dataset = rv_model.create_ml_dataset(dataset, strided=True)
+        train_data, test_data = ml_dataset.split(1 - valid_split)
     print(len(train_data.inputs[0]), len(test_data.inputs[0]))
 
     rv_model.get_model().compile(
-        optimizer=Adam(lr=lr),
+        optimizer=Adam(learning_rate=lr),
         loss=loss
     )
+    rv_model.model, initial_epoch = restore(rv_model.get_model(), loss, checkpoints, resume, warm_start)
+    callbacks = [throughput_callback(profiler, len(train_data))] + training_callbacks(checkpoints, patience)
 
-    history = rv_model.get_model().fit(
-        x=train_data.inputs,
-        y=train_data.outputs,
-        validation_data=(test_data.inputs, test_data.outputs),
-        epochs=epochs)
+    with profiler.stage('training'):
+        if pipeline_mode == 'tfdata':
+            history = rv_model.get_model().fit(
+                pipeline.make_dataset(train_data, batch_size=batch_size, shuffle=True),
+                validation_data=pipeline.make_dataset(test_data, batch_size=batch_size),
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                callbacks=callbacks)
+        else:
+            history = rv_model.get_model().fit(
+                x=train_data.inputs,
+                y=train_data.outputs,
+                validation_data=(test_data.inputs, test_data.outputs),
+                batch_size=batch_size,
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                callbacks=callbacks)
 
-    rv_model.get_model().save(output_file)
+    with profiler.stage('save'):
+        rv_model.get_model().save(output_file)
+        if export_file:
+            numpy_runtime.export_weights(rv_model, export_file)
+        # The run is complete, so there is nothing left to resume
+        if checkpoints:
+            checkpoints.clear()
     return rv_model, train_data, test_data, history
@@ -1,53 +1,297 @@
+from triage_ml.data.dataset import DataSet
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Tuple
+import gzip
+import hashlib
+import os
+import threading
+import time
+import zlib
+import numpy as np
 import requests
-from datetime import datetime
+
+_DIGEST_BLOCK_SIZE = 2**20
 
 
 class TriageAPI:
+    """
+    A client of the Triage API.
+
+    Requests share one session, so connections are reused, and are retried with exponential backoff
+    when they fail to connect, time out or the server is unavailable. An expired token is refreshed
+    once per request when the API responds with 401.
+
+    Arrivals are fetched in date range chunks of every clinic and severity in parallel, with at most
+    max_workers requests in flight.
 
-    DATE_FORMAT = '%y-%M-%d'
+    Weights are identified by their SHA-256 digest, and are not uploaded again if this client or the
+    server already has the same weights and accuracy for a clinic and severity, unless they are to be
+    put in use.
 
-    def __init__(self, url, username, password, http=requests):
+    Attributes:
+        max_workers: The maximum number of concurrent requests.
+        timeout: The seconds to wait for the server to respond to each request.
+        retries: The number of times a failed request is retried.
+        backoff: The seconds to wait before the first retry, doubling with each retry.
+        chunk_days: If set, date ranges are fetched in chunks of this many days.
+    """
+
+    DATE_FORMAT = '%Y-%m-%d'
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, url, username, password, http=requests, max_workers=4, timeout=30, retries=3, backoff=0.5,
+                 chunk_days: int = None):
         self.url = url
         self.username = username
         self.password = password
         self.http = http
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_days = chunk_days
+
+        # Anything without sessions, such as a fake, is used to make requests directly
+        self.session = http
+        if hasattr(http, 'Session'):
+            self.session = http.Session()
+            adapter = http.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
 
         self.token = None
+        self._token_lock = threading.Lock()
+        self._uploaded_digests = {}
+        self._digest_checks = True
 
     def auth(self):
-        res = self.http.post(f'{self.url}/auth/login', json={
+        res = self._post('/auth/login', authenticated=False, json={
             'username': self.username,
             'password': self.password
         })
         self.token = res.json()['token']
 
-    def get_data(self, clinic_id: int, severity: int, start_date: datetime, end_date: datetime):
-        if not self.token:
-            self.auth()
+    def get_data(self, clinic_id: int, severity: int, start_date: datetime, end_date: datetime) -> DataSet:
+        """
+        Fetch the arrivals of a clinic and severity.
+        :param clinic_id: The ID of the clinic.
+        :param severity: The triage severity level.
+        :param start_date: The first day to fetch arrivals of.
+        :param end_date: The last day to fetch arrivals of.
+        :return: The DataSet of arrivals.
+        """
+        return self.get_many([(clinic_id, severity)], start_date, end_date)[(clinic_id, severity)]
+
+    def get_many(self, pairs: List[Tuple[int, int]], start_date: datetime,
+                 end_date: datetime) -> Dict[Tuple[int, int], DataSet]:
+        """
+        Fetch the arrivals of several clinics and severities, every date range chunk of each in parallel.
+        :param pairs: The (clinic_id, severity) pairs to fetch.
+        :param start_date: The first day to fetch arrivals of.
+        :param end_date: The last day to fetch arrivals of.
+        :return: A dictionary of (clinic_id, severity) pairs to their DataSet.
+        """
+        fetches = [(pair, chunk) for pair in pairs for chunk in self._date_chunks(start_date, end_date)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            columns = list(executor.map(lambda fetch: self._fetch_arrivals(*fetch[0], *fetch[1]), fetches))
+
+        partitions = {}
+        for pair in pairs:
+            chunks = [chunk for (fetch_pair, _), chunk in zip(fetches, columns) if fetch_pair == pair]
+            partitions[pair] = DataSet.from_columns(*(np.concatenate(column) for column in zip(*chunks)))
+        return partitions
+
+    def post_weights(self, clinic_id: int, severity: int, weights_path: str, accuracy: float, make_in_use: bool = False,
+                     compress=False, chunk_size: int = None) -> bool:
+        """
+        Upload the weights of a model, unless identical weights have already been uploaded with the same accuracy.
+
+        Weights to be put in use are always uploaded, as the model in use may have changed since.
+        :param clinic_id: The ID of the clinic the model was trained on.
+        :param severity: The triage severity level the model was trained on.
+        :param weights_path: The weights file.
+        :param accuracy: The validation loss of the model.
+        :param make_in_use: Whether the model should be used for predictions.
+        :param compress: Whether to gzip the weights before uploading them.
+        :param chunk_size: If set, the weights are streamed to the server in chunks of this many bytes instead
+                           of being sent as a multipart form, so the file is never read into memory.
+        :return: Whether the weights were uploaded, False if the server already had them.
+        """
+        digest = _file_digest(weights_path)
+        upload = (digest, str(accuracy))
+        if not make_in_use and (self._uploaded_digests.get((clinic_id, severity)) == upload or
+                                self._server_has_weights(clinic_id, severity, digest, accuracy)):
+            self._uploaded_digests[(clinic_id, severity)] = upload
+            return False
+
+        fields = {
+            'clinic_id': clinic_id,
+            'severity': severity,
+            'accuracy': str(accuracy),
+            'make_in_use': make_in_use,
+            'digest': digest,
+        }
+        if compress:
+            fields['compression'] = 'gzip'
+
+        if chunk_size:
+            self._post('/upload/model/stream', params=fields, headers={'Content-Type': 'application/octet-stream'},
+                       data=lambda: _read_chunks(weights_path, chunk_size, compress))
+        else:
+            # Read up front so the upload can be retried
+            with open(weights_path, 'rb') as weights_file:
+                weights = weights_file.read()
+            name = os.path.basename(weights_path)
+            files = {
+                'model_weights': (name + '.gz', gzip.compress(weights)) if compress else (name, weights),
+                **{field: (None, value) for field, value in fields.items()},
+            }
+            self._post('/upload/model', files=files)
 
+        self._uploaded_digests[(clinic_id, severity)] = upload
+        return True
+
+    def close(self):
+        """
+        Close the connections of the session.
+        """
+        if self.session is not self.http:
+            self.session.close()
+
+    def _fetch_arrivals(self, clinic_id: int, severity: int, start_date: datetime,
+                        end_date: datetime) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fetch a date range of arrivals of a clinic and severity.
+
+        The API responds with a JSON array of arrivals, objects with clinic_id, severity and ISO 8601
+        date_received fields, which are parsed straight into columns.
+        :return: The clinic_id, severity and date_received columns of the arrivals.
+        """
         data = {
             'interval': (start_date.strftime(self.DATE_FORMAT), end_date.strftime(self.DATE_FORMAT))
         }
+        arrivals = self._post(f'/data/{clinic_id}/{severity}', json=data).json()
 
-        res = self.http.post(f'{self.url}/data/{clinic_id}/{severity}', json=data, headers=self._headers())
-        res.raise_for_status()
+        return (np.fromiter((arrival['clinic_id'] for arrival in arrivals), dtype=np.int32, count=len(arrivals)),
+                np.fromiter((arrival['severity'] for arrival in arrivals), dtype=np.int8, count=len(arrivals)),
+                np.array([arrival['date_received'][:10] for arrival in arrivals], dtype='datetime64[D]'))
 
-    def post_weights(self, clinic_id: int, severity: int, weights_path: str, accuracy: float, make_in_use: bool = False):
-        if not self.token:
-            self.auth()
+    def _date_chunks(self, start_date: datetime, end_date: datetime) -> Iterator[Tuple[datetime, datetime]]:
+        """
+        :return: The first and last day of each chunk of a date range.
+        """
+        if not self.chunk_days:
+            yield start_date, end_date
+            return
 
-        with open(weights_path, 'rb') as weights_file:
-            data = {
-                'model_weights': weights_file,
-                'clinic_id': (None, clinic_id),
-                'severity': (None, severity),
-                'accuracy': (None, str(accuracy)),
-                'make_in_use': (None, make_in_use),
-            }
-            res = self.http.post(f'{self.url}/upload/model', files=data, headers=self._headers())
-            res.raise_for_status()
+        while True:
+            chunk_end = start_date + timedelta(days=self.chunk_days - 1)
+            yield start_date, min(chunk_end, end_date)
+            if chunk_end >= end_date:
+                return
+            start_date = chunk_end + timedelta(days=1)
+
+    def _server_has_weights(self, clinic_id: int, severity: int, digest: str, accuracy: float) -> bool:
+        """
+        :return: Whether the server already has weights with the digest and accuracy for the clinic and severity,
+                 False if the server cannot check digests.
+        """
+        if not self._digest_checks:
+            return False
+
+        try:
+            res = self._post('/upload/model/digest', json={'clinic_id': clinic_id, 'severity': severity,
+                                                           'digest': digest, 'accuracy': str(accuracy)})
+        except requests.HTTPError as ex:
+            if ex.response is None or ex.response.status_code != 404:
+                raise
+            self._digest_checks = False
+            return False
+        return bool(res.json()['exists'])
+
+    def _post(self, path: str, authenticated=True, headers: Dict = None, data: Callable = None, **kwargs):
+        """
+        Make a POST request, refreshing the token and retrying as needed.
+        :param path: The path of the request.
+        :param authenticated: Whether the request needs a token.
+        :param headers: Any headers besides the authorization header.
+        :param data: If set, called on each attempt for the body of the request, which may be an iterator.
+        :return: The successful response.
+        """
+        attempt = 0
+        refreshed = False
+        while True:
+            token = None
+            if authenticated:
+                token = self._token()
+                kwargs['headers'] = dict(headers or {}, **self._headers(token))
+            elif headers:
+                kwargs['headers'] = headers
+            if data:
+                kwargs['data'] = data()
+
+            try:
+                res = self.session.post(f'{self.url}{path}', timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                if res.status_code == 401 and authenticated and not refreshed:
+                    self._refresh_token(token)
+                    refreshed = True
+                    continue
+                if res.status_code not in self.RETRY_STATUSES or attempt >= self.retries:
+                    res.raise_for_status()
+                    return res
 
-    def _headers(self):
+            time.sleep(self.backoff * 2**attempt)
+            attempt += 1
+
+    def _token(self) -> str:
+        with self._token_lock:
+            if not self.token:
+                self.auth()
+            return self.token
+
+    def _refresh_token(self, expired: str):
+        with self._token_lock:
+            # Another request may have refreshed it already
+            if self.token == expired:
+                self.auth()
+
+    def _headers(self, token: str = None):
         return {
-            'Authorization': f'Bearer {self.token}'
+            'Authorization': f'Bearer {token or self.token}'
         }
+
+
+def _file_digest(file_name: str) -> str:
+    """
+    :return: The hex SHA-256 digest of a file.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(_DIGEST_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_chunks(file_name: str, chunk_size: int, compress=False) -> Iterator[bytes]:
+    """
+    Read a file in chunks, optionally compressing it on the fly.
+    :param file_name: The file.
+    :param chunk_size: The number of bytes of the file to read at a time.
+    :param compress: Whether to gzip the chunks.
+    :return: An iterator of the chunks.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,385 @@
+"""
+Hyperparameter search over RadiusVariance models.
+
+Trials train in parallel worker processes on windows built once per radius and time interval, and are
+ranked on a leaderboard by the validation loss of the training loss function.
+"""
+from triage_ml.data.dataset import DataSet, TimeInterval
+from triage_ml.data.frame_cache import FrameCache, load_frame
+from triage_ml.train import DATE_FORMAT, DATE_HELP, TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, \
+    _load_dataset_from_file, frame_cache
+from triage_ml.triage_api import TriageAPI
+from triage_ml.workers import add_worker_arguments, jobs, worker_pool
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Text, Tuple
+import argparse
+import csv
+import functools
+import itertools
+import math
+import operator
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import requests
+
+# The searchable parameters to their default values
+SEARCH_SPACE = {
+    'seq_size': [30],
+    'radius': [15],
+    'time_interval': ['WEEK'],
+    'lstm_units': [8],
+    'dense_units': [64],
+    'dropout': [0.2],
+    'learning_rate': [0.001],
+    'batch_size': [32],
+}
+
+SEARCHES = ['grid', 'random', 'halving']
+
+LEADERBOARD_FIELDS = ['rank', 'trial'] + list(SEARCH_SPACE) + ['val_loss', 'epochs', 'seconds', 'status', 'weights',
+                                                               'error']
+
+
+def grid_trials(space: Dict[Text, List]) -> List[Dict]:
+    """
+    :param space: The parameters to the values to search over.
+    :return: Every combination of parameter values.
+    """
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def random_trials(space: Dict[Text, List], trials: int, seed: int = None) -> List[Dict]:
+    """
+    Sample distinct combinations of parameter values.
+    :param space: The parameters to the values to search over.
+    :param trials: The number of combinations to sample, at most every combination.
+    :param seed: An optional seed for the sampling.
+    :return: The sampled combinations.
+    """
+    sizes = [len(values) for values in space.values()]
+    total = functools.reduce(operator.mul, sizes, 1)
+    rng = np.random.default_rng(seed)
+
+    # Combinations are numbered in grid order, so sampling numbers never builds the whole grid
+    numbers = rng.choice(total, size=min(trials, total), replace=False)
+    return [dict(zip(space, (values[i] for values, i in zip(space.values(), np.unravel_index(number, sizes)))))
+            for number in numbers]
+
+
+def halving_rungs(min_epochs: int, max_epochs: int, eta: int) -> List[int]:
+    """
+    :param min_epochs: The epochs every trial trains for in the first rung.
+    :param max_epochs: The epochs the surviving trials train for in the last rung.
+    :param eta: The factor the epochs grow by, and the survivors shrink by, each rung.
+    :return: The total epochs trained by the end of each rung.
+    """
+    rungs = [min_epochs]
+    while rungs[-1] < max_epochs:
+        rungs.append(min(rungs[-1] * eta, max_epochs))
+    return rungs
+
+
+class WindowCache:
+    """
+    Stores the frames RadiusVariance windows the samples of a DataSet from as .npy files.
+
+    A frame depends only on the radius and time interval, and windowing it by any sequence size is a
+    read-only view, so each frame is built once per search and memory-mapped by the trials using it.
+
+    Attributes:
+        frames: The FrameCache the frames are kept in.
+    """
+
+    def __init__(self, frames: FrameCache, dataset: DataSet):
+        """
+        Create a new WindowCache.
+        :param frames: The FrameCache to keep frames in.
+        :param dataset: The DataSet to build frames from.
+        """
+        self.frames = frames
+        self._daily_counts = dataset.daily_counts()
+        self._files = {}
+
+    def frame_files(self, radius: int, time_interval: Text) -> List[Text]:
+        """
+        Build the frame of a radius and time interval unless it is already cached.
+        :param radius: The radius in time_interval units used to compute arrival variance.
+        :param time_interval: The name of the TimeInterval.
+        :return: The .npy files of the frame.
+        """
+        from triage_ml.models.radius_variance import RadiusVariance
+
+        key = (radius, time_interval)
+        if key not in self._files:
+            model = RadiusVariance(radius=radius, time_interval=TimeInterval[time_interval])
+            self._files[key] = self.frames.frame_files(model, *self._daily_counts)
+        return self._files[key]
+
+
+def _run_trial(params: Dict, frame_files: Tuple[Text], epochs: int, initial_epoch: int, valid_split: float,
+               model_file: Text, patience: int = None) -> Dict:
+    """
+    Train a trial, resuming from its saved model if it has already trained.
+    :param params: The trial's parameters.
+    :param frame_files: The .npy files of the frame to window samples from.
+    :param epochs: The total epochs to have trained by the end of this run.
+    :param initial_epoch: The epochs already trained.
+    :param valid_split: The fraction of the samples validated on.
+    :param model_file: The file the model is saved to and resumed from.
+    :param patience: If set, training stops after this many epochs without the validation loss improving.
+    :return: The best validation loss, the epochs trained and whether training stopped early.
+    """
+    from triage_ml.models.radius_variance import RadiusVariance
+    from triage_ml.train_radius_variance import loss
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.optimizers import Adam
+
+    start = time.time()
+    rv_model = RadiusVariance(seq_size=params['seq_size'],
+                              radius=params['radius'],
+                              time_interval=TimeInterval[params['time_interval']],
+                              lstm_units=params['lstm_units'],
+                              dense_units=params['dense_units'],
+                              dropout=params['dropout'])
+    train_data, valid_data = rv_model.ml_dataset_from_frame(load_frame(frame_files), strided=True) \
+        .split(1 - valid_split)
+    if not len(train_data) or not len(valid_data):
+        raise ValueError(f'Too few samples to train and validate on with a sequence size of {params["seq_size"]}.')
+
+    if initial_epoch:
+        # Saved with its optimizer state, so training continues where it left off
+        rv_model.model = load_model(model_file, custom_objects={'loss': loss})
+    else:
+        rv_model.get_model().compile(optimizer=Adam(learning_rate=params['learning_rate']), loss=loss)
+
+    callbacks = [EarlyStopping(patience=patience)] if patience else []
+    history = rv_model.get_model().fit(x=train_data.inputs,
+                                       y=train_data.outputs,
+                                       validation_data=(valid_data.inputs, valid_data.outputs),
+                                       batch_size=params['batch_size'],
+                                       epochs=epochs,
+                                       initial_epoch=initial_epoch,
+                                       callbacks=callbacks,
+                                       verbose=0)
+    rv_model.get_model().save(model_file)
+
+    trained = initial_epoch + len(history.history['val_loss'])
+    return {
+        'val_loss': float(np.nanmin(history.history['val_loss'])),
+        'epochs': trained,
+        'stopped': trained < epochs,
+        'seconds': time.time() - start,
+    }
+
+
+class Search:
+    """
+    Runs the trials of a hyperparameter search in a pool of worker processes.
+
+    Attributes:
+        results: The leaderboard row of each trial, by trial number.
+    """
+
+    def __init__(self, trials: List[Dict], cache: WindowCache, executor: ProcessPoolExecutor, output_dir: Text,
+                 valid_split=0.2, patience: int = None):
+        """
+        Create a new Search.
+        :param trials: The parameters of each trial.
+        :param cache: The WindowCache of the dataset searched on.
+        :param executor: The pool to train trials in.
+        :param output_dir: The directory trial models are saved to.
+        :param valid_split: The fraction of the samples validated on.
+        :param patience: If set, a trial stops after this many epochs without its validation loss improving.
+        """
+        self.trials = trials
+        self.cache = cache
+        self.executor = executor
+        self.valid_split = valid_split
+        self.patience = patience
+        self.results = {
+            number: dict({field: None for field in LEADERBOARD_FIELDS}, trial=number, epochs=0, seconds=0.0,
+                         weights=os.path.join(output_dir, f'trial-{number}.keras'), **params)
+            for number, params in enumerate(trials)
+        }
+
+    def train(self, numbers: List[int], epochs: int):
+        """
+        Train trials in parallel until they have trained a number of epochs, stop early or fail.
+        :param numbers: The trials to train.
+        :param epochs: The total epochs each trial should have trained.
+        """
+        futures = {}
+        for number in numbers:
+            row, params = self.results[number], self.trials[number]
+            if row['error'] or row['status'] == 'stopped early' or row['epochs'] >= epochs:
+                continue
+            frame_files = tuple(self.cache.frame_files(params['radius'], params['time_interval']))
+            future = self.executor.submit(_run_trial, params, frame_files, epochs, row['epochs'], self.valid_split,
+                                          row['weights'], self.patience)
+            futures[future] = number
+
+        for future in as_completed(futures):
+            row = self.results[futures[future]]
+            try:
+                result = future.result()
+            except Exception as ex:
+                row.update(status='failed', error=repr(ex))
+            else:
+                row.update(val_loss=result['val_loss'], epochs=result['epochs'],
+                           seconds=round(row['seconds'] + result['seconds'], 3),
+                           status='stopped early' if result['stopped'] else 'complete')
+            print(f'Trial {row["trial"]}: ' + (row['error'] or f'val_loss={row["val_loss"]} after {row["epochs"]} '
+                                                               f'epochs'))
+
+    def halve(self, numbers: List[int], eta: int, rung: int) -> List[int]:
+        """
+        Prune all but the best 1/eta trials.
+        :param numbers: The trials of the rung.
+        :param eta: The factor the trials shrink by.
+        :param rung: The number of the rung, recorded against pruned trials.
+        :return: The surviving trials.
+        """
+        ranked = sorted(numbers, key=lambda number: _rank_key(self.results[number]))
+        survivors = [number for number in ranked[:max(1, len(ranked) // eta)] if not self.results[number]['error']]
+        for number in ranked:
+            if number not in survivors and not self.results[number]['error']:
+                self.results[number]['status'] = f'pruned at rung {rung}'
+        return survivors or ranked[:1]
+
+    def leaderboard(self) -> List[Dict]:
+        """
+        :return: The row of every trial, best first.
+        """
+        rows = sorted(self.results.values(), key=_rank_key)
+        for rank, row in enumerate(rows, start=1):
+            row['rank'] = rank
+        return rows
+
+
+def _rank_key(row: Dict):
+    # Failed trials rank last, and pruned trials below the rest, the earliest pruned lowest
+    failed = row['val_loss'] is None or math.isnan(row['val_loss'])
+    pruned = (row['status'] or '').startswith('pruned')
+    return failed, pruned, -row['epochs'] if pruned else 0, 0 if failed else row['val_loss']
+
+
+def parse_args(args):
+    """
+    Parser configuration
+    :return: parsed augments object
+    """
+    parser = argparse.ArgumentParser(description='Search RadiusVariance hyperparameters.')
+
+    parser.add_argument('-c', '--clinic_id', required=True, type=int,
+                        help='The ID of the clinic whose data to use for training.')
+    parser.add_argument('-s', '--severity', required=True, type=int,
+                        help='The triage severity level to train on.')
+
+    parser.add_argument('--seq_size', type=int, nargs='+', default=SEARCH_SPACE['seq_size'],
+                        help='The sequence sizes to search over.')
+    parser.add_argument('--radius', type=int, nargs='+', default=SEARCH_SPACE['radius'],
+                        help='The variance radii to search over.')
+    parser.add_argument('--time_interval', nargs='+', default=SEARCH_SPACE['time_interval'],
+                        choices=[interval.name for interval in TimeInterval],
+                        help='The time intervals to search over.')
+    parser.add_argument('--lstm_units', type=int, nargs='+', default=SEARCH_SPACE['lstm_units'],
+                        help='The LSTM layer sizes to search over.')
+    parser.add_argument('--dense_units', type=int, nargs='+', default=SEARCH_SPACE['dense_units'],
+                        help='The hidden dense layer sizes to search over.')
+    parser.add_argument('--dropout', type=float, nargs='+', default=SEARCH_SPACE['dropout'],
+                        help='The dropout rates to search over.')
+    parser.add_argument('-lr', '--learning_rate', type=float, nargs='+', default=SEARCH_SPACE['learning_rate'],
+                        help='The gradient descent learning rates to search over.')
+    parser.add_argument('-b', '--batch_size', type=int, nargs='+', default=SEARCH_SPACE['batch_size'],
+                        help='The training batch sizes to search over.')
+
+    parser.add_argument('--search', default='grid', choices=SEARCHES,
+                        help='How trials are chosen: every combination, a random sample, or a random sample '
+                             'pruned by successive halving.')
+    parser.add_argument('-n', '--trials', default=10, type=int,
+                        help='The number of trials sampled by random and halving searches.')
+    parser.add_argument('--seed', default=None, type=int,
+                        help='An optional seed for sampling trials.')
+    parser.add_argument('-e', '--epochs', default=100, type=int,
+                        help='The maximum number of epochs a trial trains for.')
+    parser.add_argument('--min_epochs', default=5, type=int,
+                        help='The epochs every trial trains for before the first halving.')
+    parser.add_argument('--eta', default=3, type=int,
+                        help='The factor the epochs grow by, and the surviving trials shrink by, at each halving.')
+    parser.add_argument('--patience', default=None, type=int,
+                        help='Stop a trial after this many epochs without its validation loss improving.')
+    parser.add_argument('--valid_split', default=0.2, type=float,
+                        help='The fraction of the samples validated on.')
+
+    add_worker_arguments(parser, 'trials', temporary_cache=True)
+    parser.add_argument('-o', '--output_dir', default='trials', type=str,
+                        help='The directory to save the model of each trial to.')
+    parser.add_argument('--leaderboard', default='leaderboard.csv', type=str,
+                        help='The path to write the CSV leaderboard of trials to.')
+
+    # If pulling data from API
+    parser.add_argument('-sd', '--start_date', help=f'The start date of the data. Format: {DATE_HELP}')
+    parser.add_argument('-ed', '--end_date', help=f'The end date of the data. Format: {DATE_HELP}')
+
+    # If using local data
+    parser.add_argument('-d', '--dataset',
+                        help='An optional local dataset (CSV or .npz) to train on instead')
+
+    return parser.parse_args(args)
+
+
+def main(http=requests, str_args=None):
+    """
+    Entrypoint for triage-tune.
+    """
+    args = parse_args(str_args or sys.argv[1:])
+    space = {name: getattr(args, name) for name in SEARCH_SPACE}
+    if args.search == 'grid':
+        trials = grid_trials(space)
+    else:
+        trials = random_trials(space, args.trials, args.seed)
+
+    if args.dataset:
+        dataset = _load_dataset_from_file(args.dataset, args.clinic_id, args.severity)
+    else:
+        triage_api = TriageAPI(TRIAGE_API_URL, TRIAGE_API_USER, TRIAGE_API_PASS, http)
+        dataset = triage_api.get_data(args.clinic_id, args.severity,
+                                      datetime.strptime(args.start_date, DATE_FORMAT),
+                                      datetime.strptime(args.end_date, DATE_FORMAT))
+    dataset.filter_mask('clinic_id', lambda c_id: c_id == args.clinic_id)
+    dataset.filter_mask('severity', lambda s: s == args.severity)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp_dir, worker_pool(jobs(args), args.threads) as executor:
+        cache = WindowCache(frame_cache(args, tmp_dir), dataset)
+        search = Search(trials, cache, executor, args.output_dir, args.valid_split, args.patience)
+        numbers = list(range(len(trials)))
+
+        if args.search == 'halving':
+            rungs = halving_rungs(args.min_epochs, args.epochs, args.eta)
+            for rung, epochs in enumerate(rungs):
+                search.train(numbers, epochs)
+                if rung < len(rungs) - 1:
+                    numbers = search.halve(numbers, args.eta, rung)
+        else:
+            search.train(numbers, args.epochs)
+        print(f'Frame cache: {cache.frames.stats()}')
+
+    rows = search.leaderboard()
+    with open(args.leaderboard, 'w', newline='') as leaderboard_file:
+        writer = csv.DictWriter(leaderboard_file, fieldnames=LEADERBOARD_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for row in rows[:5]:
+        params = ', '.join(f'{name}={row[name]}' for name in SEARCH_SPACE)
+        print(f'{row["rank"]:>3}. val_loss={row["val_loss"]} ({params})')
+
+    if all(row['error'] for row in rows):
+        sys.exit(1)
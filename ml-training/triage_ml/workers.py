@@ -0,0 +1,113 @@
+"""
+Helpers shared by the CLIs that train many models in worker processes: train-all, tune and backtest.
+"""
+from triage_ml.data.database import Database
+from triage_ml.data.dataset import DataSet
+from triage_ml.train import DATE_FORMAT
+from triage_ml.triage_api import TriageAPI
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Text, Tuple
+import argparse
+import multiprocessing
+import os
+import numpy as np
+
+TRIAGE_DB_NAME = os.getenv('TRIAGE_DB_NAME')
+TRIAGE_DB_USER = os.getenv('TRIAGE_DB_USER')
+TRIAGE_DB_PASS = os.getenv('TRIAGE_DB_PASS')
+TRIAGE_DB_HOST = os.getenv('TRIAGE_DB_HOST')
+TRIAGE_DB_PORT = os.getenv('TRIAGE_DB_PORT')
+
+
+def init_worker(threads: int):
+    """
+    Limit the number of threads each training process uses.
+    :param threads: The number of threads.
+    """
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def worker_pool(workers: int, threads: int) -> ProcessPoolExecutor:
+    """
+    Create a pool of training processes.
+
+    Workers are spawned rather than forked, as they would not inherit the parent's TensorFlow state.
+    :param workers: The number of processes.
+    :param threads: The number of threads each process may use.
+    :return: The ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker, initargs=(threads,))
+
+
+def add_worker_arguments(parser: argparse.ArgumentParser, tasks: Text, temporary_cache=False):
+    """
+    Add the --jobs, --threads, --cache_dir and --cache_size options of a CLI training in worker processes.
+    :param parser: The parser to add the options to.
+    :param tasks: What each worker process runs, for the help of --jobs.
+    :param temporary_cache: Whether windows are cached in a temporary directory when --cache_dir is not set.
+    """
+    parser.add_argument('-j', '--jobs', default=None, type=int,
+                        help=f'The number of {tasks} to run concurrently. Defaults to the number of CPUs divided '
+                             'by --threads.')
+    parser.add_argument('-t', '--threads', default=1, type=int,
+                        help='The number of threads each worker process may use.')
+    parser.add_argument('--cache_dir', default=None, type=str,
+                        help='An optional directory to cache the preprocessed training windows in, so later runs on '
+                             'the same data skip building them.'
+                             + (' Defaults to a temporary directory.' if temporary_cache else ''))
+    parser.add_argument('--cache_size', default=None, type=int,
+                        help='The number of megabytes --cache_dir is kept under by evicting its least recently used '
+                             'windows.')
+
+
+def jobs(args) -> int:
+    """
+    :return: The number of worker processes to run, --jobs or as many as the CPUs fit with --threads each.
+    """
+    return args.jobs or max(1, (os.cpu_count() or 1) // args.threads)
+
+
+def load_partitions(args, triage_api: TriageAPI) -> Dict[Tuple[int, int], DataSet]:
+    """
+    Load the data of every clinic and severity to train on.
+
+    The data is read from --dataset, the --db_table database table or the API, in that order of preference.
+    :return: A dictionary of (clinic_id, severity) pairs to their DataSet.
+    """
+    if args.dataset:
+        dataset = DataSet.read_from_file(args.dataset)
+        if args.clinic_ids:
+            dataset.filter_mask('clinic_id', lambda c_id: np.isin(c_id, args.clinic_ids))
+        if args.severities:
+            dataset.filter_mask('severity', lambda s: np.isin(s, args.severities))
+        return dataset.partition_on(['clinic_id', 'severity'])
+
+    if not (args.clinic_ids and args.severities):
+        raise ValueError('--clinic_ids and --severities are required when pulling data from the API or database.')
+
+    start_date = datetime.strptime(args.start_date, DATE_FORMAT)
+    end_date = datetime.strptime(args.end_date, DATE_FORMAT)
+    pairs = [(clinic_id, severity) for clinic_id in args.clinic_ids for severity in args.severities]
+
+    if args.db_table:
+        # One pool serves every clinic and severity of the run
+        database = Database.pooled(TRIAGE_DB_NAME, TRIAGE_DB_USER, TRIAGE_DB_PASS, TRIAGE_DB_HOST, TRIAGE_DB_PORT,
+                                   max_size=args.db_connections)
+        try:
+            with ThreadPoolExecutor(max_workers=args.db_connections) as executor:
+                datasets = executor.map(lambda pair: database.get_arrivals(args.db_table, *pair, start_date, end_date),
+                                        pairs)
+                partitions = dict(zip(pairs, datasets))
+            print(f'Database pool: {database.pool.stats()}')
+        finally:
+            database.close()
+        return partitions
+
+    return triage_api.get_many(pairs, start_date, end_date)